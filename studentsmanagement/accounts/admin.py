@@ -1,3 +1,26 @@
 from django.contrib import admin
 
+from .models import GradeAuditEntry
+
 # Register your models here.
+
+
+@admin.register(GradeAuditEntry)
+class GradeAuditEntryAdmin(admin.ModelAdmin):
+    """The grade audit log, for browsing only: entries are never changed or deleted."""
+    # Ids rather than the related objects, which may have been deleted since
+    list_display = ('changed_at', 'student_id', 'course_id', 'source', 'old_marks', 'old_grade',
+                    'new_marks', 'new_grade', 'actor_id')
+    list_filter = ('source',)
+    date_hierarchy = 'changed_at'
+    ordering = ('-changed_at', '-id')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
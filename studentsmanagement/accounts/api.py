@@ -0,0 +1,228 @@
+"""Versioned JSON API for the mobile client, mounted under /api/v1/.
+
+Authentication is the usual session cookie (with the CSRF header on
+writes). Lists are keyset-paginated like the HTML pages: the response's
+``next`` value is passed back as ``?after=``. ``?fields=a,b`` picks the
+columns to return, and only those columns are selected. Rows are read as
+tuples, never as model instances, so every endpoint runs a fixed number of
+queries however long the page is.
+"""
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponse
+
+from . import audit, enrollment
+from .grade_import import import_grades
+from .models import Course, Enrollment, Grade
+from .pagination import PAGE_SIZE, keyset_rows, parse_cursor
+from .transcripts import get_transcript
+from .views import catalog_queryset
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAX_PAGE_SIZE = 100
+
+# API field name -> column or expression, per resource
+CATALOG_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'faculty_id': 'faculty_id',
+    'faculty': 'faculty__name',
+    'capacity': 'capacity',
+    'enrolled_count': 'enrolled_count',
+    'updated_at': 'updated_at',
+}
+ENROLLMENT_FIELDS = {
+    'course_id': 'course_id',
+    'course': 'course__name',
+    'faculty': 'course__faculty__name',
+    'enrolled_on': 'enrolled_on',
+}
+TRANSCRIPT_FIELDS = ('course_name', 'marks', 'grade')
+GRADE_HISTORY_FIELDS = {
+    'changed_at': 'changed_at',
+    'source': 'source',
+    'actor_id': 'actor_id',
+    'old_marks': 'old_marks',
+    'new_marks': 'new_marks',
+    'old_grade': 'old_grade',
+    'new_grade': 'new_grade',
+}
+
+
+def _grade_column(column):
+    grades = Grade.objects.filter(student_id=OuterRef('student_id'), course_id=OuterRef('course_id'))
+    return Subquery(grades.values(column)[:1])
+
+
+ROSTER_FIELDS = {
+    'student_id': 'student_id',
+    'name': 'student__name',
+    'email': 'student__email',
+    'enrolled_on': 'enrolled_on',
+    'marks': _grade_column('marks'),
+    'grade': _grade_column('grade'),
+}
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(data, status=200):
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return HttpResponse(body, status=status, content_type='application/json')
+
+
+def api_view(methods=('GET',), staff=None):
+    """Turn a view returning plain data into a JSON endpoint.
+
+    Anonymous users get a 401 rather than the login redirect. With ``staff``
+    set, only faculty (True) or only students (False) may call the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise ApiError('Method not allowed.', 405)
+                if not request.user.is_authenticated:
+                    raise ApiError('Authentication required.', 401)
+                if staff is not None and request.user.is_staff != staff:
+                    raise ApiError('Not allowed for this account.', 403)
+                result = view(request, *args, **kwargs)
+            except ApiError as exc:
+                return json_response({'error': str(exc)}, exc.status)
+            if isinstance(result, HttpResponse):
+                return result
+            return json_response(result)
+        return inner
+    return decorator
+
+
+def requested_fields(request, available):
+    """Field names from ``?fields=``, in the order given; every field if it is missing."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return fields
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit must be a number.')
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def paginated(request, queryset, available):
+    fields = requested_fields(request, available)
+    rows, next_cursor = keyset_rows(
+        queryset, [available[name] for name in fields], request.GET.get('after'), page_size(request)
+    )
+    return {
+        'results': [dict(zip(fields, row)) for row in rows],
+        'next': next_cursor,
+    }
+
+
+def request_data(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError('Request body must be JSON.')
+
+
+@api_view(staff=False)
+def transcript(request):
+    fields = requested_fields(request, TRANSCRIPT_FIELDS)
+    rows = get_transcript(request.user.id)
+    return {'results': [{name: row[name] for name in fields} for row in rows]}
+
+
+@api_view()
+def courses(request):
+    return paginated(request, catalog_queryset(request.GET), CATALOG_FIELDS)
+
+
+@api_view(methods=('GET', 'POST'), staff=False)
+def enrollments(request):
+    if request.method == 'GET':
+        return paginated(request, Enrollment.objects.filter(student=request.user), ENROLLMENT_FIELDS)
+
+    data = request_data(request)
+    if isinstance(data, dict) and 'course_ids' in data:
+        # Batch enrollment, with a result per course
+        course_ids = data['course_ids'] if isinstance(data['course_ids'], list) else []
+        course_ids = [parse_cursor(course_id) for course_id in course_ids]
+        if not course_ids or None in course_ids or len(course_ids) > enrollment.MAX_BATCH_ENROLL:
+            raise ApiError(f'course_ids must be a list of 1 to {enrollment.MAX_BATCH_ENROLL} course ids.')
+        return {'results': enrollment.enroll_many(request.user, course_ids)}
+
+    course_id = parse_cursor(data.get('course_id') if isinstance(data, dict) else None)
+    if course_id is None or not Course.objects.filter(id=course_id).exists():
+        raise ApiError('Unknown course.', 404)
+    status = enrollment.enroll_student(request.user, course_id)
+    return json_response({'course_id': course_id, 'status': status},
+                         status=201 if status == enrollment.ENROLLED else 200)
+
+
+@api_view(methods=('DELETE',), staff=False)
+def drop_enrollment(request, course_id):
+    if not enrollment.drop_course(request.user, course_id):
+        raise ApiError('Not enrolled or waitlisted in this course.', 404)
+    return HttpResponse(status=204)
+
+
+def _own_course(request, course_id):
+    course = Course.objects.filter(id=course_id, faculty=request.user).only('id').first()
+    if course is None:
+        raise ApiError('No such course.', 404)
+    return course
+
+
+@api_view(staff=True)
+def roster(request, course_id):
+    _own_course(request, course_id)
+    return paginated(request, Enrollment.objects.filter(course_id=course_id), ROSTER_FIELDS)
+
+
+@api_view(methods=('POST',), staff=True)
+def grades(request, course_id):
+    """Upsert grades from ``{"grades": [{"student_id": ..., "marks": ..., "grade": ...}]}``."""
+    course = _own_course(request, course_id)
+    data = request_data(request)
+    rows = data.get('grades') if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise ApiError('Expected a list of grades.')
+    with audit.acting_as(request.user):
+        return import_grades(course, enumerate(rows, start=1))
+
+
+@api_view()
+def grade_history(request, course_id, student_id):
+    """Every change to one student's grade in a course, for the course's faculty or the student."""
+    if request.user.is_staff:
+        _own_course(request, course_id)
+    elif request.user.id != student_id:
+        raise ApiError('Not allowed for this account.', 403)
+    fields = requested_fields(request, GRADE_HISTORY_FIELDS)
+    rows = audit.grade_history(student_id, course_id).values_list(*[GRADE_HISTORY_FIELDS[name] for name in fields])
+    return {'results': [dict(zip(fields, row)) for row in rows]}
@@ -0,0 +1,94 @@
+"""Native async versions of the read-heavy views, for deployment under ASGI.
+
+They are used instead of the sync views in accounts/views.py when the
+ASYNC_VIEWS setting is on. Django runs async ORM calls one after another
+on a single thread, so the queries here are simply awaited in turn.
+"""
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views import View
+
+from .conditional import catalog_etag, conditional_page, faculty_profile_etag, student_profile_etag
+from .fragments import aattach_course_cards, aattach_roster_rows
+from .models import Course, Enrollment, WaitlistEntry
+from .pagination import PAGE_SIZE, akeyset_page
+from .transcripts import aget_transcript, alist
+from .views import catalog_queryset, faculty_choices, format_roster, next_page_query, roster_queries
+
+
+@login_required
+@conditional_page(student_profile_etag)
+async def student_profile(request):
+    student = await request.auser()
+    enrolled_data = await aget_transcript(student.id)
+
+    return render(request, 'accounts/student_profile.html', {
+        'user': student,
+        'enrolled_data': enrolled_data
+    })
+
+
+class AvailableCoursesView(View):
+    page_size = PAGE_SIZE
+
+    @method_decorator(conditional_page(catalog_etag))
+    async def get(self, request):
+        student = await request.auser()
+        courses, next_cursor = await akeyset_page(catalog_queryset(request.GET), request.GET.get('after'), self.page_size)
+        page_ids = [course.id for course in courses]
+        # Only the courses on this page matter for the "Enrolled" buttons
+        enrolled_ids = await alist(
+            Enrollment.objects.filter(student=student, course_id__in=page_ids).values_list('course_id', flat=True)
+        )
+        waitlisted_ids = await alist(
+            WaitlistEntry.objects.filter(student=student, course_id__in=page_ids).values_list('course_id', flat=True)
+        )
+        choices = await alist(faculty_choices())
+
+        await aattach_course_cards(courses)
+        context = {
+            'courses': courses,
+            'enrolled_course_ids': set(enrolled_ids),
+            'waitlisted_course_ids': set(waitlisted_ids),
+            'faculty_choices': choices,
+        }
+        query = next_page_query(request.GET, next_cursor)
+        if query is not None:
+            context['next_page_query'] = query
+        return render(request, 'accounts/available_courses.html', context)
+
+
+class FacultyProfileView(View):
+    @method_decorator(conditional_page(faculty_profile_etag))
+    async def get(self, request, *args, **kwargs):
+        faculty = await request.auser()
+        if not faculty.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+
+        courses = await alist(Course.objects.filter(faculty=faculty).select_related('grade_summary'))
+        return render(request, 'accounts/faculty_profile.html', {
+            'user': faculty,
+            'courses': courses
+        })
+
+
+@login_required
+async def student_details(request, course_id):
+    faculty = await request.auser()
+    try:
+        course = await Course.objects.aget(id=course_id, faculty=faculty)
+    except Course.DoesNotExist:
+        raise Http404('No Course matches the given query.')
+
+    students, grades = roster_queries(course)
+    students, grades = await alist(students), await alist(grades)
+    student_data = format_roster(students, grades)
+    await aattach_roster_rows(course, student_data)
+
+    return render(request, 'accounts/student_details.html', {
+        'course': course,
+        'student_data': student_data
+    })
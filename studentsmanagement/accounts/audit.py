@@ -0,0 +1,241 @@
+"""Append-only audit log of grade changes.
+
+Every write path that changes a grade (the grade form, imports, regrades,
+and saves or deletes anywhere else through the Grade signals) hands its
+changes to record(). Entries are buffered in the process once their
+transaction commits, so rolled-back changes are never logged, and are
+written with one batched INSERT when the buffer holds
+``settings.GRADE_AUDIT_BATCH_SIZE`` entries or its oldest entry is
+``settings.GRADE_AUDIT_FLUSH_SECONDS`` old. Full buffers are flushed from
+the request_finished signal, after the response has gone out, so grading
+requests never wait on the log; a background thread writes the rest once
+they are due, even if the process gets no more requests. Workers flush
+after each job and every process flushes on exit.
+
+Buffered entries are lost if the process is killed before they are
+written. With ``settings.GRADE_AUDIT_SYNCHRONOUS`` each transaction's
+entries are instead written as soon as it commits, at the cost of one
+INSERT on the grading path; they are only buffered if that write fails.
+The log can be browsed, read-only, in the admin site.
+
+On PostgreSQL the table is partitioned by month (see migration 0011);
+ensure_partitions() adds the partitions for coming months.
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import GradeAuditEntry
+
+logger = logging.getLogger(__name__)
+
+# Entries kept in the buffer if the database refuses them, before the oldest are dropped
+MAX_BUFFERED = 50000
+
+_actor = ContextVar('grade_audit_actor', default=None)
+_lock = threading.Lock()
+# Wakes the flusher thread when the buffer gets its first entry
+_buffered = threading.Condition(_lock)
+_buffer = []
+_first_buffered = None
+_flusher = None
+_partitioned_months = set()
+
+
+@contextmanager
+def acting_as(user):
+    """Attribute the grade changes made inside the block to ``user`` (a user or user id)."""
+    token = _actor.set(getattr(user, 'pk', user))
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def entry(student_id, course_id, source, old=(None, ''), new=(None, '')):
+    """An unsaved audit entry; ``old`` and ``new`` are (marks, grade) pairs."""
+    return GradeAuditEntry(
+        student_id=student_id,
+        course_id=course_id,
+        actor_id=_actor.get(),
+        source=source,
+        old_marks=old[0],
+        old_grade=old[1] or '',
+        new_marks=new[0],
+        new_grade=new[1] or '',
+    )
+
+
+def record(entries):
+    """Queue audit entries to be written once the current transaction commits."""
+    entries = list(entries)
+    if entries:
+        transaction.on_commit(lambda: _commit_entries(entries))
+
+
+def _commit_entries(entries):
+    if settings.GRADE_AUDIT_SYNCHRONOUS:
+        try:
+            _write(entries)
+            return
+        except Exception:
+            logger.exception('Could not write %s grade audit entries; buffering them', len(entries))
+    _buffer_entries(entries)
+
+
+def _buffer_entries(entries):
+    global _first_buffered
+    with _lock:
+        _start_flusher()
+        if not _buffer:
+            _first_buffered = time.monotonic()
+            _buffered.notify()
+        _buffer.extend(entries)
+
+
+def _start_flusher():
+    global _flusher
+    # Also after a fork, which keeps the buffer but not the thread
+    if _flusher is None or not _flusher.is_alive():
+        _flusher = threading.Thread(target=_flush_when_due, name='grade-audit-flusher', daemon=True)
+        _flusher.start()
+
+
+def _flush_when_due():
+    while True:
+        with _buffered:
+            while True:
+                wait = None
+                if _buffer:
+                    wait = _first_buffered + settings.GRADE_AUDIT_FLUSH_SECONDS - time.monotonic()
+                    if wait <= 0:
+                        break
+                _buffered.wait(wait)
+        try:
+            flush()
+        finally:
+            # The thread's own connection, idle until the next flush
+            connections.close_all()
+
+
+def pending():
+    return len(_buffer)
+
+
+def _write(entries):
+    ensure_partitions({each.changed_at.date().replace(day=1) for each in entries})
+    # A savepoint, in case we're writing inside someone else's transaction
+    with transaction.atomic():
+        GradeAuditEntry.objects.bulk_create(entries, batch_size=settings.GRADE_AUDIT_BATCH_SIZE)
+
+
+def flush():
+    """Write every buffered entry now. Returns how many were written."""
+    global _first_buffered
+    with _lock:
+        entries = _buffer[:]
+        _buffer.clear()
+        _first_buffered = None
+    if not entries:
+        return 0
+    try:
+        _write(entries)
+    except Exception:
+        logger.exception('Could not write %s grade audit entries; keeping them for the next flush', len(entries))
+        with _lock:
+            _buffer[:0] = entries
+            dropped = len(_buffer) - MAX_BUFFERED
+            if dropped > 0:
+                logger.error('Dropping %s grade audit entries; the buffer is full', dropped)
+                del _buffer[:dropped]
+            _first_buffered = time.monotonic()
+        return 0
+    return len(entries)
+
+
+def flush_if_due():
+    if not _buffer:
+        return 0
+    full = len(_buffer) >= settings.GRADE_AUDIT_BATCH_SIZE
+    if full or time.monotonic() - (_first_buffered or 0) >= settings.GRADE_AUDIT_FLUSH_SECONDS:
+        return flush()
+    return 0
+
+
+@receiver(request_finished)
+def _flush_after_request(sender, **kwargs):
+    if flush_if_due():
+        # Django has already let go of the request's connection; the flush
+        # opened it again, so apply CONN_MAX_AGE once more
+        close_old_connections()
+
+
+atexit.register(flush)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def ensure_partitions(months):
+    """Create the monthly partitions for ``months`` (first days of months) that don't exist yet.
+
+    Only PostgreSQL partitions the table; elsewhere this does nothing.
+    Returns the names of the partitions created.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'postgresql':
+        return []
+    created = []
+    table = GradeAuditEntry._meta.db_table
+    for month in sorted(set(months) - _partitioned_months):
+        name = f'{table}_p{month:%Y%m}'
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT to_regclass(%s)', [name])
+                if cursor.fetchone()[0] is None:
+                    # DDL takes no parameters; the bounds are dates we formatted ourselves
+                    cursor.execute(
+                        f"CREATE TABLE {name} PARTITION OF {table} "
+                        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+                    )
+                    created.append(name)
+        except DatabaseError:
+            # The default partition already holds rows for this month. They
+            # stay there, and keep working, until someone moves them.
+            logger.warning('Could not create audit partition %s', name, exc_info=True)
+        _partitioned_months.add(month)
+    return created
+
+
+def upcoming_months(count, today=None):
+    # Partition bounds are in UTC, like the stored timestamps
+    month = (today or timezone.now().date()).replace(day=1)
+    months = []
+    for _ in range(count):
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def grade_history(student_id, course_id):
+    """Every recorded change to the student's grade in the course, oldest first.
+
+    Served by the (student, course, changed_at) index. Entries still
+    buffered in this process are written first, so they are included.
+    """
+    flush()
+    return (
+        GradeAuditEntry.objects.filter(student_id=student_id, course_id=course_id)
+        .order_by('changed_at', 'id')
+    )
+
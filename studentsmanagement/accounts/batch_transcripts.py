@@ -0,0 +1,174 @@
+"""Transcript documents for a whole cohort at once, e.g. at the end of term.
+
+Students are read in id order, ``chunk_size`` at a time. Each chunk costs
+three queries (the students, their enrollments and their grades, the last
+two sorted by student) whatever its size, and is grouped per student in
+one pass over the rows. Chunks are rendered in a process pool, with only a
+few of them in flight at once, so memory stays bounded by the chunk size
+rather than the size of the cohort.
+"""
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Enrollment, Grade, User
+from .transcripts import format_transcript
+from .workers import close_connections, init_worker
+
+try:
+    import weasyprint
+except ImportError:
+    weasyprint = None
+
+CHUNK_SIZE = 500
+FORMATS = ('html', 'pdf')
+
+
+def _by_student(rows):
+    """Group rows sorted by student id, whose first column is that id, into lists without it."""
+    return {student_id: [row[1:] for row in group] for student_id, group in groupby(rows, key=itemgetter(0))}
+
+
+def student_chunks(chunk_size=CHUNK_SIZE, student_ids=None):
+    """Yield lists of ``{'id', 'name', 'email', 'transcript'}`` dicts, ``chunk_size`` students at a time.
+
+    Transcript rows are the same as on the student profile.
+    """
+    students = User.objects.filter(is_staff=False).order_by('id')
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+
+    after = 0
+    while True:
+        chunk = list(students.filter(id__gt=after).values_list('id', 'name', 'email')[:chunk_size])
+        if not chunk:
+            return
+        after = chunk[-1][0]
+        ids = [student_id for student_id, _, _ in chunk]
+        enrollments = _by_student(
+            Enrollment.objects.filter(student_id__in=ids).order_by('student_id', 'id')
+            .values_list('student_id', 'course_id', 'course__name').iterator(chunk_size=2000)
+        )
+        grades = _by_student(
+            Grade.objects.filter(student_id__in=ids).order_by('student_id')
+            .values_list('student_id', 'course_id', 'marks', 'grade').iterator(chunk_size=2000)
+        )
+        yield [
+            {
+                'id': student_id,
+                'name': name,
+                'email': email,
+                'transcript': format_transcript(enrollments.get(student_id, ()), grades.get(student_id, ())),
+            }
+            for student_id, name, email in chunk
+        ]
+
+
+def render_chunk(students, fmt='html', generated_on=None):
+    """Render one chunk of students to a list of (file name, document bytes)."""
+    documents = []
+    for student in students:
+        html = render_to_string('accounts/transcript_document.html', {
+            'student': student,
+            'enrolled_data': student['transcript'],
+            'generated_on': generated_on,
+        })
+        name = f"{student['id']}-{slugify(student['name']) or 'student'}.{fmt}"
+        if fmt == 'pdf':
+            documents.append((name, weasyprint.HTML(string=html).write_pdf()))
+        else:
+            documents.append((name, html.encode()))
+    return documents
+
+
+class _DirectoryWriter:
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, name, content):
+        with open(os.path.join(self.path, name), 'wb') as handle:
+            handle.write(content)
+
+    def close(self):
+        pass
+
+
+class _ZipWriter:
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, name, content):
+        self.archive.writestr(name, content)
+
+    def close(self):
+        self.archive.close()
+
+
+def generate_transcripts(output, fmt='html', processes=None, chunk_size=CHUNK_SIZE, student_ids=None,
+                         progress=None):
+    """Write a transcript for every student into ``output``, a directory or a ``.zip`` file.
+
+    Rendering is CPU bound, so chunks are spread across a process pool; with
+    ``processes=1`` everything runs in the current process. ``progress``, if
+    given, is called with the number of transcripts written so far after
+    each chunk. Returns a report including the throughput.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format "{fmt}".')
+    if fmt == 'pdf' and weasyprint is None:
+        raise ValueError('PDF transcripts need the weasyprint package.')
+
+    started = time.perf_counter()
+    generated_on = timezone.localdate()
+    writer = _ZipWriter(output) if output.lower().endswith('.zip') else _DirectoryWriter(output)
+    written = size = 0
+
+    def save(documents):
+        nonlocal written, size
+        for name, content in documents:
+            writer.write(name, content)
+            size += len(content)
+        written += len(documents)
+        if progress is not None:
+            progress(written)
+
+    chunks = student_chunks(chunk_size, student_ids)
+    try:
+        if processes == 1:
+            for chunk in chunks:
+                save(render_chunk(chunk, fmt, generated_on))
+        else:
+            workers = processes or os.cpu_count() or 1
+            close_connections()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(os.environ.get('DJANGO_SETTINGS_MODULE'),)) as executor:
+                # A couple of chunks per worker keeps them busy without
+                # reading the whole cohort ahead of the writer
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(render_chunk, chunk, fmt, generated_on))
+                    if len(pending) >= workers * 2:
+                        save(pending.popleft().result())
+                while pending:
+                    save(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'transcripts': written,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'transcripts_per_second': round(written / elapsed, 1) if elapsed else 0.0,
+    }
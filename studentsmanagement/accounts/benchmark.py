@@ -0,0 +1,226 @@
+import http.cookiejar
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from .counters import reconcile_counters
+from .models import Course, Enrollment, Grade, User
+
+BENCH_DOMAIN = 'bench.example.com'
+BENCH_PASSWORD = 'bench-password'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (which must be sorted)."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def summarize(name, latencies, query_counts, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries_per_request': (
+            round(sum(query_counts) / len(query_counts), 2) if query_counts else None
+        ),
+    }
+
+
+def seed_benchmark_data(students=200, courses=50):
+    """Create (once) a faculty member, ``courses`` courses and ``students`` enrolled students.
+
+    All benchmark users share the @bench.example.com domain, so running the
+    seed again only tops up what is missing.
+    """
+    password = make_password(BENCH_PASSWORD)
+    faculty, _ = User.objects.get_or_create(
+        email=f'faculty@{BENCH_DOMAIN}',
+        defaults={'name': 'Bench Faculty', 'is_staff': True, 'password': password},
+    )
+
+    existing = Course.objects.filter(faculty=faculty).count()
+    Course.objects.bulk_create([
+        Course(name=f'Bench Course {i}', description='', faculty=faculty)
+        for i in range(existing, courses)
+    ])
+    course_ids = list(Course.objects.filter(faculty=faculty).order_by('id').values_list('id', flat=True))
+
+    existing_emails = set(
+        User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').values_list('email', flat=True)
+    )
+    User.objects.bulk_create([
+        User(email=f'student{i}@{BENCH_DOMAIN}', name=f'Bench Student {i}', password=password)
+        for i in range(students)
+        if f'student{i}@{BENCH_DOMAIN}' not in existing_emails
+    ])
+    student_ids = list(
+        User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}', is_staff=False)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+    # Every student takes a few courses, and half of those are graded
+    enrollments = []
+    grades = []
+    for index, student_id in enumerate(student_ids):
+        for offset in range(min(5, len(course_ids))):
+            course_id = course_ids[(index + offset) % len(course_ids)]
+            enrollments.append(Enrollment(student_id=student_id, course_id=course_id))
+            if offset % 2 == 0:
+                grades.append(Grade(student_id=student_id, course_id=course_id, marks=70, grade='B'))
+    Enrollment.objects.bulk_create(enrollments, ignore_conflicts=True, batch_size=1000)
+    Grade.objects.bulk_create(grades, ignore_conflicts=True, batch_size=1000)
+    # The bulk inserts bypass the counters on Course
+    reconcile_counters(course_ids)
+
+    return {
+        'faculty': faculty.email,
+        'students': [f'student{i}@{BENCH_DOMAIN}' for i in range(students)],
+        'course_ids': course_ids,
+        'student_ids': student_ids,
+    }
+
+
+class ClientSession:
+    """Drives the app in-process through Django's test Client."""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method)(path, data or {})
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        count = response.get('X-Query-Count')
+        return response.status_code, int(count) if count is not None else None
+
+    def close(self):
+        # Each worker thread has its own database connections
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+class HttpSession:
+    """Drives a running server over HTTP, keeping cookies and the CSRF token."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        self.request('get', reverse('login'))
+        return next((c.value for c in self.cookies if c.name == settings.CSRF_COOKIE_NAME), '')
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {}
+        if method == 'post':
+            headers = {'X-CSRFToken': self._csrf_token(), 'Referer': url}
+            body = urllib.parse.urlencode(data or {}).encode()
+        elif data:
+            url = f'{url}?{urllib.parse.urlencode(data)}'
+        request = urllib.request.Request(url, data=body, headers=headers, method=method.upper())
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                status, count = response.status, response.headers.get('X-Query-Count')
+        except urllib.error.HTTPError as exc:
+            status, count = exc.code, exc.headers.get('X-Query-Count')
+        return status, int(count) if count is not None else None
+
+    def close(self):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Measure the view that answered, not the page it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def build_scenarios(data):
+    """Return (name, role, method, path, data) for every benchmarked route."""
+    course_id = data['course_ids'][0]
+    student_id = data['student_ids'][0]
+    student = {'user_type': 'student', 'email': data['students'][0], 'password': BENCH_PASSWORD}
+    faculty = {'user_type': 'faculty', 'email': data['faculty'], 'password': BENCH_PASSWORD}
+    admin = {'user_type': 'admin', 'email': settings.ADMIN_EMAIL, 'password': settings.ADMIN_PASSWORD}
+    return [
+        ('login_admin', None, 'post', reverse('login'), admin),
+        ('login_faculty', None, 'post', reverse('login'), faculty),
+        ('login_student', None, 'post', reverse('login'), student),
+        ('admin_panel', None, 'get', reverse('admin_panel'), None),
+        ('student_profile', student, 'get', reverse('student_profile'), None),
+        ('available_courses', student, 'get', reverse('available_courses'), None),
+        ('course_autocomplete', student, 'get', reverse('course_autocomplete'), {'q': 'bench cour'}),
+        ('enroll_course', student, 'post', reverse('enroll_course', args=[course_id]), None),
+        ('faculty_profile', faculty, 'get', reverse('faculty_profile'), None),
+        ('course_detail', faculty, 'get', reverse('course_detail', args=[course_id]), None),
+        ('student_details', faculty, 'get', reverse('student_details', args=[course_id]), None),
+        ('update_grade', faculty, 'post', reverse('update_grade'),
+         {'student_id': student_id, 'course_id': course_id, 'marks': 75, 'grade': 'B'}),
+        ('export_roster', faculty, 'get', reverse('export_roster', args=[course_id]), None),
+        ('export_faculty_grades', faculty, 'get', reverse('export_faculty_grades'), None),
+        ('api_transcript', student, 'get', reverse('api_transcript'), None),
+        ('api_courses', student, 'get', reverse('api_courses'), None),
+        ('api_roster', faculty, 'get', reverse('api_roster', args=[course_id]), None),
+    ]
+
+
+def run_scenario(session_factory, scenario, requests, concurrency):
+    name, credentials, method, path, data = scenario
+    latencies = []
+    query_counts = []
+    statuses = []
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        session = session_factory()
+        try:
+            if credentials:
+                session.request('post', reverse('login'), credentials)
+            for _ in range(count):
+                start = time.perf_counter()
+                status, queries = session.request(method, path, data)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.append(status)
+                    if queries is not None:
+                        query_counts.append(queries)
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(requests)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, per_worker))
+    return summarize(name, latencies, query_counts, statuses, time.perf_counter() - started)
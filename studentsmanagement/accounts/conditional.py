@@ -0,0 +1,111 @@
+"""Conditional GETs for the profile and catalog pages.
+
+Each page gets an ETag built from one aggregate query (row counts and the
+latest ``updated_at`` of what it shows), or from the cached transcript for
+the student profile, so a browser revalidating an unchanged page gets a 304
+without the page's own queries or rendering.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, Subquery, Value
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .models import Course, CourseGradeSummary, Enrollment, User, WaitlistEntry
+from .pagination import PAGE_SIZE, _page_queryset
+from .transcripts import get_transcript
+
+
+def _aggregate(queryset, aggregate):
+    # Grouping by a constant leaves no GROUP BY, so there's always exactly one row
+    return Subquery(
+        queryset.order_by().annotate(_all=Value(1)).values('_all')
+        .annotate(value=aggregate).values('value')
+    )
+
+
+def _summary(queryset, field='updated_at'):
+    return {'count': _aggregate(queryset, Count('pk')), 'latest': _aggregate(queryset, Max(field))}
+
+
+def page_etag(request, user, parts=None, extra=()):
+    """Weak ETag for ``user``'s view of a page, or None if the page can't be reused.
+
+    ``parts`` maps names to aggregate subqueries, which are all fetched in
+    one query; ``extra`` is anything else the page depends on.
+    """
+    if not user.is_authenticated or len(get_messages(request)):
+        return None
+    state = [user.name, user.email, user.last_login, *extra]
+    if parts:
+        annotations = {f'{name}_{key}': value for name, part in parts.items() for key, value in part.items()}
+        state.append(User.objects.filter(pk=user.pk).annotate(**annotations).values_list(*annotations).first())
+    # The page embeds a CSRF token, which is only good for the current cookie
+    state.append(request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+    return 'W/"%s"' % hashlib.md5(repr(state).encode()).hexdigest()
+
+
+def student_profile_etag(request, user):
+    # The transcript cache is already invalidated on every write that
+    # changes it, so on a hit this costs no queries at all
+    transcript = get_transcript(user.pk) if user.is_authenticated else None
+    return page_etag(request, user, extra=[transcript])
+
+
+def faculty_profile_etag(request, user):
+    return page_etag(request, user, {
+        'courses': _summary(Course.objects.filter(faculty_id=user.pk)),
+        'summaries': _summary(CourseGradeSummary.objects.filter(course__faculty_id=user.pk)),
+    })
+
+
+def catalog_etag(request, user, page_size=PAGE_SIZE):
+    # Imported here because views.py uses this module
+    from .views import catalog_queryset
+
+    page = _page_queryset(catalog_queryset(request.GET), request.GET.get('after'), page_size)
+    return page_etag(request, user, {
+        'page': _summary(Course.objects.filter(pk__in=page.values('pk'))),
+        'enrollments': _summary(Enrollment.objects.filter(student_id=user.pk)),
+        'waitlist': _summary(WaitlistEntry.objects.filter(student_id=user.pk), 'id'),
+        'faculty': {'count': _aggregate(User.objects.filter(is_staff=True), Count('pk'))},
+    }, extra=sorted(request.GET.lists()))
+
+
+def _finish(request, response, etag):
+    if etag is not None and request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+        # Browsers must check back with us, but can reuse the page on a 304
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(etag_func):
+    """Like Django's ``condition(etag_func=...)``, but also for async views.
+
+    ``etag_func(request, user)`` runs in a thread for async views, since it
+    queries the database.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                user = await request.auser()
+                etag = await sync_to_async(etag_func)(request, user)
+                response = get_conditional_response(request, etag=etag) if etag else None
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                etag = etag_func(request, request.user)
+                response = get_conditional_response(request, etag=etag) if etag else None
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(request, response, etag)
+        return inner
+    return decorator
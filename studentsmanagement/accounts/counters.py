@@ -0,0 +1,78 @@
+"""Enrollment and grade counters stored on Course.
+
+Pages read ``Course.enrolled_count`` and ``Course.graded_count`` instead of
+counting rows. The counters only ever change with ``F()`` increments and
+decrements in the same transaction as the write they count (seats are
+claimed in accounts/enrollment.py, grades are counted here), so concurrent
+writers can't lose each other's updates. Writes that bypass those paths,
+such as the admin site or raw SQL, can still make them drift, which
+reconcile_counters() repairs.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Now
+
+from .dashboard import invalidate_dashboard
+from .models import Course, Enrollment, Grade
+
+RECONCILE_CHUNK_SIZE = 500
+
+
+def adjust_graded(course_id, delta):
+    courses = Course.objects.filter(id=course_id)
+    if delta < 0:
+        # Never go below zero, even if the counter had already drifted
+        courses = courses.filter(graded_count__gte=-delta)
+    return courses.update(graded_count=F('graded_count') + delta, updated_at=Now())
+
+
+def _count(model):
+    counts = (
+        model.objects.filter(course=OuterRef('pk'))
+        .order_by().values('course').annotate(total=Count('id')).values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def reconcile_counters(course_ids=None, chunk_size=RECONCILE_CHUNK_SIZE, dry_run=False, progress=None):
+    """Recount enrollments and grades and fix courses whose counters have drifted.
+
+    Courses are walked by id in chunks of ``chunk_size``, each checked with
+    one query and fixed with one UPDATE in its own short transaction, so
+    large catalogs never hold many row locks at once. Returns the number of
+    courses checked and a list of (course_id, enrolled_count, actual,
+    graded_count, actual) for those that had drifted. ``progress``, if given,
+    is called with the number of courses checked so far after each chunk.
+    """
+    courses = Course.objects.order_by('id')
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+
+    checked = 0
+    drifted = []
+    after = 0
+    while True:
+        ids = list(courses.filter(id__gt=after).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        after = ids[-1]
+        checked += len(ids)
+        with transaction.atomic():
+            stale = list(
+                Course.objects.filter(id__in=ids)
+                .annotate(actual_enrolled=_count(Enrollment), actual_graded=_count(Grade))
+                .exclude(enrolled_count=F('actual_enrolled'), graded_count=F('actual_graded'))
+                .values_list('id', 'enrolled_count', 'actual_enrolled', 'graded_count', 'actual_graded')
+            )
+            if stale and not dry_run:
+                stale_ids = [row[0] for row in stale]
+                Course.objects.filter(id__in=stale_ids).update(
+                    enrolled_count=_count(Enrollment), graded_count=_count(Grade), updated_at=Now()
+                )
+        drifted.extend(stale)
+        if progress is not None:
+            progress(checked)
+
+    if drifted and not dry_run:
+        invalidate_dashboard()
+    return checked, drifted
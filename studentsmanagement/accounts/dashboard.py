@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Enrollment, Grade, User
+from .routers import primary_reads
+from .stats import course_stats_overview
+
+DASHBOARD_KEY = 'admin_dashboard:faculty'
+COURSE_STATS_KEY = 'admin_dashboard:course_stats'
+DASHBOARD_TIMEOUT = 5 * 60
+
+
+def _count_per_course(model):
+    counts = (
+        model.objects.filter(course=OuterRef('course__id'))
+        .order_by().values('course').annotate(total=Count('id')).values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def build_faculty_data():
+    """Return every faculty member with their courses and enrollment/grade counts.
+
+    Faculty, courses and the per-course counts come back from one query;
+    faculty without courses show up with a NULL course. The counts are
+    correlated subqueries rather than joins, since joining enrollments and
+    grades to a course would multiply its rows before anything is counted.
+    """
+    rows = (
+        User.objects.filter(is_staff=True)
+        .values('id', 'name', 'course__id', 'course__name')
+        .annotate(enrollments=_count_per_course(Enrollment), graded=_count_per_course(Grade))
+        .order_by('name', 'id', 'course__name')
+    )
+
+    faculty_data = []
+    current = None
+    for row in rows:
+        if current is None or current['id'] != row['id']:
+            current = {
+                'id': row['id'],
+                'name': row['name'],
+                'courses': [],
+                'course_count': 0,
+                'enrollment_count': 0,
+                'graded_count': 0,
+            }
+            faculty_data.append(current)
+        if row['course__id'] is not None:
+            current['courses'].append(row['course__name'])
+            current['course_count'] += 1
+            current['enrollment_count'] += row['enrollments']
+            current['graded_count'] += row['graded']
+    return faculty_data
+
+
+def get_faculty_data():
+    faculty_data = cache.get(DASHBOARD_KEY)
+    if faculty_data is None:
+        # Never cache what a lagging replica returned
+        with primary_reads():
+            faculty_data = build_faculty_data()
+        cache.set(DASHBOARD_KEY, faculty_data, DASHBOARD_TIMEOUT)
+    return faculty_data
+
+
+def get_course_stats():
+    course_stats = cache.get(COURSE_STATS_KEY)
+    if course_stats is None:
+        with primary_reads():
+            course_stats = list(course_stats_overview())
+        cache.set(COURSE_STATS_KEY, course_stats, DASHBOARD_TIMEOUT)
+    return course_stats
+
+
+def invalidate_dashboard():
+    keys = [DASHBOARD_KEY, COURSE_STATS_KEY]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.db.utils import ConnectionHandler
+
+from .benchmark import summarize
+
+
+def format_pool_stats(pool):
+    """The psycopg_pool statistics we care about, under readable names."""
+    raw = pool.get_stats()
+    size = raw.get('pool_size', 0)
+    available = raw.get('pool_available', 0)
+    return {
+        'pooled': True,
+        'min_size': raw.get('pool_min', 0),
+        'max_size': raw.get('pool_max', 0),
+        'in_use': size - available,
+        'idle': available,
+        'waiting': raw.get('requests_waiting', 0),
+        'requests': raw.get('requests_num', 0),
+        'requests_queued': raw.get('requests_queued', 0),
+        'wait_ms': raw.get('requests_wait_ms', 0),
+        'timeouts': raw.get('requests_errors', 0),
+        'connections_opened': raw.get('connections_num', 0),
+        'connections_lost': raw.get('connections_lost', 0),
+        'bad_returns': raw.get('returns_bad', 0),
+    }
+
+
+def pool_stats():
+    """Pool statistics for every database, keyed by alias. Unpooled ones report ``{'pooled': False}``."""
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        stats[alias] = format_pool_stats(pool) if pool is not None else {'pooled': False}
+    return stats
+
+
+def bench_settings(settings_dict, pool_size=None):
+    """Copy of ``settings_dict`` with a pool of ``pool_size`` connections, or no pool if it's None."""
+    options = {**settings_dict.get('OPTIONS', {})}
+    pool = options.pop('pool', None)
+    if pool_size is not None:
+        options['pool'] = {**(pool if isinstance(pool, dict) else {}), 'min_size': pool_size, 'max_size': pool_size}
+    return {**settings_dict, 'OPTIONS': options, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+def run_connection_benchmark(settings_dict, pooled, requests, concurrency, queries=3):
+    """Time ``requests`` simulated requests that each connect, run ``queries`` queries and close.
+
+    That is Django's per-request connection lifecycle: without a pool every
+    request opens a new connection, with one it borrows an open connection
+    and close() hands it back.
+    """
+    alias = 'bench_pooled' if pooled else 'bench_direct'
+    handler = ConnectionHandler({alias: bench_settings(settings_dict, concurrency if pooled else None)})
+    latencies = []
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        connection = handler[alias]
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                with connection.cursor() as cursor:
+                    for _ in range(queries):
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                connection.close()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    pool = handler[alias].pool if pooled else None
+    if pool is not None:
+        # Fill the pool first so the run measures steady state
+        pool.open(wait=True)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, per_worker))
+        elapsed = time.perf_counter() - started
+        result = summarize(alias, latencies, [queries] * len(latencies), [200] * len(latencies), elapsed)
+        if pool is not None:
+            result['pool'] = format_pool_stats(pool)
+    finally:
+        if pool is not None:
+            handler[alias].close_pool()
+    result['concurrency'] = concurrency
+    return result
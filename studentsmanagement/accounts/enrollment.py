@@ -0,0 +1,231 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Now
+
+from .dashboard import invalidate_dashboard
+from .models import Course, Enrollment, WaitlistEntry
+from .transcripts import invalidate_transcripts
+
+ENROLLED = 'enrolled'
+ALREADY_ENROLLED = 'already_enrolled'
+WAITLISTED = 'waitlisted'
+ALREADY_WAITLISTED = 'already_waitlisted'
+UNKNOWN_COURSE = 'unknown_course'
+
+MAX_BATCH_ENROLL = 20
+
+HAS_FREE_SEAT = Q(capacity__isnull=True) | Q(enrolled_count__lt=F('capacity'))
+
+# Set while this module adds or removes enrollments and keeps enrolled_count
+# itself. Every other write (the admin site, cascades, plain create() calls)
+# is counted by the Enrollment signals in accounts/signals.py.
+_counting_seats = ContextVar('enrollment_counting_seats', default=False)
+
+
+class CourseFull(Exception):
+    pass
+
+
+def claim_seat(course_id):
+    """Take a seat with one conditional UPDATE. Returns False if the course is full.
+
+    The database re-checks the WHERE clause after waiting for the row lock, so
+    concurrent claims can never push enrolled_count past capacity.
+    """
+    claimed = Course.objects.filter(HAS_FREE_SEAT, id=course_id).update(
+        enrolled_count=F('enrolled_count') + 1, updated_at=Now()
+    )
+    return claimed == 1
+
+
+def take_seat(course_id):
+    """Count an enrollment that was added regardless of capacity."""
+    Course.objects.filter(id=course_id).update(enrolled_count=F('enrolled_count') + 1, updated_at=Now())
+
+
+def release_seat(course_id):
+    Course.objects.filter(id=course_id, enrolled_count__gt=0).update(
+        enrolled_count=F('enrolled_count') - 1, updated_at=Now()
+    )
+
+
+@contextmanager
+def counting_seats():
+    """Mark the enrollment writes inside the block as already counted here."""
+    token = _counting_seats.set(True)
+    try:
+        yield
+    finally:
+        _counting_seats.reset(token)
+
+
+def seats_counted():
+    return _counting_seats.get()
+
+
+def enroll_student(student, course_id):
+    """Enroll ``student`` in the course, or put them on its waitlist if it is full.
+
+    The enrollment row is inserted before the seat is claimed, so the course
+    row is only locked for the last statement before commit. Every enrollment
+    locks that one row and nothing after it, which keeps simultaneous attempts
+    from deadlocking or queueing behind each other for long. The insert is a
+    plain INSERT in a savepoint rather than ON CONFLICT DO NOTHING, because
+    the savepoint is needed anyway to take the row back if the course is full.
+
+    Returns ENROLLED, ALREADY_ENROLLED, WAITLISTED or ALREADY_WAITLISTED.
+    """
+    with transaction.atomic(), counting_seats():
+        try:
+            with transaction.atomic():
+                Enrollment.objects.create(student=student, course_id=course_id)
+                if not claim_seat(course_id):
+                    raise CourseFull
+            return ENROLLED
+        except IntegrityError:
+            return ALREADY_ENROLLED
+        except CourseFull:
+            pass
+
+        try:
+            with transaction.atomic():
+                WaitlistEntry.objects.create(student=student, course_id=course_id)
+        except IntegrityError:
+            return ALREADY_WAITLISTED
+        # A seat may have been freed while we were joining the queue
+        transaction.on_commit(lambda: promote_waitlist(course_id))
+    return WAITLISTED
+
+
+def _student_rows(student, course_ids):
+    return Course.objects.filter(id__in=course_ids).annotate(
+        enrolled=Exists(Enrollment.objects.filter(student=student, course=OuterRef('pk'))),
+        waitlisted=Exists(WaitlistEntry.objects.filter(student=student, course=OuterRef('pk'))),
+    )
+
+
+def enroll_many(student, course_ids):
+    """Enroll ``student`` in several courses at once, waitlisting them where a course is full.
+
+    The courses are validated, together with the student's current
+    enrollments and waitlist entries, in one query. The rest happens in one
+    transaction: the remaining courses are locked in id order (so two batches
+    can't deadlock) and the student's rows for them are checked again under
+    the lock, since a double-submitted batch may have enrolled them in the
+    meantime. Their seats are then taken with a single UPDATE and the new
+    rows go in with two bulk inserts.
+
+    Returns a list of ``{'course_id', 'name', 'status'}`` in the order given,
+    where status is one of enroll_student()'s or UNKNOWN_COURSE.
+    """
+    course_ids = list(dict.fromkeys(course_ids))[:MAX_BATCH_ENROLL]
+    courses = {
+        course['id']: course
+        for course in _student_rows(student, course_ids).values('id', 'name', 'enrolled', 'waitlisted')
+    }
+    statuses = {
+        course_id: ALREADY_ENROLLED if course['enrolled'] else ALREADY_WAITLISTED
+        for course_id, course in courses.items()
+        if course['enrolled'] or course['waitlisted']
+    }
+    pending = [course_id for course_id in courses if course_id not in statuses]
+
+    if pending:
+        with transaction.atomic():
+            seats = list(
+                Course.objects.select_for_update().filter(id__in=pending).order_by('id')
+                .values_list('id', 'capacity', 'enrolled_count')
+            )
+            # Checked again in a new statement, which sees whatever a
+            # concurrent batch committed while we waited for the locks
+            for course_id, enrolled, waitlisted in _student_rows(student, pending).filter(
+                Q(enrolled=True) | Q(waitlisted=True)
+            ).values_list('id', 'enrolled', 'waitlisted'):
+                statuses[course_id] = ALREADY_ENROLLED if enrolled else ALREADY_WAITLISTED
+            free = []
+            full = []
+            for course_id, capacity, enrolled_count in seats:
+                if course_id in statuses:
+                    continue
+                if capacity is None or enrolled_count < capacity:
+                    free.append(course_id)
+                else:
+                    full.append(course_id)
+            # No ignore_conflicts: every row counted below must really be inserted
+            Enrollment.objects.bulk_create([Enrollment(student=student, course_id=course_id) for course_id in free])
+            WaitlistEntry.objects.bulk_create(
+                [WaitlistEntry(student=student, course_id=course_id) for course_id in full], ignore_conflicts=True
+            )
+            if free:
+                Course.objects.filter(id__in=free).update(enrolled_count=F('enrolled_count') + 1, updated_at=Now())
+                # Bulk inserts skip the post_save signals
+                invalidate_transcripts([student.id])
+                invalidate_dashboard()
+            for course_id in full:
+                # A seat may have been freed while we were joining the queue
+                transaction.on_commit(lambda course_id=course_id: promote_waitlist(course_id))
+        statuses.update({course_id: ENROLLED for course_id in free})
+        statuses.update({course_id: WAITLISTED for course_id in full})
+
+    return [
+        {
+            'course_id': course_id,
+            'name': courses[course_id]['name'] if course_id in courses else None,
+            'status': statuses.get(course_id, UNKNOWN_COURSE),
+        }
+        for course_id in course_ids
+    ]
+
+
+def promote_waitlist(course_id):
+    """Move students from the front of the waitlist into free seats. Returns their ids.
+
+    Waitlist entries are taken with SKIP LOCKED, so concurrent promotions
+    each work on a different student instead of waiting on one another.
+    """
+    if not Course.objects.filter(HAS_FREE_SEAT, id=course_id).exists():
+        return []
+
+    promoted = []
+    while True:
+        with transaction.atomic(), counting_seats():
+            entry = (
+                WaitlistEntry.objects.select_for_update(skip_locked=True)
+                .filter(course_id=course_id).order_by('id').first()
+            )
+            if entry is None:
+                break
+            entry.delete()
+            try:
+                with transaction.atomic():
+                    Enrollment.objects.create(student_id=entry.student_id, course_id=course_id)
+                    if not claim_seat(course_id):
+                        raise CourseFull
+            except IntegrityError:
+                # Already enrolled some other way; the stale entry is gone now
+                continue
+            except CourseFull:
+                transaction.set_rollback(True)
+                break
+            promoted.append(entry.student_id)
+    return promoted
+
+
+def drop_course(student, course_id):
+    """Remove ``student`` from the course or its waitlist. Returns False if they were in neither.
+
+    A freed seat goes to the waitlist in the same transaction, before anyone
+    else can claim it.
+    """
+    with transaction.atomic():
+        with counting_seats():
+            dropped, _ = Enrollment.objects.filter(student=student, course_id=course_id).delete()
+        if not dropped:
+            left, _ = WaitlistEntry.objects.filter(student=student, course_id=course_id).delete()
+            return bool(left)
+        release_seat(course_id)
+        promote_waitlist(course_id)
+    return True
@@ -0,0 +1,92 @@
+"""Cached markup for catalog cards and roster rows.
+
+Each card and row is rendered from its own small template and cached under
+a key built from what it shows: the course's ``updated_at`` for a card
+(seat counts and instructor renames touch it too), and the grade's
+``updated_at`` plus the student's name and email for a roster row. A write
+therefore never has to invalidate anything; the next page simply asks for
+a new key and old fragments expire. That also means a fragment rendered
+from a lagging replica is never served once the replica catches up.
+
+A page fetches all of its fragments with one ``get_many`` and stores the
+ones it had to render with one ``set_many``. The per-user parts, such as
+the "Enrolled" buttons, stay in the page template.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+FRAGMENT_TIMEOUT = 3600
+
+
+def card_key(course):
+    return f'fragment:course_card:{course.id}:{course.updated_at.timestamp()}'
+
+
+def roster_row_key(course, entry):
+    student = entry['student']
+    updated_at = entry['updated_at'].timestamp() if entry['updated_at'] else ''
+    # Hashed so any name or email makes a valid memcached key
+    person = hashlib.md5(f"{student.name}\0{student.email}".encode()).hexdigest()
+    return f'fragment:roster_row:{course.id}:{student.id}:{updated_at}:{person}'
+
+
+def _render_missing(items, cached, template_name, name):
+    return {
+        key: render_to_string(template_name, {name: item})
+        for key, item in items.items() if key not in cached
+    }
+
+
+def _fragments(items, template_name, name):
+    cached = cache.get_many(list(items))
+    missing = _render_missing(items, cached, template_name, name)
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+    return {**cached, **missing}
+
+
+async def _afragments(items, template_name, name):
+    cached = await cache.aget_many(list(items))
+    missing = _render_missing(items, cached, template_name, name)
+    if missing:
+        await cache.aset_many(missing, FRAGMENT_TIMEOUT)
+    return {**cached, **missing}
+
+
+def _cards(courses):
+    return {card_key(course): course for course in courses}
+
+
+def _set_cards(courses, fragments):
+    for course in courses:
+        course.card_html = mark_safe(fragments[card_key(course)])
+
+
+def _rows(course, student_data):
+    return {roster_row_key(course, entry): entry for entry in student_data}
+
+
+def _set_rows(course, student_data, fragments):
+    for entry in student_data:
+        entry['cells'] = mark_safe(fragments[roster_row_key(course, entry)])
+
+
+def attach_course_cards(courses):
+    """Set ``card_html`` on each course of a catalog page, with one cache read."""
+    _set_cards(courses, _fragments(_cards(courses), 'accounts/_course_card.html', 'course'))
+
+
+async def aattach_course_cards(courses):
+    _set_cards(courses, await _afragments(_cards(courses), 'accounts/_course_card.html', 'course'))
+
+
+def attach_roster_rows(course, student_data):
+    """Set ``cells`` on each roster entry: the cached name, email, marks and grade columns."""
+    _set_rows(course, student_data, _fragments(_rows(course, student_data), 'accounts/_roster_row.html', 'entry'))
+
+
+async def aattach_roster_rows(course, student_data):
+    _set_rows(course, student_data, await _afragments(_rows(course, student_data), 'accounts/_roster_row.html', 'entry'))
@@ -0,0 +1,144 @@
+import codecs
+import csv
+import json
+
+from django.db import transaction
+
+from . import audit
+from .counters import adjust_graded
+from .dashboard import invalidate_dashboard
+from .grading import scale_for_course
+from .models import MAX_MARKS, Enrollment, Grade, GradeAuditEntry
+from .stats import rebuild_course_stats
+from .transcripts import invalidate_transcripts
+
+BATCH_SIZE = 500
+
+
+def read_grade_rows(uploaded_file):
+    """Yield (row_number, row) pairs from an uploaded CSV or JSON grade file.
+
+    CSV files are decoded line by line so large rosters are never held in
+    memory as one string. Expected columns: student_id or email, marks and an optional grade.
+    """
+    name = (uploaded_file.name or '').lower()
+    if name.endswith('.json') or uploaded_file.content_type == 'application/json':
+        data = json.load(uploaded_file)
+        if isinstance(data, dict):
+            data = data.get('grades', [])
+        if not isinstance(data, list):
+            raise ValueError('Expected a list of grades, or an object with a "grades" list.')
+        for number, row in enumerate(data, start=1):
+            yield number, row
+        return
+
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    # Line 1 is the header, so data rows start at 2
+    for number, row in enumerate(reader, start=2):
+        yield number, row
+
+
+def _clean_row(row):
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object with student_id/email, marks and grade.')
+
+    student_id = str(row.get('student_id') or '').strip()
+    email = str(row.get('email') or '').strip().lower()
+    if not student_id and not email:
+        raise ValueError('Missing student_id or email.')
+
+    try:
+        marks = float(row.get('marks'))
+    except (TypeError, ValueError):
+        raise ValueError('Marks must be a number.')
+    if not 0 <= marks <= MAX_MARKS:
+        raise ValueError(f'Marks must be between 0 and {MAX_MARKS}.')
+
+    # Blank letters are filled in from the course's grading scale
+    grade = str(row.get('grade') or '').strip()
+    if len(grade) > Grade._meta.get_field('grade').max_length:
+        raise ValueError('Grade is too long.')
+
+    return student_id, email, marks, grade
+
+
+def import_grades(course, rows):
+    """Validate ``rows`` and upsert them as grades for ``course``.
+
+    Rows are checked in a single pass against the course roster, which is
+    loaded with one query. All valid rows are then upserted in one transaction
+    with batched insert-on-conflict statements. Returns a report with per-row
+    errors.
+    """
+    roster = Enrollment.objects.filter(course=course).values_list('student_id', 'student__email')
+    ids_by_email = {}
+    enrolled_ids = set()
+    for student_id, email in roster:
+        enrolled_ids.add(student_id)
+        ids_by_email[email.lower()] = student_id
+
+    scale = scale_for_course(course.id)
+    errors = []
+    pending = {}
+    total = 0
+    for number, row in rows:
+        total += 1
+        try:
+            student_id, email, marks, grade = _clean_row(row)
+        except ValueError as exc:
+            errors.append({'row': number, 'error': str(exc)})
+            continue
+
+        if student_id:
+            resolved = int(student_id) if student_id.isdigit() else None
+            if resolved not in enrolled_ids:
+                resolved = None
+        else:
+            resolved = ids_by_email.get(email)
+        if resolved is None:
+            errors.append({'row': number, 'error': 'Student is not enrolled in this course.'})
+            continue
+        if resolved in pending:
+            errors.append({'row': number, 'error': 'Duplicate entry for this student.'})
+            continue
+        pending[resolved] = (marks, grade or scale.letter_for(marks))
+
+    created = updated = 0
+    if pending:
+        with transaction.atomic():
+            existing = {
+                student_id: (marks, letter)
+                for student_id, marks, letter in
+                Grade.objects.filter(course=course, student_id__in=pending).values_list('student_id', 'marks', 'grade')
+            }
+            # One INSERT ... ON CONFLICT DO UPDATE per batch
+            Grade.objects.bulk_create(
+                [
+                    Grade(student_id=student_id, course=course, marks=marks, grade=letter)
+                    for student_id, (marks, letter) in pending.items()
+                ],
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['student', 'course'],
+                update_fields=['marks', 'grade', 'updated_at'],
+            )
+            updated = len(existing)
+            created = len(pending) - updated
+            if created:
+                adjust_graded(course.id, created)
+            audit.record(
+                audit.entry(student_id, course.id, GradeAuditEntry.IMPORT, existing.get(student_id, (None, '')), new)
+                for student_id, new in pending.items()
+                if existing.get(student_id) != new
+            )
+            # Bulk writes skip the post_save signals, so refresh derived data here
+            invalidate_transcripts(pending)
+            invalidate_dashboard()
+            rebuild_course_stats([course.id])
+
+    return {
+        'rows': total,
+        'created': created,
+        'updated': updated,
+        'errors': errors,
+    }
@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Now
+
+from . import audit
+from .models import MAX_MARKS, Grade, GradeAuditEntry, GradingScale
+from .transcripts import invalidate_transcripts
+
+# Used for courses without a scale when no scale is marked as the default
+DEFAULT_CUTOFFS = [[95, 'A+'], [85, 'A'], [70, 'B'], [60, 'C'], [50, 'D'], [0, 'F']]
+
+
+def clean_cutoffs(cutoffs):
+    """Validate cutoffs and return them as [min_marks, letter] pairs, highest first.
+
+    Accepts a list of pairs or a string such as ``"A=85,B=70,F=0"``.
+    Raises ValueError if anything is off.
+    """
+    if isinstance(cutoffs, str):
+        pairs = []
+        for part in cutoffs.split(','):
+            letter, sep, min_marks = part.partition('=')
+            if not sep:
+                raise ValueError(f'Cutoff "{part.strip()}" must look like LETTER=MARKS.')
+            pairs.append((min_marks, letter))
+        cutoffs = pairs
+
+    max_length = Grade._meta.get_field('grade').max_length
+    cleaned = []
+    for min_marks, letter in cutoffs:
+        letter = str(letter).strip()
+        if not letter or len(letter) > max_length:
+            raise ValueError(f'Letters must be 1 to {max_length} characters long.')
+        try:
+            min_marks = float(min_marks)
+        except (TypeError, ValueError):
+            raise ValueError('Cutoff marks must be numbers.')
+        if not 0 <= min_marks <= MAX_MARKS:
+            raise ValueError(f'Cutoff marks must be between 0 and {MAX_MARKS}.')
+        cleaned.append([int(min_marks) if min_marks.is_integer() else min_marks, letter])
+
+    if not cleaned:
+        raise ValueError('A grading scale needs at least one cutoff.')
+    if len({min_marks for min_marks, _ in cleaned}) != len(cleaned):
+        raise ValueError('Cutoff marks must be unique.')
+    return sorted(cleaned, key=lambda pair: pair[0], reverse=True)
+
+
+def default_scale():
+    """The scale used by courses without one of their own."""
+    scale = GradingScale.objects.filter(is_default=True).first()
+    return scale or GradingScale(name='Default', cutoffs=DEFAULT_CUTOFFS, is_default=True)
+
+
+def scale_for_course(course_id):
+    return GradingScale.objects.filter(courses=course_id).first() or default_scale()
+
+
+def letter_expression(cutoffs):
+    """SQL CASE expression giving the letter for ``marks`` under ``cutoffs``."""
+    return Case(
+        *[When(marks__gte=min_marks, then=Value(letter)) for min_marks, letter in cutoffs[:-1]],
+        default=Value(cutoffs[-1][1]),
+    )
+
+
+def regrade(course_ids=None, scale=None):
+    """Recompute grade letters from marks, for every course or just ``course_ids``.
+
+    With ``scale`` only the courses using that scale are regraded. Each scale
+    becomes a single ``UPDATE ... SET grade = CASE ...`` that only touches
+    rows whose letter changes; only their ids, marks and old letters are
+    loaded, to refresh transcripts and for the audit log.
+    Returns the number of grades that changed.
+    """
+    grades = Grade.objects.all()
+    if course_ids is not None:
+        grades = grades.filter(course_id__in=course_ids)
+
+    scales = [scale] if scale is not None else list(GradingScale.objects.all())
+    groups = []
+    for each in scales:
+        courses = Q(course__grading_scale=each)
+        if each.is_default:
+            courses |= Q(course__grading_scale__isnull=True)
+        groups.append((each.cutoffs, courses))
+    if scale is None and not any(each.is_default for each in scales):
+        groups.append((DEFAULT_CUTOFFS, Q(course__grading_scale__isnull=True)))
+
+    changed = 0
+    with transaction.atomic():
+        for cutoffs, courses in groups:
+            letter = letter_expression(cutoffs)
+            stale = grades.filter(courses).exclude(grade=letter)
+            rows = list(stale.values_list('student_id', 'course_id', 'marks', 'grade'))
+            if rows:
+                changed += stale.update(grade=letter, updated_at=Now())
+                invalidate_transcripts(row[0] for row in rows)
+                # The same letters the CASE expression picked, for the audit log
+                scale = GradingScale(cutoffs=cutoffs)
+                audit.record(
+                    audit.entry(student_id, course_id, GradeAuditEntry.REGRADE,
+                                (marks, old), (marks, scale.letter_for(marks)))
+                    for student_id, course_id, marks, old in rows
+                )
+    return changed
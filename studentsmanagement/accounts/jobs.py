@@ -0,0 +1,231 @@
+"""Background jobs kept in the database, with no broker to run.
+
+Requests call enqueue() and return straight away. ``manage.py run_jobs``
+workers claim due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any
+number of them can poll the same table without handing out a job twice.
+A failed job is retried with exponential backoff until it runs out of
+attempts. Task functions take the job and the payload's keys as keyword
+arguments, may call ``job.report_progress()`` and return a JSON-able result.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .audit import acting_as
+from .counters import reconcile_counters
+from .dashboard import invalidate_dashboard
+from .grade_import import import_grades
+from .grading import regrade
+from .models import Course, GradingScale, Job
+from .stats import rebuild_course_stats
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+# Workers touch the running job's heartbeat this often
+HEARTBEAT_SECONDS = 60
+# A running job whose worker has been silent this long is assumed dead
+STALE_AFTER = timedelta(minutes=5)
+# How often polling workers look for such jobs
+REQUEUE_EVERY_SECONDS = 60
+
+TASKS = {}
+
+
+def task(kind):
+    """Register a function as the task run for jobs of ``kind``."""
+    def decorator(func):
+        TASKS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, user=None, max_attempts=3):
+    if kind not in TASKS:
+        raise ValueError(f'Unknown job kind "{kind}".')
+    return Job.objects.create(kind=kind, payload=payload or {}, created_by=user, max_attempts=max_attempts)
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_job(worker):
+    """Mark the next due job as running and return it, or None if nothing is due."""
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.worker = worker
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.progress = 0
+        job.save(update_fields=['status', 'attempts', 'worker', 'started_at', 'heartbeat_at', 'progress'])
+    return job
+
+
+def _this_run(job):
+    """The job's row, as long as it is still this claim's run.
+
+    A job whose heartbeat went stale is claimed again, which bumps its
+    attempts, so a worker that was only slow can't touch the new run.
+    """
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, attempts=job.attempts)
+
+
+def beat(job):
+    """Record that the job's worker is still alive."""
+    _this_run(job).update(heartbeat_at=timezone.now())
+
+
+@contextmanager
+def heartbeat(job, every=HEARTBEAT_SECONDS):
+    """Beat for the job from a background thread while the block runs.
+
+    Tasks that never report progress still look alive, however long they take.
+    """
+    stop = threading.Event()
+
+    def run():
+        try:
+            while not stop.wait(every):
+                try:
+                    beat(job)
+                except Exception:
+                    logger.warning('Could not record a heartbeat for job %s', job.pk, exc_info=True)
+        finally:
+            # The thread's own connection; nothing else will close it
+            connection.close()
+
+    thread = threading.Thread(target=run, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns the job's new status.
+
+    Returns None if the job was taken away from this worker while it ran; the
+    outcome is then left to the run that has it now.
+    """
+    try:
+        func = TASKS[job.kind]
+        # Grade changes made by the job are the work of whoever queued it
+        with acting_as(job.created_by_id):
+            result = func(job, **job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            logger.warning('Job %s failed, retrying at %s', job.pk, job.run_after, exc_info=True)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error('Job %s failed for good after %s attempts', job.pk, job.attempts, exc_info=True)
+        return _record_outcome(job, ['status', 'error', 'run_after', 'finished_at'])
+
+    job.status = Job.SUCCEEDED
+    job.result = result
+    job.progress = 100
+    job.finished_at = timezone.now()
+    return _record_outcome(job, ['status', 'result', 'progress', 'finished_at'])
+
+
+def _record_outcome(job, fields):
+    if not _this_run(job).update(**{name: getattr(job, name) for name in fields}):
+        logger.warning('Job %s was requeued while worker %s ran it; dropping its outcome', job.pk, job.worker)
+        return None
+    return job.status
+
+
+def release_job(job):
+    """Put a job this worker claimed back in the queue without running it."""
+    _this_run(job).update(status=Job.QUEUED, worker='')
+
+
+def requeue_stale_jobs(stale_after=STALE_AFTER):
+    """Recover jobs whose worker died mid-run. Returns how many.
+
+    They go back in the queue, unless that run was their last attempt, in
+    which case they fail.
+    """
+    now = timezone.now()
+    cutoff = now - stale_after
+    silent = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    stale = Job.objects.filter(silent, status=Job.RUNNING)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, error='The worker running this job stopped responding.'
+    )
+    return failed + stale.update(status=Job.QUEUED, run_after=now, worker='')
+
+
+def job_status(job):
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'progress_message': job.progress_message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        # The traceback is for the logs; clients get its last line
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'heartbeat_at': job.heartbeat_at,
+        'finished_at': job.finished_at,
+    }
+
+
+@task('import_grades')
+def import_grades_task(job, course_id, rows):
+    course = Course.objects.get(id=course_id)
+    # rows are the [row number, row] pairs read from the upload
+    return import_grades(course, rows)
+
+
+@task('regrade')
+def regrade_task(job, course_ids=None, scale_id=None):
+    scale = GradingScale.objects.get(id=scale_id) if scale_id is not None else None
+    return {'changed': regrade(course_ids, scale=scale)}
+
+
+@task('rebuild_grade_stats')
+def rebuild_grade_stats_task(job, course_ids=None):
+    rebuilt = rebuild_course_stats(course_ids)
+    invalidate_dashboard()
+    return {'courses': rebuilt}
+
+
+@task('reconcile_counters')
+def reconcile_counters_task(job, course_ids=None):
+    total = len(course_ids) if course_ids is not None else Course.objects.count()
+    checked, drifted = reconcile_counters(
+        course_ids, progress=lambda done: job.report_progress(done, total, f'{done} of {total} courses checked')
+    )
+    return {'checked': checked, 'fixed': len(drifted)}
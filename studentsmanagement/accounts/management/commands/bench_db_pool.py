@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from accounts.dbpool import run_connection_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-request latency with and without connection pooling at several concurrency levels. '
+        'Needs PostgreSQL and psycopg[pool].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=int, default=500, help='Simulated requests per run.')
+        parser.add_argument('--concurrency', default='1,8,32',
+                            help='Comma-separated list of concurrency levels to run.')
+        parser.add_argument('--queries', type=int, default=3, help='Queries per simulated request.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of integers.')
+        if options['requests'] < 1 or any(level < 1 for level in levels):
+            raise CommandError('--requests and --concurrency must be positive.')
+
+        settings_dict = connections[options['database']].settings_dict
+        if connections[options['database']].vendor != 'postgresql':
+            raise CommandError('Connection pooling is only available on PostgreSQL.')
+
+        results = []
+        for concurrency in levels:
+            for pooled in (False, True):
+                result = run_connection_benchmark(
+                    settings_dict, pooled, options['requests'], concurrency, options['queries']
+                )
+                results.append(result)
+                self.stdout.write(
+                    f"{'pooled' if pooled else 'direct':<7} c={concurrency:<3} {result['rps']:>8} req/s  "
+                    f"p50 {result['p50_ms']:>7} ms  p95 {result['p95_ms']:>7} ms  p99 {result['p99_ms']:>7} ms"
+                    + (f"  wait {result['pool']['wait_ms']} ms  timeouts {result['pool']['timeouts']}"
+                       if pooled else '')
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
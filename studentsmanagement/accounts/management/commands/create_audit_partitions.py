@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from accounts.audit import ensure_partitions, upcoming_months
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly partitions of the grade audit log ahead of time (PostgreSQL only).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3,
+                            help='Number of months to cover, starting with the current one.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('The grade audit log is only partitioned on PostgreSQL; nothing to do.')
+            return
+        created = ensure_partitions(upcoming_months(max(options['months'], 1)))
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partitions.'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.batch_transcripts import CHUNK_SIZE, FORMATS, generate_transcripts
+
+
+class Command(BaseCommand):
+    help = 'Write a transcript document for every student into a directory or a .zip file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory to write into, or a path ending in .zip.')
+        parser.add_argument('--format', choices=FORMATS, default='html',
+                            help='Document format. PDF needs the weasyprint package.')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes for rendering (default: CPU count).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Students loaded and rendered per batch; bounds memory use.')
+        parser.add_argument('--student', type=int, action='append', dest='students',
+                            help='Only this student (may be repeated).')
+
+    def handle(self, *args, **options):
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{done} transcripts written...')
+
+        try:
+            report = generate_transcripts(
+                options['output'],
+                fmt=options['format'],
+                processes=options['processes'],
+                chunk_size=max(options['chunk_size'], 1),
+                student_ids=options['students'],
+                progress=progress,
+            )
+        except (ValueError, OSError) as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {report['transcripts']} transcripts ({report['bytes'] / 1024 / 1024:.1f} MB) "
+            f"to {options['output']} in {report['seconds']}s ({report['transcripts_per_second']} transcripts/s)."
+        ))
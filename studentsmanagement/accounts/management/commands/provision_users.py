@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import CHUNK_SIZE, provision_users, read_user_rows
+
+
+class Command(BaseCommand):
+    help = 'Create users in bulk from a CSV file with name,email,password,user_type columns.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes for password hashing (default: CPU count).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            handle = open(options['csv_file'], newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        with handle:
+            report = provision_users(
+                read_user_rows(handle),
+                processes=options['processes'],
+                chunk_size=options['chunk_size'],
+            )
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} of {report['rows']} users in {report['seconds']}s "
+            f"({report['users_per_second']} users/s)."
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.dashboard import invalidate_dashboard
+from accounts.stats import rebuild_course_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-course grade statistics from the Grade table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only rebuild this course (may be repeated).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rebuilt = rebuild_course_stats(options['courses'])
+        invalidate_dashboard()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt statistics for {rebuilt} courses in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.grading import regrade
+from accounts.models import GradingScale
+
+
+class Command(BaseCommand):
+    help = 'Recompute grade letters from marks using each course\'s grading scale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only regrade this course (may be repeated).')
+        parser.add_argument('--scale', help='Only regrade the courses using this scale.')
+
+    def handle(self, *args, **options):
+        scale = None
+        if options['scale']:
+            try:
+                scale = GradingScale.objects.get(name=options['scale'])
+            except GradingScale.DoesNotExist:
+                raise CommandError(f"No grading scale named \"{options['scale']}\".")
+
+        started = time.perf_counter()
+        changed = regrade(options['courses'], scale=scale)
+        self.stdout.write(self.style.SUCCESS(
+            f'Changed {changed} grades in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts import audit
+from accounts.jobs import (
+    REQUEUE_EVERY_SECONDS, claim_job, default_worker_name, heartbeat, release_job, requeue_stale_jobs, run_job,
+)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs. Start as many workers as you like; each job runs once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are due now, then exit instead of polling.')
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help='Seconds to wait before polling again when the queue is empty.')
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help='Exit after this many jobs (0 for no limit), e.g. to recycle the process.')
+        parser.add_argument('--worker-id', default=default_worker_name(),
+                            help='Name recorded on the jobs this worker runs (default host:pid).')
+
+    def handle(self, *args, **options):
+        worker = options['worker_id']
+        done = 0
+        job = None
+        next_requeue = 0
+        try:
+            while not options['max_jobs'] or done < options['max_jobs']:
+                # Long-running workers must not hold on to dropped connections
+                close_old_connections()
+                # Other workers can die while this one keeps polling
+                if time.monotonic() >= next_requeue:
+                    self.recover_stale_jobs()
+                    next_requeue = time.monotonic() + REQUEUE_EVERY_SECONDS
+                job = claim_job(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                started = time.perf_counter()
+                with heartbeat(job):
+                    status = run_job(job)
+                # Don't leave the job's audit entries waiting for the next one
+                audit.flush()
+                done += 1
+                status = status or 'taken over by another worker'
+                self.stdout.write(f'{job.kind} #{job.pk}: {status} in {time.perf_counter() - started:.2f}s')
+                job = None
+        except KeyboardInterrupt:
+            if job is not None:
+                # Hand the job to the next worker rather than leave it looking stuck
+                release_job(job)
+                self.stdout.write(f'Interrupted; {job.kind} #{job.pk} is queued again.')
+            else:
+                self.stdout.write('Interrupted.')
+        self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs.'))
+
+    def recover_stale_jobs(self):
+        recovered = requeue_stale_jobs()
+        if recovered:
+            self.stdout.write(f'Recovered {recovered} jobs left running by a dead worker.')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.grading import clean_cutoffs, regrade
+from accounts.models import Course, GradingScale
+
+
+class Command(BaseCommand):
+    help = 'Create or update a grading scale, optionally assign it to courses, and regrade them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name')
+        parser.add_argument('cutoffs', help='Letters and their minimum marks, e.g. "A=85,B=70,C=55,F=0".')
+        parser.add_argument('--default', action='store_true',
+                            help='Use this scale for every course without a scale of its own.')
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Assign the scale to this course (may be repeated).')
+        parser.add_argument('--no-regrade', action='store_true',
+                            help='Leave existing letters as they are.')
+
+    def handle(self, *args, **options):
+        try:
+            cutoffs = clean_cutoffs(options['cutoffs'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        with transaction.atomic():
+            if options['default']:
+                GradingScale.objects.filter(is_default=True).exclude(name=options['name']).update(is_default=False)
+            scale, created = GradingScale.objects.update_or_create(
+                name=options['name'],
+                defaults={'cutoffs': cutoffs, **({'is_default': True} if options['default'] else {})},
+            )
+            if options['courses']:
+                Course.objects.filter(id__in=options['courses']).update(grading_scale=scale)
+            changed = 0 if options['no_regrade'] else regrade(scale=scale)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Created' if created else 'Updated'} scale \"{scale.name}\"; changed {changed} grades."
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:26
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Keep the first enrollment and the most recent grade per (student, course)
+    for model_name, keep in (('Enrollment', Min), ('Grade', Max)):
+        model = apps.get_model('accounts', model_name)
+        keep_ids = model.objects.values('student_id', 'course_id').annotate(keep_id=keep('id')).values('keep_id')
+        model.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_course_enrollment_grade'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'student'], name='enrollment_course_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['course', 'student'], include=('marks', 'grade'), name='grade_course_roster_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_enrollment_student_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='grade',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_grade_student_course'),
+        ),
+    ]
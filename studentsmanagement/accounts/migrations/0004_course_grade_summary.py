@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    Grade = apps.get_model('accounts', 'Grade')
+    CourseGradeSummary = apps.get_model('accounts', 'CourseGradeSummary')
+
+    summaries = {}
+    for course_id, marks in Grade.objects.order_by('course_id').values_list('course_id', 'marks').iterator():
+        summary = summaries.get(course_id)
+        if summary is None:
+            summary = summaries[course_id] = CourseGradeSummary(
+                course_id=course_id, min_marks=marks, max_marks=marks, histogram=[0] * 101
+            )
+        summary.count += 1
+        summary.total += marks
+        summary.total_squares += marks * marks
+        summary.min_marks = min(summary.min_marks, marks)
+        summary.max_marks = max(summary.max_marks, marks)
+        summary.histogram[min(max(int(marks), 0), 100)] += 1
+    CourseGradeSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_enrollment_grade_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseGradeSummary',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='grade_summary', serialize=False, to='accounts.course')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('total_squares', models.FloatField(default=0)),
+                ('min_marks', models.FloatField(null=True)),
+                ('max_marks', models.FloatField(null=True)),
+                ('histogram', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_default_scale(apps, schema_editor):
+    GradingScale = apps.get_model('accounts', 'GradingScale')
+    # Existing letters are left alone until the regrade command is run
+    GradingScale.objects.get_or_create(
+        name='Standard',
+        defaults={
+            'cutoffs': [[95, 'A+'], [85, 'A'], [70, 'B'], [60, 'C'], [50, 'D'], [0, 'F']],
+            'is_default': True,
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_course_grade_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('cutoffs', models.JSONField()),
+                ('is_default', models.BooleanField(default=False)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='single_default_grading_scale')],
+            },
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='grading_scale',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='courses', to='accounts.gradingscale'),
+        ),
+        migrations.RunPython(create_default_scale, migrations.RunPython.noop),
+    ]
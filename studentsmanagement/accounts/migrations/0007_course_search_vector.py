@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# The search column is maintained by PostgreSQL itself as a stored generated
+# column, so it isn't part of the Course model; accounts/search.py reads it
+# with RawSQL. Other databases skip this migration and search with LIKE.
+CREATE_SEARCH_VECTOR = [
+    """
+    ALTER TABLE accounts_course ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX course_search_vector_idx ON accounts_course USING gin (search_vector)',
+]
+
+DROP_SEARCH_VECTOR = [
+    'DROP INDEX IF EXISTS course_search_vector_idx',
+    'ALTER TABLE accounts_course DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_course_capacity_waitlist'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(CREATE_SEARCH_VECTOR), run_on_postgresql(DROP_SEARCH_VECTOR)),
+    ]
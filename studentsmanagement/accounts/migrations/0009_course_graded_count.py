@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_grades(apps, schema_editor):
+    Course = apps.get_model('accounts', 'Course')
+    Grade = apps.get_model('accounts', 'Grade')
+    counts = (
+        Grade.objects.filter(course=OuterRef('pk'))
+        .order_by().values('course').annotate(total=Count('id')).values('total')
+    )
+    Course.objects.update(graded_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='graded_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_grades, migrations.RunPython.noop),
+    ]
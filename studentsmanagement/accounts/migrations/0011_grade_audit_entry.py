@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# On PostgreSQL the audit log is a table partitioned by month, so old months
+# can be detached or archived without touching the live ones. A partitioned
+# table's primary key has to include the partition key, hence (id,
+# changed_at); Django only ever looks at id. Rows for months without a
+# partition land in the default partition. accounts/audit.py and the
+# create_audit_partitions command add monthly partitions ahead of time.
+CREATE_PARTITIONED_TABLE = [
+    """
+    CREATE TABLE accounts_gradeauditentry (
+        id bigint GENERATED BY DEFAULT AS IDENTITY,
+        student_id bigint NOT NULL,
+        course_id bigint NOT NULL,
+        actor_id bigint NULL,
+        source varchar(10) NOT NULL,
+        old_marks double precision NULL,
+        new_marks double precision NULL,
+        old_grade varchar(2) NOT NULL,
+        new_grade varchar(2) NOT NULL,
+        changed_at timestamp with time zone NOT NULL,
+        PRIMARY KEY (id, changed_at)
+    ) PARTITION BY RANGE (changed_at)
+    """,
+    'CREATE INDEX grade_audit_history_idx ON accounts_gradeauditentry (student_id, course_id, changed_at)',
+    'CREATE TABLE accounts_gradeauditentry_default PARTITION OF accounts_gradeauditentry DEFAULT',
+]
+
+
+def create_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(apps.get_model('accounts', 'GradeAuditEntry'))
+        return
+    for statement in CREATE_PARTITIONED_TABLE:
+        schema_editor.execute(statement)
+
+
+def drop_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('accounts', 'GradeAuditEntry'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_job'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='GradeAuditEntry',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('source', models.CharField(choices=[('edit', 'Edit'), ('import', 'Import'), ('regrade', 'Regrade'), ('delete', 'Delete')], max_length=10)),
+                        ('old_marks', models.FloatField(blank=True, null=True)),
+                        ('new_marks', models.FloatField(blank=True, null=True)),
+                        ('old_grade', models.CharField(blank=True, max_length=2)),
+                        ('new_grade', models.CharField(blank=True, max_length=2)),
+                        ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                        ('course', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.course')),
+                        ('student', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['student', 'course', 'changed_at'], name='grade_audit_history_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_table, drop_table),
+    ]
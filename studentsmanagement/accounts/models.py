@@ -4,6 +4,10 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 # from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+# Marks are out of this many
+MAX_MARKS = 100
 
 
 class UserManager(BaseUserManager):
@@ -34,10 +38,44 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class GradingScale(models.Model):
+    """Maps marks to letter grades.
+
+    ``cutoffs`` is a list of [min_marks, letter] pairs from the highest cutoff
+    down; the last pair catches everything below the others.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    cutoffs = models.JSONField()
+    is_default = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['is_default'], condition=models.Q(is_default=True), name='single_default_grading_scale'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def letter_for(self, marks):
+        for min_marks, letter in self.cutoffs:
+            if marks >= min_marks:
+                return letter
+        return self.cutoffs[-1][1]
+
+
 class Course(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     faculty = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'is_staff': True})
+    # Courses without a scale use the default one
+    grading_scale = models.ForeignKey(GradingScale, null=True, blank=True, on_delete=models.SET_NULL, related_name='courses')
+    # Seats; None means unlimited. enrolled_count is only changed with
+    # conditional UPDATEs (see accounts/enrollment.py) so it never passes capacity.
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    enrolled_count = models.PositiveIntegerField(default=0)
+    # Kept in step with F() updates (see accounts/counters.py)
+    graded_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -46,15 +84,205 @@ class Enrollment(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'is_staff': False})
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     enrolled_on = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_enrollment_student_course'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'student'], name='enrollment_course_student_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.name} - {self.course.name}"
 
+class WaitlistEntry(models.Model):
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'is_staff': False})
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist')
+    joined_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_waitlist_student_course'),
+        ]
+        indexes = [
+            # Promotion takes the oldest entry of a course first
+            models.Index(fields=['course', 'id'], name='waitlist_course_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.name} - {self.course.name} (waitlisted)"
+
 class Grade(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'is_staff': False})
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     marks = models.FloatField()
     grade = models.CharField(max_length=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_grade_student_course'),
+        ]
+        indexes = [
+            # Covers roster reads (course -> students with marks/grade) on PostgreSQL
+            models.Index(fields=['course', 'student'], include=['marks', 'grade'], name='grade_course_roster_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.name} - {self.course.name} - {self.grade}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored marks so statistics can be updated incrementally,
+        # and both values for the audit log
+        instance._loaded_marks = instance.__dict__.get('marks')
+        instance._loaded_grade = instance.__dict__.get('grade')
+        return instance
+
+
+class CourseGradeSummary(models.Model):
+    """Running totals of a course's marks, kept up to date as grades change."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='grade_summary')
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    total_squares = models.FloatField(default=0)
+    min_marks = models.FloatField(null=True)
+    max_marks = models.FloatField(null=True)
+    # histogram[m] is the number of grades with floor(marks) == m, for m in 0..100
+    histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course.name} - {self.count} grades"
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def std_dev(self):
+        if not self.count:
+            return None
+        variance = self.total_squares / self.count - self.mean ** 2
+        return max(variance, 0) ** 0.5
+
+    def percentile(self, pct):
+        """Marks at the given percentile, to the nearest whole mark."""
+        if not self.count:
+            return None
+        rank = max(1, -(-pct * self.count // 100))
+        seen = 0
+        for marks, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return marks
+        return len(self.histogram) - 1
+
+    @property
+    def median(self):
+        return self.percentile(50)
+
+    def histogram_bins(self, width=10):
+        """Return (label, count) pairs grouping the histogram into ``width``-mark bins."""
+        bins = []
+        for start in range(0, len(self.histogram), width):
+            end = min(start + width, len(self.histogram)) - 1
+            label = f'{start}-{end}' if end > start else str(start)
+            bins.append((label, sum(self.histogram[start:start + width])))
+        return bins
+
+
+class Job(models.Model):
+    """A unit of background work, run by the run_jobs worker (see accounts/jobs.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Not picked up before this time; pushed back on every retry
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.PositiveSmallIntegerField(default=0)
+    progress_message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched while the job runs; a running job that stops beating has lost its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers look for the next due job
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    def report_progress(self, done, total, message=''):
+        """Record how far the job has got, as ``done`` out of ``total`` steps."""
+        self.progress = min(100, int(done * 100 / total)) if total else 100
+        self.progress_message = message[:200]
+        self.heartbeat_at = timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            progress=self.progress, progress_message=self.progress_message, heartbeat_at=self.heartbeat_at
+        )
+
+
+class GradeAuditEntry(models.Model):
+    """One change to a grade, kept forever. Written in batches by accounts/audit.py.
+
+    Rows are never updated or deleted, and outlive the users, courses and
+    grades they refer to, so the foreign keys have no database constraints.
+    On PostgreSQL the table is partitioned by month of ``changed_at``.
+    """
+    EDIT = 'edit'
+    IMPORT = 'import'
+    REGRADE = 'regrade'
+    DELETE = 'delete'
+    SOURCE_CHOICES = [
+        (EDIT, 'Edit'),
+        (IMPORT, 'Import'),
+        (REGRADE, 'Regrade'),
+        (DELETE, 'Delete'),
+    ]
+
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='+')
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    # Who made the change; empty for commands and other changes outside a request
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.DO_NOTHING,
+                              db_constraint=False, related_name='+')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    # Old values are empty for a new grade, new values for a deleted one
+    old_marks = models.FloatField(null=True, blank=True)
+    new_marks = models.FloatField(null=True, blank=True)
+    old_grade = models.CharField(max_length=2, blank=True)
+    new_grade = models.CharField(max_length=2, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # History of one student in one course
+            models.Index(fields=['student', 'course', 'changed_at'], name='grade_audit_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id}/{self.course_id}: {self.old_grade or '-'} -> {self.new_grade or '-'}"
@@ -0,0 +1,51 @@
+PAGE_SIZE = 24
+
+
+def parse_cursor(value):
+    """Return the integer cursor from a query-string value, or None if it is missing or invalid."""
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor > 0 else None
+
+
+def keyset_page(queryset, after=None, page_size=PAGE_SIZE):
+    """Return one page of ``queryset`` ordered by primary key, plus the cursor for the next page.
+
+    Rows are selected with ``pk > after`` instead of an OFFSET, so every page
+    costs the same no matter how deep into the result set it is.
+    """
+    items = list(_page_queryset(queryset, after, page_size))
+    return _split_page(items, page_size)
+
+
+async def akeyset_page(queryset, after=None, page_size=PAGE_SIZE):
+    """Async version of keyset_page()."""
+    items = [item async for item in _page_queryset(queryset, after, page_size)]
+    return _split_page(items, page_size)
+
+
+def _page_queryset(queryset, after, page_size):
+    after = parse_cursor(after)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    # One extra row tells us whether there is a next page
+    return queryset.order_by('pk')[:page_size + 1]
+
+
+def _split_page(items, page_size):
+    if len(items) > page_size:
+        items = items[:page_size]
+        return items, items[-1].pk
+    return items, None
+
+
+def keyset_rows(queryset, fields, after=None, page_size=PAGE_SIZE):
+    """keyset_page() for plain rows: a page of ``values_list('pk', *fields)`` tuples, without the pk.
+
+    No model instances are built, which keeps large API pages cheap.
+    """
+    rows = list(_page_queryset(queryset.values_list('pk', *fields), after, page_size))
+    rows, next_cursor = (rows[:page_size], rows[page_size - 1][0]) if len(rows) > page_size else (rows, None)
+    return [row[1:] for row in rows], next_cursor
@@ -0,0 +1,116 @@
+import codecs
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from .dashboard import invalidate_dashboard
+from .models import User
+
+CHUNK_SIZE = 1000
+USER_TYPES = ('student', 'faculty')
+
+
+def read_user_rows(lines):
+    """Yield (row_number, row) pairs from CSV lines with name,email,password,user_type columns."""
+    reader = csv.DictReader(lines)
+    for number, row in enumerate(reader, start=2):
+        yield number, row
+
+
+def read_uploaded_users(uploaded_file):
+    return read_user_rows(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+
+
+def hash_passwords(passwords, processes=None):
+    """Hash ``passwords`` with the configured hasher, spread across a process pool.
+
+    PBKDF2 is CPU bound, so threads would not help here. With ``processes=1``
+    everything is hashed in the current process.
+    """
+    if processes == 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    workers = processes or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def provision_users(rows, processes=None, chunk_size=CHUNK_SIZE):
+    """Create users in bulk from (row_number, row) pairs.
+
+    Duplicate emails are checked, ignoring case, for the whole batch with one
+    query, passwords are hashed in parallel and users are inserted with
+    ``bulk_create`` in chunks. Returns a report including the throughput in
+    users per second.
+    """
+    started = time.perf_counter()
+    errors = []
+    pending = {}
+    total = 0
+
+    for number, row in rows:
+        total += 1
+        name = (row.get('name') or '').strip()
+        email = User.objects.normalize_email((row.get('email') or '').strip())
+        password = row.get('password') or ''
+        user_type = (row.get('user_type') or '').strip().lower()
+
+        if not name or not email or not password:
+            errors.append({'row': number, 'error': 'All fields are required.'})
+        elif user_type not in USER_TYPES:
+            errors.append({'row': number, 'error': 'Invalid user type.'})
+        elif email.lower() in pending:
+            errors.append({'row': number, 'error': 'Duplicate email in this file.'})
+        else:
+            pending[email.lower()] = (number, name, email, password, user_type == 'faculty')
+
+    existing = set(
+        User.objects.annotate(email_key=Lower('email')).filter(email_key__in=list(pending))
+        .values_list('email_key', flat=True)
+    )
+    for key in list(pending):
+        if key in existing:
+            errors.append({'row': pending.pop(key)[0], 'error': 'User with this email already exists.'})
+
+    entries = list(pending.values())
+    hashes = hash_passwords([entry[3] for entry in entries], processes=processes)
+    users = [
+        User(name=name, email=email, password=hashed, is_staff=is_staff)
+        for (number, name, email, password, is_staff), hashed in zip(entries, hashes)
+    ]
+
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(users), chunk_size):
+            chunk = list(zip(entries[start:start + chunk_size], users[start:start + chunk_size]))
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create([user for entry, user in chunk])
+                created.extend(user for entry, user in chunk)
+            except IntegrityError:
+                # Someone added one of these emails since the check; find out which
+                for entry, user in chunk:
+                    try:
+                        with transaction.atomic():
+                            User.objects.bulk_create([user])
+                    except IntegrityError:
+                        errors.append({'row': entry[0], 'error': 'User with this email already exists.'})
+                    else:
+                        created.append(user)
+        if any(user.is_staff for user in created):
+            invalidate_dashboard()
+
+    elapsed = time.perf_counter() - started
+    errors.sort(key=lambda error: error['row'])
+    return {
+        'rows': total,
+        'created': len(created),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'users_per_second': round(len(created) / elapsed, 1) if elapsed else 0.0,
+    }
@@ -0,0 +1,165 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+# The QueryStats of the request being handled. Async requests share their
+# thread's connections, so each query is credited through its own context.
+_current_stats = ContextVar('query_stats', default=None)
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def fingerprint(sql):
+    """Normalise ``sql`` so the same statement with different values compares equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('(...)', sql)
+
+
+class QueryStats:
+    """Database execute wrapper that records count, time and fingerprints of every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _wrap_connections():
+    """Install the recording wrapper, once, on this thread's connections."""
+    for connection in connections.all():
+        if _record not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record)
+
+
+class QueryBudgetMiddleware:
+    """Record the queries of each request and compare them with the view's declared budget.
+
+    Queries run while a StreamingHttpResponse is consumed happen after this
+    middleware returns and are not counted. Under ASGI, overlapping requests
+    run their ORM calls on the same thread and connection; each query is
+    counted for the request whose context ran it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        stats = QueryStats()
+        request.query_stats = stats
+        request.query_budget = None
+        return stats
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = self._start(request)
+        _wrap_connections()
+        token = _current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, stats, response)
+
+    async def __acall__(self, request):
+        stats = self._start(request)
+        # On the thread the ORM calls will run on, not the event loop's
+        await sync_to_async(_wrap_connections)()
+        token = _current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, stats, response)
+
+    def _finish(self, request, stats, response):
+        if getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG):
+            response['X-Query-Count'] = str(stats.count)
+            response['X-Query-Time-Ms'] = f'{stats.duration * 1000:.2f}'
+
+        duplicates = stats.duplicates
+        if duplicates:
+            logger.warning('%s ran duplicate queries: %s', request.path, duplicates)
+        if request.query_budget is not None and stats.count > request.query_budget:
+            logger.warning(
+                '%s ran %d queries, over its budget of %d', request.path, stats.count, request.query_budget
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin that checks a URL against its declared query budget at several data sizes."""
+
+    budget_sizes = (1, 5, 20)
+
+    def assertQueryBudget(self, url, seed, sizes=None, method='get', data=None, **extra):
+        """Call ``seed(size)`` for each size, request ``url`` and compare query counts.
+
+        Fails if the view has no budget, runs more queries than its budget, or
+        runs a different number of queries as the seeded data grows. Caches are
+        cleared before every request so the uncached path is measured. Write
+        requests must be undone by ``seed`` so every request does the same work;
+        ``extra`` goes to the test client, e.g. ``content_type``.
+        """
+        counts = []
+        for size in sizes or self.budget_sizes:
+            seed(size)
+            cache.clear()
+            response = getattr(self.client, method)(url, data or {}, **extra)
+            request = response.wsgi_request
+            self.assertIsNotNone(request.query_budget, f'{url} does not declare a query budget')
+            self.assertLessEqual(
+                request.query_stats.count, request.query_budget,
+                f'{url} ran {request.query_stats.count} queries, budget is {request.query_budget}'
+            )
+            counts.append(request.query_stats.count)
+        self.assertEqual(len(set(counts)), 1, f'{url} query count grows with the data: {counts}')
+        return counts[0]
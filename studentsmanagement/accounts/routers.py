@@ -0,0 +1,164 @@
+"""Read-replica routing.
+
+Views wrapped in ``replica_reads`` send their reads to a randomly chosen
+replica from ``settings.REPLICA_DATABASES``; everything else, and every
+write, goes to ``default``. ReplicaPinMiddleware notices when a request
+writes and pins that browser to the primary for
+``settings.REPLICA_PIN_SECONDS``, so people always see their own changes
+even while the replicas catch up.
+
+Caches filled from a lagging replica could keep stale data around long
+after the lag is gone. The transcript and admin dashboard caches are
+always filled from the primary. Catalog card fragments are keyed on the
+course's updated_at, and roster rows on the grade's updated_at and the
+student's name and email (see accounts/fragments.py): a fragment rendered
+from old rows is simply never asked for again.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pinned_until'
+
+# Sessions are read right after they are written (on login), so they never
+# come from a replica
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    """Per-request routing flags. Mutated in place, so threads and tasks of one request share it."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.use_replicas = False
+        self.wrote = False
+
+
+def _location(alias):
+    settings_dict = connections[alias].settings_dict
+    return settings_dict['HOST'], settings_dict['PORT'], settings_dict['NAME']
+
+
+def replica_databases():
+    """Aliases of the configured replicas that really are separate databases.
+
+    In tests replicas mirror the default database, so they are skipped and
+    test data written through ``default`` stays visible.
+    """
+    primary = _location(DEFAULT_DB_ALIAS)
+    return [alias for alias in settings.REPLICA_DATABASES if _location(alias) != primary]
+
+
+def replica_reads(view):
+    """Let the reads of ``view`` go to a replica, unless the client is pinned to the primary."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            with _replicas(True):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            with _replicas(True):
+                return view(request, *args, **kwargs)
+    return inner
+
+
+def primary_reads():
+    """Context manager that sends reads back to the primary, e.g. while filling a cache."""
+    return _replicas(False)
+
+
+@contextmanager
+def _replicas(enabled):
+    state = _routing.get()
+    if state is None:
+        yield
+        return
+    previous = state.use_replicas
+    state.use_replicas = enabled
+    try:
+        yield
+    finally:
+        state.use_replicas = previous
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        replicas = replica_databases()
+        if (state is None or not state.use_replicas or state.pinned or not replicas
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return DEFAULT_DB_ALIAS
+        # Follow related objects on the replica their parent came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replicas:
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # Later reads in this request must see the write too
+            state.wrote = state.pinned = True
+        # Explicitly, or Django would write objects back where they were read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+class ReplicaPinMiddleware:
+    """Track writes per request and pin the client to the primary for a while after one."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _state(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RoutingState(pinned)
+
+    def _pin(self, state, response):
+        if state.wrote and replica_databases():
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._state(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._pin(state, response)
+
+    async def __acall__(self, request):
+        state = self._state(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._pin(state, response)
@@ -0,0 +1,85 @@
+"""Course search.
+
+On PostgreSQL, courses are matched against ``accounts_course.search_vector``,
+a stored tsvector column generated from the name (weight A) and description
+(weight B) with a GIN index on it; see migration 0007. It is not a model
+field, so it is referenced here with RawSQL. Other databases fall back to
+case-insensitive substring matching.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Course
+
+SEARCH_CONFIG = 'english'
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 25
+MAX_TERMS = 8
+
+_TERM = re.compile(r'\w+')
+
+
+def search_terms(text):
+    """Split user input into at most MAX_TERMS plain word terms."""
+    return _TERM.findall(text or '')[:MAX_TERMS]
+
+
+def prefix_tsquery(terms):
+    """Turn ``terms`` into a tsquery where every term must match and the last may be a prefix.
+
+    ``['intro', 'pyth']`` becomes ``intro & pyth:*``, so results show up while
+    the last word is still being typed. Terms only contain word characters, so
+    nothing here can break the tsquery syntax.
+    """
+    *complete, last = terms
+    return ' & '.join(complete + [f'{last}:*'])
+
+
+def _postgres_search(queryset, terms):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+    vector = RawSQL(f'"{Course._meta.db_table}"."search_vector"', (), output_field=SearchVectorField())
+    query = SearchQuery(prefix_tsquery(terms), search_type='raw', config=SEARCH_CONFIG)
+    # Filtering on the column itself (vector @@ query) lets the GIN index do the work
+    return queryset.alias(search_vector=vector).filter(search_vector=query).annotate(
+        rank=SearchRank(vector, query)
+    )
+
+
+def _fallback_search(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    # Rough ranking: name prefix, then name match, then description only
+    first = terms[0]
+    return queryset.annotate(rank=Case(
+        When(name__istartswith=first, then=Value(2)),
+        When(name__icontains=first, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
+
+
+def search_courses(queryset, text):
+    """Filter ``queryset`` to courses matching ``text``, annotated with a ``rank``.
+
+    Returns the queryset unchanged (and without ``rank``) if ``text`` has no words.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, terms)
+    return _fallback_search(queryset, terms)
+
+
+def autocomplete(text, limit=AUTOCOMPLETE_LIMIT):
+    """Best ``limit`` matches for ``text`` as a list of dicts, best first."""
+    if not search_terms(text):
+        return []
+    return list(
+        search_courses(Course.objects.all(), text).order_by('-rank', 'name', 'id')
+        .values('id', 'name', 'faculty__name')[:min(limit, MAX_AUTOCOMPLETE_LIMIT)]
+    )
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import audit
+from .counters import adjust_graded
+from .dashboard import invalidate_dashboard
+from .enrollment import promote_waitlist, release_seat, seats_counted, take_seat
+from .models import Course, Enrollment, Grade, GradeAuditEntry, User
+from .stats import apply_grade_change
+from .transcripts import invalidate_transcripts
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Grade)
+def student_record_changed(sender, instance, **kwargs):
+    invalidate_transcripts([instance.student_id])
+    invalidate_dashboard()
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    student_ids = Enrollment.objects.filter(course_id=instance.pk).values_list('student_id', flat=True)
+    invalidate_transcripts(student_ids)
+    invalidate_dashboard()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the dashboard doesn't show
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    if instance.is_staff:
+        invalidate_dashboard()
+        # Catalog cards show the instructor's name and are keyed on the course's updated_at
+        if kwargs.get('signal') is post_save:
+            Course.objects.filter(faculty_id=instance.pk).update(updated_at=Now())
+
+
+@receiver(post_save, sender=Grade)
+def grade_saved(sender, instance, created, **kwargs):
+    old_marks = None if created else getattr(instance, '_loaded_marks', None)
+    old_grade = '' if created else getattr(instance, '_loaded_grade', '')
+    apply_grade_change(instance.course_id, old_marks, instance.marks)
+    if created:
+        adjust_graded(instance.course_id, 1)
+    # Form posts leave the marks as a string until the instance is reloaded
+    marks = Grade._meta.get_field('marks').to_python(instance.marks)
+    if created or (old_marks, old_grade) != (marks, instance.grade):
+        audit.record([audit.entry(instance.student_id, instance.course_id, GradeAuditEntry.EDIT,
+                                  (old_marks, old_grade), (marks, instance.grade))])
+    instance._loaded_marks = instance.marks
+    instance._loaded_grade = instance.grade
+
+
+@receiver(post_delete, sender=Grade)
+def grade_deleted(sender, instance, **kwargs):
+    old_marks = getattr(instance, '_loaded_marks', instance.marks)
+    apply_grade_change(instance.course_id, old_marks, None)
+    adjust_graded(instance.course_id, -1)
+    audit.record([audit.entry(instance.student_id, instance.course_id, GradeAuditEntry.DELETE,
+                              (old_marks, getattr(instance, '_loaded_grade', instance.grade)))])
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_added(sender, instance, created, raw=False, **kwargs):
+    # Fixtures bring their own enrolled_count
+    if created and not raw and not seats_counted():
+        take_seat(instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    if seats_counted():
+        return
+    release_seat(instance.course_id)
+    # Also for cascades from a deleted student; a deleted course has no seats to fill
+    course_id = instance.course_id
+    transaction.on_commit(lambda: promote_waitlist(course_id))
@@ -0,0 +1,143 @@
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .models import MAX_MARKS, Course, CourseGradeSummary, Grade
+
+HISTOGRAM_SIZE = MAX_MARKS + 1
+
+
+def histogram_bucket(marks):
+    return min(max(int(marks), 0), MAX_MARKS)
+
+
+def apply_grade_change(course_id, old_marks=None, new_marks=None):
+    """Update the course summary for one grade going from ``old_marks`` to ``new_marks``.
+
+    ``old_marks`` is None for a new grade and ``new_marks`` is None for a
+    deleted one. The summary row is locked for the update.
+    """
+    old_marks = None if old_marks is None else float(old_marks)
+    new_marks = None if new_marks is None else float(new_marks)
+    if old_marks == new_marks:
+        return
+
+    with transaction.atomic():
+        summaries = CourseGradeSummary.objects.select_for_update()
+        summary = summaries.filter(course_id=course_id).first()
+        if summary is None:
+            if new_marks is None:
+                # Nothing to take a grade away from, e.g. the course itself is being deleted
+                return
+            # The course's first grade. One INSERT that leaves alone a row a
+            # concurrent save just created, rather than get_or_create's savepoint
+            CourseGradeSummary.objects.bulk_create([CourseGradeSummary(course_id=course_id)], ignore_conflicts=True)
+            summary = summaries.get(course_id=course_id)
+        histogram = summary.histogram or [0] * HISTOGRAM_SIZE
+
+        if old_marks is not None:
+            summary.count -= 1
+            summary.total -= old_marks
+            summary.total_squares -= old_marks * old_marks
+            histogram[histogram_bucket(old_marks)] -= 1
+        if new_marks is not None:
+            summary.count += 1
+            summary.total += new_marks
+            summary.total_squares += new_marks * new_marks
+            histogram[histogram_bucket(new_marks)] += 1
+
+        if old_marks is not None and old_marks in (summary.min_marks, summary.max_marks):
+            # The old extreme may be gone; ask the (course, student) index
+            bounds = Grade.objects.filter(course_id=course_id).aggregate(low=Min('marks'), high=Max('marks'))
+            summary.min_marks, summary.max_marks = bounds['low'], bounds['high']
+        elif new_marks is not None:
+            summary.min_marks = new_marks if summary.min_marks is None else min(summary.min_marks, new_marks)
+            summary.max_marks = new_marks if summary.max_marks is None else max(summary.max_marks, new_marks)
+
+        summary.histogram = histogram
+        summary.save()
+
+
+def rebuild_course_stats(course_ids=None):
+    """Recompute summaries from scratch with NumPy, for all courses or just ``course_ids``.
+
+    All marks are loaded into arrays with one query and aggregated per course
+    with bincount/reduceat, then written back in one upsert. The summary rows
+    are locked first, like apply_grade_change() does, so a grade saved while
+    the marks are read waits and is applied on top of the rebuilt totals.
+    """
+    # Imports call this inside their own transaction; a savepoint would add nothing
+    with transaction.atomic(savepoint=False):
+        return _rebuild_course_stats(course_ids)
+
+
+def _rebuild_course_stats(course_ids):
+    import numpy as np
+
+    courses = Course.objects.all()
+    grades = Grade.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+        grades = grades.filter(course_id__in=course_ids)
+    all_ids = np.array(sorted(courses.values_list('id', flat=True)), dtype=np.int64)
+
+    # Rows have to exist to be locked; in course order, so rebuilds can't deadlock
+    CourseGradeSummary.objects.bulk_create(
+        [CourseGradeSummary(course_id=int(course_id)) for course_id in all_ids], batch_size=500, ignore_conflicts=True
+    )
+    list(
+        CourseGradeSummary.objects.select_for_update().filter(course_id__in=courses.values('id'))
+        .order_by('course_id').values_list('course_id', flat=True)
+    )
+
+    rows = np.array(list(grades.order_by('course_id').values_list('course_id', 'marks')), dtype=np.float64)
+    rows = rows.reshape(-1, 2)
+    grade_courses = rows[:, 0].astype(np.int64)
+    marks = rows[:, 1]
+
+    # Map every grade to the position of its course in all_ids
+    index = np.searchsorted(all_ids, grade_courses)
+    size = len(all_ids)
+    counts = np.bincount(index, minlength=size)
+    totals = np.bincount(index, weights=marks, minlength=size)
+    squares = np.bincount(index, weights=marks * marks, minlength=size)
+    buckets = np.clip(marks.astype(np.int64), 0, MAX_MARKS)
+    histograms = np.bincount(index * HISTOGRAM_SIZE + buckets, minlength=size * HISTOGRAM_SIZE)
+    histograms = histograms.reshape(size, HISTOGRAM_SIZE)
+
+    mins = np.full(size, np.nan)
+    maxs = np.full(size, np.nan)
+    if len(marks):
+        # Rows are sorted by course, so each course is one contiguous run
+        present, starts = np.unique(index, return_index=True)
+        mins[present] = np.minimum.reduceat(marks, starts)
+        maxs[present] = np.maximum.reduceat(marks, starts)
+
+    summaries = [
+        CourseGradeSummary(
+            course_id=int(course_id),
+            count=int(counts[i]),
+            total=float(totals[i]),
+            total_squares=float(squares[i]),
+            min_marks=None if np.isnan(mins[i]) else float(mins[i]),
+            max_marks=None if np.isnan(maxs[i]) else float(maxs[i]),
+            histogram=histograms[i].tolist(),
+        )
+        for i, course_id in enumerate(all_ids)
+    ]
+    CourseGradeSummary.objects.bulk_create(
+        summaries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=['count', 'total', 'total_squares', 'min_marks', 'max_marks', 'histogram', 'updated_at'],
+    )
+    return len(summaries)
+
+
+def course_stats_overview():
+    """Summaries of every graded course, for the admin panel."""
+    return (
+        CourseGradeSummary.objects.filter(count__gt=0)
+        .select_related('course__faculty')
+        .order_by('course__name')
+    )
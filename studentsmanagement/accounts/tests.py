@@ -1,12 +1,18 @@
-from django.test import TestCase
+from unittest import skipUnless
+
+from django.test import TestCase, TransactionTestCase
 
 # Create your tests here.
 from django.test import Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from .models import Course, Enrollment, Grade, User
+from .querybudget import QueryBudgetTestMixin
 from decouple import config
 from django.contrib.messages import get_messages
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
 
 User = get_user_model()
 
@@ -436,7 +442,49 @@ class AvailableCoursesViewTests(TestCase):
         response = self.client.get(self.url)
         enrolled_course_ids = response.context['enrolled_course_ids']
 
-        self.assertEqual(enrolled_course_ids, [])
+        self.assertEqual(enrolled_course_ids, set())
+
+    def test_keyset_pagination(self):
+        from unittest import mock
+        from accounts.views import AvailableCoursesView
+        for i in range(3):
+            Course.objects.create(name=f'Course {i}', faculty=self.faculty)
+        self.client.login(email='student@example.com', password='password123')
+
+        with mock.patch.object(AvailableCoursesView, 'page_size', 2):
+            seen = []
+            response = self.client.get(self.url)
+            while True:
+                seen.extend(course.id for course in response.context['courses'])
+                if 'next_page_query' not in response.context:
+                    break
+                response = self.client.get(f"{self.url}?{response.context['next_page_query']}")
+
+        self.assertEqual(seen, sorted(Course.objects.values_list('id', flat=True)))
+
+    def test_filters_by_name_prefix_and_faculty(self):
+        other = User.objects.create_user(name='Other Faculty', email='other@example.com', is_staff=True)
+        python_other = Course.objects.create(name='Python Web', faculty=other)
+        self.client.login(email='student@example.com', password='password123')
+
+        response = self.client.get(self.url, {'q': 'python'})
+        self.assertEqual(list(response.context['courses']), [self.course1, python_other])
+
+        response = self.client.get(self.url, {'q': 'python', 'faculty': other.id})
+        self.assertEqual(list(response.context['courses']), [python_other])
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        self.client.login(email='student@example.com', password='password123')
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        for i in range(10):
+            faculty = User.objects.create_user(name=f'Faculty {i}', email=f'f{i}@example.com', is_staff=True)
+            course = Course.objects.create(name=f'Course {i}', faculty=faculty)
+            Enrollment.objects.create(student=self.student, course=course)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+        self.assertEqual(len(small), len(large))
 
 
 
@@ -482,6 +530,22 @@ class EnrollCourseViewTests(TestCase):
         self.assertEqual(enrollment_count, 1)
         self.assertRedirects(response, reverse('available_courses'))
 
+    def test_enroll_uses_a_single_insert(self):
+        self.client.post(reverse('enroll_course', args=[self.course.id]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('enroll_course', args=[self.course.id]))
+        inserts = [q for q in queries.captured_queries if 'INTO "accounts_enrollment"' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse(any('SELECT' in q['sql'] and 'FROM "accounts_enrollment"' in q['sql']
+                             for q in queries.captured_queries))
+        self.assertEqual(Enrollment.objects.filter(student=self.student, course=self.course).count(), 1)
+
+    def test_duplicate_enrollment_rejected_by_database(self):
+        from django.db import IntegrityError, transaction
+        Enrollment.objects.create(student=self.student, course=self.course)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Enrollment.objects.create(student=self.student, course=self.course)
+
     def test_enroll_in_nonexistent_course(self):
         """Test enrolling in a non-existent course returns 404."""
         response = self.client.post(reverse('enroll_course', args=[999]))  # random non-existing course id
@@ -629,6 +693,12 @@ class UpdateGradeViewTests(TestCase):
         self.assertEqual(updated_grade.marks, 95)
         self.assertEqual(updated_grade.grade, 'A+')
 
+    def test_duplicate_grade_rejected_by_database(self):
+        from django.db import IntegrityError, transaction
+        Grade.objects.create(student=self.student, course=self.course, marks=70, grade='B')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Grade.objects.create(student=self.student, course=self.course, marks=80, grade='A')
+
     def test_student_cannot_update_grade(self):
         self.client.login(email='student@example.com', password='password123')
 
@@ -655,3 +725,2222 @@ class UpdateGradeViewTests(TestCase):
 
         self.assertEqual(response.status_code, 405)  # Method Not Allowed
 
+
+
+
+class BulkGradeImportViewTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(
+            name='Test faculty',
+            email='faculty@example.com',
+            password='password123',
+            is_staff=True
+        )
+        self.student1 = User.objects.create_user(name='Student One', email='one@example.com', password='password123')
+        self.student2 = User.objects.create_user(name='Student Two', email='two@example.com', password='password123')
+        self.outsider = User.objects.create_user(name='Outsider', email='out@example.com', password='password123')
+
+        self.course = Course.objects.create(name='Python Basics', faculty=self.faculty)
+        Enrollment.objects.create(course=self.course, student=self.student1)
+        Enrollment.objects.create(course=self.course, student=self.student2)
+        Grade.objects.create(course=self.course, student=self.student2, marks=40, grade='D')
+
+        self.url = reverse('import_grades', args=[self.course.id])
+
+    def upload(self, name, content, content_type='text/csv'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(self.url, {
+            'grades_file': SimpleUploadedFile(name, content.encode(), content_type=content_type)
+        })
+
+    def test_blank_letters_come_from_the_grading_scale(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.upload('grades.csv', f'student_id,marks,grade\n{self.student1.id},61,\n')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(Grade.objects.get(course=self.course, student=self.student1).grade, 'C')
+
+    def test_csv_import_creates_and_updates_grades(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.upload('grades.csv', (
+            'student_id,email,marks,grade\n'
+            f'{self.student1.id},,88,A\n'
+            ',TWO@example.com,72,B\n'
+        ))
+
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(Grade.objects.get(student=self.student1, course=self.course).marks, 88)
+        self.assertEqual(Grade.objects.get(student=self.student2, course=self.course).grade, 'B')
+
+    def test_json_import_reports_row_errors(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        rows = [
+            {'email': 'one@example.com', 'marks': 91, 'grade': 'A'},
+            {'email': 'out@example.com', 'marks': 50, 'grade': 'C'},
+            {'email': 'two@example.com', 'marks': 'abc', 'grade': 'C'},
+            {'email': 'one@example.com', 'marks': 10, 'grade': 'F'},
+        ]
+        import json
+        response = self.upload('grades.json', json.dumps(rows), 'application/json')
+
+        report = response.json()
+        self.assertEqual(report['rows'], 4)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3, 4])
+        self.assertEqual(Grade.objects.get(student=self.student1, course=self.course).marks, 91)
+        self.assertFalse(Grade.objects.filter(student=self.outsider).exists())
+
+    def test_json_that_is_not_a_list_is_rejected(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        for content in ('5', 'true', '"grades"', '{"grades": 3}'):
+            with self.subTest(content=content):
+                response = self.upload('grades.json', content, 'application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Could not read the uploaded file.'})
+
+    def test_other_faculty_cannot_import(self):
+        User.objects.create_user(name='Other', email='other@example.com', password='password123', is_staff=True)
+        self.client.login(email='other@example.com', password='password123')
+        response = self.upload('grades.csv', f'student_id,marks,grade\n{self.student1.id},88,A\n')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Grade.objects.filter(student=self.student1).exists())
+
+    def test_missing_file_returns_400(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+
+
+def sign_in_as_panel_admin(client):
+    """What a successful login with the configured admin credentials leaves in the session."""
+    from .views import ADMIN_SESSION_KEY
+    session = client.session
+    session[ADMIN_SESSION_KEY] = True
+    session.save()
+
+
+class BulkProvisioningTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(name='Existing User', email='exist@example.com', password='password123')
+        self.url = reverse('bulk_add_users')
+        self.csv = (
+            'name,email,password,user_type\n'
+            'Ann,ann@example.com,password123,student\n'
+            'Bob,bob@example.com,password123,faculty\n'
+            'Again,exist@example.com,password123,student\n'
+            'Ann Two,ann@example.com,password123,student\n'
+            'Nobody,nobody@example.com,password123,admin\n'
+        )
+
+    def test_provision_users_reports_errors_and_creates_valid_rows(self):
+        from accounts.provisioning import provision_users, read_user_rows
+        report = provision_users(read_user_rows(self.csv.splitlines()), processes=1)
+
+        self.assertEqual(report['rows'], 5)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual([error['row'] for error in report['errors']], [4, 5, 6])
+        self.assertTrue(User.objects.get(email='bob@example.com').is_staff)
+        self.assertTrue(User.objects.get(email='ann@example.com').check_password('password123'))
+
+    def test_email_check_ignores_case(self):
+        from accounts.provisioning import provision_users, read_user_rows
+        rows = read_user_rows(['name,email,password,user_type', 'Shouty,EXIST@example.com,password123,student'])
+        report = provision_users(rows, processes=1)
+        self.assertEqual(report['created'], 0)
+        self.assertEqual(report['errors'], [{'row': 2, 'error': 'User with this email already exists.'}])
+
+    def test_emails_added_meanwhile_are_row_errors(self):
+        from unittest import mock
+        from accounts import provisioning
+        rows = provisioning.read_user_rows(self.csv.splitlines())
+
+        def hash_passwords(passwords, processes=None):
+            # Another request creates ann@ between the check and the insert
+            User.objects.create_user(name='Ann', email='ann@example.com', password='x')
+            return [provisioning.make_password(password) for password in passwords]
+
+        with mock.patch.object(provisioning, 'hash_passwords', hash_passwords):
+            report = provisioning.provision_users(rows, processes=1)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [2, 4, 5, 6])
+        self.assertTrue(User.objects.filter(email='bob@example.com').exists())
+
+    def test_upload_is_for_admins_only(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        response = self.client.post(self.url, {
+            'users_file': SimpleUploadedFile('users.csv', self.csv.encode(), content_type='text/csv')
+        })
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(User.objects.count(), 1)
+
+        # Faculty are let in, as on the job views
+        User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.client.login(email='faculty@example.com', password='password123')
+        self.assertEqual(self.client.post(self.url).status_code, 302)
+
+    def test_admin_panel_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        sign_in_as_panel_admin(self.client)
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            response = self.client.post(self.url, {
+                'users_file': SimpleUploadedFile('users.csv', self.csv.encode(), content_type='text/csv')
+            })
+
+        self.assertRedirects(response, reverse('admin_panel'))
+        self.assertEqual(User.objects.count(), 3)
+        messages = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertTrue(messages[0].startswith('Added 2 of 5 users'))
+
+    def test_management_command(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(self.csv)
+        self.addCleanup(os.unlink, handle.name)
+        out = StringIO()
+        call_command('provision_users', handle.name, processes=1, stdout=out, stderr=StringIO())
+        self.assertIn('Created 2 of 5 users', out.getvalue())
+
+
+class GradeExportViewTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(
+            name='Test faculty',
+            email='faculty@example.com',
+            password='password123',
+            is_staff=True
+        )
+        self.student1 = User.objects.create_user(name='Student One', email='one@example.com', password='password123')
+        self.student2 = User.objects.create_user(name='Student Two', email='two@example.com', password='password123')
+        self.course1 = Course.objects.create(name='Python Basics', faculty=self.faculty)
+        self.course2 = Course.objects.create(name='Advanced Django', faculty=self.faculty)
+        Enrollment.objects.create(course=self.course1, student=self.student1)
+        Enrollment.objects.create(course=self.course1, student=self.student2)
+        Enrollment.objects.create(course=self.course2, student=self.student1)
+        Grade.objects.create(course=self.course1, student=self.student1, marks=85, grade='A')
+
+    def read_rows(self, response, delimiter=','):
+        import csv
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(content.splitlines(), delimiter=delimiter))
+
+    def test_course_roster_csv(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.client.get(reverse('export_roster', args=[self.course1.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = self.read_rows(response)
+        self.assertEqual(rows[0][0], 'course_id')
+        self.assertEqual(rows[1], [str(self.course1.id), 'Python Basics', str(self.student1.id),
+                                   'Student One', 'one@example.com', '85.0', 'A'])
+        self.assertEqual(rows[2][-2:], ['', ''])
+
+    def test_faculty_export_tsv_covers_all_courses(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.client.get(reverse('export_faculty_grades'), {'format': 'tsv'})
+
+        self.assertEqual(response['Content-Type'], 'text/tab-separated-values')
+        rows = self.read_rows(response, delimiter='\t')
+        self.assertEqual(len(rows), 4)
+
+    def test_other_users_cannot_export(self):
+        self.client.login(email='one@example.com', password='password123')
+        self.assertEqual(self.client.get(reverse('export_roster', args=[self.course1.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_faculty_grades')).status_code, 403)
+
+
+class TranscriptCacheTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Math', faculty=self.faculty)
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.login(email='student@example.com', password='password123')
+
+    def get_transcript(self):
+        return self.client.get(reverse('student_profile')).context['enrolled_data']
+
+    def test_transcript_is_served_from_cache(self):
+        self.get_transcript()
+        with CaptureQueriesContext(connection) as queries:
+            transcript = self.get_transcript()
+        self.assertFalse(any('accounts_enrollment' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(transcript, [{'course_name': 'Math', 'marks': 'N/A', 'grade': 'N/A'}])
+
+    def test_grade_save_and_delete_invalidate(self):
+        self.get_transcript()
+        grade = Grade.objects.create(student=self.student, course=self.course, marks=70, grade='B')
+        self.assertEqual(self.get_transcript()[0]['grade'], 'B')
+
+        grade.delete()
+        self.assertEqual(self.get_transcript()[0]['grade'], 'N/A')
+
+    def test_course_rename_invalidates(self):
+        self.get_transcript()
+        self.course.name = 'Mathematics'
+        self.course.save()
+        self.assertEqual(self.get_transcript()[0]['course_name'], 'Mathematics')
+
+    def test_enrollment_delete_invalidates(self):
+        self.get_transcript()
+        self.enrollment.delete()
+        self.assertEqual(self.get_transcript(), [])
+
+    def test_bulk_grade_import_invalidates(self):
+        from accounts.grade_import import import_grades
+        self.get_transcript()
+        import_grades(self.course, [(1, {'student_id': self.student.id, 'marks': 90, 'grade': 'A'})])
+        self.assertEqual(self.get_transcript()[0]['marks'], 90)
+
+
+class AdminDashboardTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.url = reverse('admin_panel')
+        self.faculty = User.objects.create_user(name='Faculty One', email='one@example.com', password='password123', is_staff=True)
+        self.idle_faculty = User.objects.create_user(name='Faculty Two', email='two@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.math = Course.objects.create(name='Maths', faculty=self.faculty)
+        Course.objects.create(name='Science', faculty=self.faculty)
+        Enrollment.objects.create(student=self.student, course=self.math)
+        Grade.objects.create(student=self.student, course=self.math, marks=80, grade='A')
+
+    def test_counts_per_faculty(self):
+        faculty_data = self.client.get(self.url).context['faculty_data']
+        one = next(f for f in faculty_data if f['name'] == 'Faculty One')
+        two = next(f for f in faculty_data if f['name'] == 'Faculty Two')
+
+        self.assertEqual(one['courses'], ['Maths', 'Science'])
+        self.assertEqual((one['course_count'], one['enrollment_count'], one['graded_count']), (2, 1, 1))
+        self.assertEqual((two['courses'], two['course_count']), ([], 0))
+
+    def test_single_query_regardless_of_faculty_count(self):
+        from accounts.dashboard import build_faculty_data
+        with CaptureQueriesContext(connection) as small:
+            build_faculty_data()
+        for i in range(10):
+            faculty = User.objects.create_user(name=f'Faculty {i}', email=f'f{i}@example.com', is_staff=True)
+            Course.objects.create(name=f'Course {i}', faculty=faculty)
+        with CaptureQueriesContext(connection) as large:
+            build_faculty_data()
+        self.assertEqual(len(small), 1)
+        self.assertEqual(len(large), 1)
+
+    def test_counts_do_not_multiply_enrollments_by_grades(self):
+        from accounts.dashboard import build_faculty_data
+        for i in range(3):
+            student = User.objects.create_user(name=f'Student {i}', email=f's{i}@example.com', password='password123')
+            Enrollment.objects.create(student=student, course=self.math)
+            Grade.objects.create(student=student, course=self.math, marks=70, grade='B')
+        with CaptureQueriesContext(connection) as queries:
+            one = next(f for f in build_faculty_data() if f['name'] == 'Faculty One')
+        self.assertEqual((one['enrollment_count'], one['graded_count']), (4, 4))
+        # Counted in subqueries, not by joining both tables onto the course
+        self.assertNotIn('JOIN "accounts_enrollment"', queries[0]['sql'])
+        self.assertNotIn('JOIN "accounts_grade"', queries[0]['sql'])
+
+    def test_cached_until_a_write(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(len(queries), 0)
+
+        Course.objects.create(name='History', faculty=self.idle_faculty)
+        faculty_data = self.client.get(self.url).context['faculty_data']
+        two = next(f for f in faculty_data if f['name'] == 'Faculty Two')
+        self.assertEqual(two['courses'], ['History'])
+
+    def test_admin_login_uses_same_data(self):
+        response = self.client.post(reverse('login'), {
+            'user_type': 'admin',
+            'email': config('ADMIN_EMAIL'),
+            'password': config('ADMIN_PASSWORD'),
+        })
+        self.assertEqual(response.context['faculty_data'], self.client.get(self.url).context['faculty_data'])
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Course', faculty=self.faculty)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.seeded = 0
+
+    def seed(self, size):
+        """Grow the catalog, the roster and the student's transcript up to ``size`` rows each."""
+        for i in range(self.seeded, size):
+            faculty = User.objects.create_user(name=f'Faculty {i}', email=f'faculty{i}@example.com', is_staff=True)
+            course = Course.objects.create(name=f'Course {i}', faculty=faculty)
+            Enrollment.objects.create(student=self.student, course=course)
+            Grade.objects.create(student=self.student, course=course, marks=50 + i, grade='C')
+            peer = User.objects.create_user(name=f'Peer {i}', email=f'peer{i}@example.com')
+            Enrollment.objects.create(student=peer, course=self.course)
+            Grade.objects.create(student=peer, course=self.course, marks=60, grade='B')
+        self.seeded = max(self.seeded, size)
+
+    def test_student_pages(self):
+        self.client.login(email='student@example.com', password='password123')
+        self.assertQueryBudget(reverse('student_profile'), self.seed)
+        self.assertQueryBudget(reverse('available_courses'), self.seed)
+
+    def test_faculty_pages(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        self.assertQueryBudget(reverse('faculty_profile'), self.seed)
+        self.assertQueryBudget(reverse('student_details', args=[self.course.id]), self.seed)
+        self.assertQueryBudget(reverse('course_stats', args=[self.course.id]), self.seed)
+
+    def test_admin_panel(self):
+        self.assertQueryBudget(reverse('admin_panel'), self.seed)
+
+    def test_student_login(self):
+        credentials = {'user_type': 'student', 'email': 'student@example.com', 'password': 'password123'}
+
+        def seed(size):
+            self.seed(size)
+            self.client.cookies.clear()  # every attempt starts without a session
+
+        self.assertQueryBudget(reverse('login'), seed, method='post', data=credentials)
+
+    def test_every_route_declares_a_budget(self):
+        from accounts import urls
+        missing = [pattern.name for pattern in urls.urlpatterns
+                   if getattr(pattern.callback, 'query_budget', None) is None]
+        self.assertEqual(missing, [])
+
+    def reset(self, undo):
+        """A seed that grows the data, then undoes the previous request's write."""
+        def seed(size):
+            self.seed(size)
+            undo()
+        return seed
+
+    def upload(self, name, content, content_type='text/csv'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        upload = SimpleUploadedFile(name, content.encode(), content_type=content_type)
+        # Rewound by the seed, so every request reads the whole file
+        return upload, upload.seek
+
+    def test_student_writes(self):
+        from .enrollment import drop_course, enroll_student
+        target = Course.objects.create(name='Target', faculty=self.faculty)
+        other = Course.objects.create(name='Other', faculty=self.faculty)
+
+        def drop_both():
+            drop_course(self.student, target.id)
+            drop_course(self.student, other.id)
+
+        self.client.login(email='student@example.com', password='password123')
+        self.assertQueryBudget(reverse('enroll_course', args=[target.id]), self.reset(drop_both), method='post')
+        self.assertQueryBudget(reverse('batch_enroll'), self.reset(drop_both), method='post',
+                               data={'course_ids': [target.id, other.id]})
+        self.assertQueryBudget(reverse('drop_course', args=[target.id]),
+                               self.reset(lambda: enroll_student(self.student, target.id)), method='post')
+
+    def test_faculty_writes(self):
+        from .models import CourseGradeSummary
+
+        def forget_grade():
+            Grade.objects.filter(student=self.student, course=self.course).delete()
+
+        def first_grade():
+            # The course's first grade also creates its summary row
+            Grade.objects.filter(course=self.course).delete()
+            CourseGradeSummary.objects.filter(course=self.course).delete()
+
+        self.client.login(email='faculty@example.com', password='password123')
+        grade = {'student_id': self.student.id, 'course_id': self.course.id, 'marks': '88', 'grade': ''}
+        self.assertQueryBudget(reverse('update_grade'), self.reset(forget_grade), method='post', data=grade)
+        self.assertQueryBudget(reverse('update_grade'), self.reset(first_grade), method='post', data=grade)
+        self.assertQueryBudget(reverse('add_course'), self.seed, method='post', data={'course_name': 'New Course'})
+
+        upload, rewind = self.upload('grades.csv', 'email,marks\nstudent@example.com,77\n')
+        self.assertQueryBudget(reverse('import_grades', args=[self.course.id]),
+                               self.reset(lambda: (forget_grade(), rewind(0))), method='post',
+                               data={'grades_file': upload})
+        self.assertQueryBudget(reverse('import_grades', args=[self.course.id]), self.reset(lambda: rewind(0)),
+                               method='post', data={'grades_file': upload, 'background': '1'})
+
+    def test_faculty_reads(self):
+        from .jobs import enqueue
+        self.client.login(email='faculty@example.com', password='password123')
+        job = enqueue('rebuild_grade_stats', user=self.faculty)
+        self.assertQueryBudget(reverse('course_detail', args=[self.course.id]), self.seed)
+        # Rows are read while the response streams, after the budget is checked
+        self.assertQueryBudget(reverse('export_roster', args=[self.course.id]), self.seed)
+        self.assertQueryBudget(reverse('export_faculty_grades'), self.seed)
+        self.assertQueryBudget(reverse('job_list'), self.seed)
+        self.assertQueryBudget(reverse('job_status', args=[job.pk]), self.seed)
+        self.assertQueryBudget(reverse('login_throttle_metrics'), self.seed)
+        self.assertQueryBudget(reverse('database_pool_stats'), self.seed)
+
+    def test_public_pages(self):
+        self.assertQueryBudget(reverse('login'), self.seed)
+        self.assertQueryBudget(reverse('course_autocomplete'), self.seed, data={'q': 'Course'})
+
+    def test_admin_writes(self):
+        def forget(*emails):
+            return lambda: User.objects.filter(email__in=emails).delete()
+
+        self.assertQueryBudget(reverse('add_user'), self.reset(forget('new@example.com')), method='post', data={
+            'name': 'New', 'email': 'new@example.com', 'password': 'password123', 'user_type': 'student',
+        })
+        upload, rewind = self.upload('users.csv', 'name,email,password,user_type\nAnn,ann@example.com,password123,student\n')
+        sign_in_as_panel_admin(self.client)
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            self.assertQueryBudget(reverse('bulk_add_users'), self.reset(lambda: (forget('ann@example.com')(), rewind(0))),
+                                   method='post', data={'users_file': upload})
+
+    def test_student_api(self):
+        from .enrollment import drop_course, enroll_student
+        target = Course.objects.create(name='Target', faculty=self.faculty)
+        other = Course.objects.create(name='Other', faculty=self.faculty)
+
+        def drop_both():
+            drop_course(self.student, target.id)
+            drop_course(self.student, other.id)
+
+        self.client.login(email='student@example.com', password='password123')
+        self.assertQueryBudget(reverse('api_transcript'), self.seed)
+        self.assertQueryBudget(reverse('api_courses'), self.seed)
+        self.assertQueryBudget(reverse('api_enrollments'), self.seed)
+        self.assertQueryBudget(reverse('api_enrollments'), self.reset(drop_both), method='post',
+                               data={'course_id': target.id}, content_type='application/json')
+        self.assertQueryBudget(reverse('api_enrollments'), self.reset(drop_both), method='post',
+                               data={'course_ids': [target.id, other.id]}, content_type='application/json')
+        self.assertQueryBudget(reverse('api_drop_enrollment', args=[target.id]),
+                               self.reset(lambda: enroll_student(self.student, target.id)), method='delete')
+        self.assertQueryBudget(reverse('api_grade_history', args=[self.course.id, self.student.id]), self.seed)
+
+    def test_faculty_api(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        self.assertQueryBudget(reverse('api_roster', args=[self.course.id]), self.seed)
+        self.assertQueryBudget(reverse('api_grade_history', args=[self.course.id, self.student.id]), self.seed)
+        self.assertQueryBudget(
+            reverse('api_grades', args=[self.course.id]),
+            self.reset(lambda: Grade.objects.filter(student=self.student, course=self.course).delete()),
+            method='post', data={'grades': [{'student_id': self.student.id, 'marks': 70}]},
+            content_type='application/json',
+        )
+
+    def test_query_stats_flag_duplicates(self):
+        from accounts.querybudget import fingerprint
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'x\' LIMIT 21'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) AND "name" = \'y\' LIMIT 21'),
+        )
+
+    def test_headers_report_query_count(self):
+        with self.settings(QUERY_BUDGET_HEADERS=True):
+            response = self.client.get(reverse('admin_panel'))
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('X-Query-Time-Ms', response)
+
+
+class CourseStatsTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.course = Course.objects.create(name='Math', faculty=self.faculty)
+        self.students = [
+            User.objects.create_user(name=f'Student {i}', email=f'student{i}@example.com', password='password123')
+            for i in range(4)
+        ]
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+
+    def summary(self):
+        from .models import CourseGradeSummary
+        return CourseGradeSummary.objects.get(course=self.course)
+
+    def test_summary_follows_grade_changes(self):
+        grades = [
+            Grade.objects.create(student=student, course=self.course, marks=marks, grade='B')
+            for student, marks in zip(self.students, [40, 60, 80, 100])
+        ]
+        summary = self.summary()
+        self.assertEqual(summary.count, 4)
+        self.assertEqual(summary.mean, 70)
+        self.assertAlmostEqual(summary.std_dev, 500 ** 0.5)
+        self.assertEqual((summary.min_marks, summary.max_marks), (40, 100))
+        self.assertEqual(summary.median, 60)
+        self.assertEqual(summary.percentile(75), 80)
+
+        grades[3].marks = 90
+        grades[3].save()
+        grades[0].delete()
+        summary = self.summary()
+        self.assertEqual(summary.count, 3)
+        self.assertAlmostEqual(summary.mean, 230 / 3)
+        self.assertEqual((summary.min_marks, summary.max_marks), (60, 90))
+        self.assertEqual(sum(summary.histogram), 3)
+
+    def test_rebuild_matches_incremental_summary(self):
+        from .stats import rebuild_course_stats
+        for student, marks in zip(self.students, [55, 72.5, 72.5, 99]):
+            Grade.objects.create(student=student, course=self.course, marks=marks, grade='B')
+        empty = Course.objects.create(name='Empty', faculty=self.faculty)
+        incremental = self.summary()
+
+        self.assertEqual(rebuild_course_stats(), 2)
+        rebuilt = self.summary()
+        for field in ('count', 'total', 'total_squares', 'min_marks', 'max_marks', 'histogram'):
+            self.assertEqual(getattr(rebuilt, field), getattr(incremental, field))
+        self.assertEqual(empty.grade_summary.count, 0)
+        self.assertIsNone(empty.grade_summary.mean)
+
+    def test_stats_page(self):
+        Grade.objects.create(student=self.students[0], course=self.course, marks=75, grade='B')
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.client.get(reverse('course_stats', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary'].count, 1)
+        self.assertIn((90, 75), response.context['percentiles'])
+        self.assertContains(response, '70-79')
+
+    def test_stats_page_only_for_course_faculty(self):
+        User.objects.create_user(name='Other', email='other@example.com', password='password123', is_staff=True)
+        self.client.login(email='other@example.com', password='password123')
+        response = self.client.get(reverse('course_stats', args=[self.course.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_panel_lists_graded_courses(self):
+        Grade.objects.create(student=self.students[0], course=self.course, marks=75, grade='B')
+        response = self.client.get(reverse('admin_panel'))
+        self.assertEqual([summary.course.name for summary in response.context['course_stats']], ['Math'])
+
+
+class CourseCounterTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.course = Course.objects.create(name='Math', faculty=self.faculty)
+        self.students = [
+            User.objects.create_user(name=f'Student {i}', email=f'student{i}@example.com', password='password123')
+            for i in range(3)
+        ]
+
+    def counters(self):
+        self.course.refresh_from_db()
+        return self.course.enrolled_count, self.course.graded_count
+
+    def test_views_keep_the_counters(self):
+        for student in self.students:
+            self.client.force_login(student)
+            self.client.post(reverse('enroll_course', args=[self.course.id]))
+        self.client.force_login(self.faculty)
+        for student in self.students[:2]:
+            self.client.post(reverse('update_grade'), {'student_id': student.id, 'course_id': self.course.id, 'marks': 70})
+        # Regrading an existing grade doesn't count it twice
+        self.client.post(reverse('update_grade'), {'student_id': self.students[0].id, 'course_id': self.course.id, 'marks': 90})
+        self.assertEqual(self.counters(), (3, 2))
+
+        Grade.objects.filter(student=self.students[1]).delete()
+        self.client.force_login(self.students[2])
+        self.client.post(reverse('drop_course', args=[self.course.id]))
+        self.assertEqual(self.counters(), (2, 1))
+
+    def test_bulk_import_counts_new_grades(self):
+        from .grade_import import import_grades
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+        Grade.objects.create(student=self.students[0], course=self.course, marks=50, grade='D')
+        rows = enumerate([{'student_id': student.id, 'marks': 80} for student in self.students], start=1)
+        import_grades(self.course, rows)
+        self.assertEqual(self.counters()[1], 3)
+
+    def test_catalog_counts_need_no_queries(self):
+        self.client.force_login(self.students[0])
+        url = reverse('available_courses')
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=Course.objects.create(name='More', faculty=self.faculty))
+        with self.assertNumQueries(len(before)):
+            response = self.client.get(url)
+        self.assertContains(response, '0 enrolled')
+
+    def test_reconcile_fixes_drift_in_chunks(self):
+        from django.core.management import call_command
+        from io import StringIO
+        other = Course.objects.create(name='Physics', faculty=self.faculty)
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+        Grade.objects.create(student=self.students[0], course=other, marks=60, grade='C')
+        # Writes that skipped the signals
+        Course.objects.filter(id=self.course.id).update(enrolled_count=0)
+        Course.objects.filter(id=other.id).update(enrolled_count=7)
+
+        out = StringIO()
+        call_command('reconcile_course_counters', '--dry-run', stdout=out)
+        self.assertIn('Found 2', out.getvalue())
+        self.assertEqual(self.counters(), (0, 0))
+
+        call_command('reconcile_course_counters', '--chunk-size', '1', stdout=out)
+        self.assertEqual(self.counters(), (3, 0))
+        other.refresh_from_db()
+        self.assertEqual((other.enrolled_count, other.graded_count), (0, 1))
+
+        out = StringIO()
+        call_command('reconcile_course_counters', stdout=out)
+        self.assertIn('Fixed 0', out.getvalue())
+
+
+class GradingScaleTests(TestCase):
+
+    def setUp(self):
+        from .models import GradingScale
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Math', faculty=self.faculty)
+        self.other = Course.objects.create(name='Art', faculty=self.faculty)
+        self.pass_fail = GradingScale.objects.create(name='Pass/Fail', cutoffs=[[40, 'P'], [0, 'F']])
+        for course in (self.course, self.other):
+            Enrollment.objects.create(student=self.student, course=course)
+
+    def test_clean_cutoffs(self):
+        from .grading import clean_cutoffs
+        self.assertEqual(clean_cutoffs('B=70, A=85.5,F=0'), [[85.5, 'A'], [70, 'B'], [0, 'F']])
+        for bad in ('A=85,B', 'A=120', 'ABC=50', 'A=50,B=50', ''):
+            with self.assertRaises(ValueError):
+                clean_cutoffs(bad)
+
+    def test_blank_letter_uses_course_scale(self):
+        self.client.login(email='faculty@example.com', password='password123')
+        self.client.post(reverse('update_grade'), {'student_id': self.student.id, 'course_id': self.course.id, 'marks': 88, 'grade': ''})
+        self.assertEqual(Grade.objects.get(course=self.course).grade, 'A')
+
+        self.other.grading_scale = self.pass_fail
+        self.other.save()
+        self.client.post(reverse('update_grade'), {'student_id': self.student.id, 'course_id': self.other.id, 'marks': 45})
+        self.assertEqual(Grade.objects.get(course=self.other).grade, 'P')
+
+        # An explicit letter still wins
+        self.client.post(reverse('update_grade'), {'student_id': self.student.id, 'course_id': self.other.id, 'marks': 45, 'grade': 'F'})
+        self.assertEqual(Grade.objects.get(course=self.other).grade, 'F')
+
+    def test_regrade_applies_each_course_scale(self):
+        from .grading import regrade
+        peers = [
+            User.objects.create_user(name=f'Peer {i}', email=f'peer{i}@example.com', password='password123')
+            for i in range(3)
+        ]
+        for peer, marks in zip([self.student] + peers, [96, 72, 55, 10]):
+            Grade.objects.create(student=peer, course=self.course, marks=marks, grade='?')
+            Grade.objects.create(student=peer, course=self.other, marks=marks, grade='?')
+        self.other.grading_scale = self.pass_fail
+        self.other.save()
+
+        self.assertEqual(regrade(), 8)
+        letters = lambda course: list(Grade.objects.filter(course=course).order_by('-marks').values_list('grade', flat=True))
+        self.assertEqual(letters(self.course), ['A+', 'B', 'D', 'F'])
+        self.assertEqual(letters(self.other), ['P', 'P', 'P', 'F'])
+
+        # Nothing left to change, and a restricted regrade leaves other courses alone
+        self.assertEqual(regrade(), 0)
+        self.pass_fail.cutoffs = [[60, 'P'], [0, 'F']]
+        self.pass_fail.save()
+        self.assertEqual(regrade([self.course.id]), 0)
+        self.assertEqual(regrade(scale=self.pass_fail), 1)
+        self.assertEqual(letters(self.other), ['P', 'P', 'F', 'F'])
+
+    def test_regrade_refreshes_transcripts(self):
+        from .grading import regrade
+        from .transcripts import get_transcript
+        Grade.objects.create(student=self.student, course=self.course, marks=90, grade='C')
+        math = lambda: next(entry for entry in get_transcript(self.student.id) if entry['course_name'] == 'Math')
+        self.assertEqual(math()['grade'], 'C')
+        regrade()
+        self.assertEqual(math()['grade'], 'A')
+
+    def test_set_grading_scale_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        Grade.objects.create(student=self.student, course=self.course, marks=65, grade='C')
+        call_command('set_grading_scale', 'Strict', 'A=90,B=80,C=70,F=0', '--course', str(self.course.id), stdout=StringIO())
+        self.assertEqual(Grade.objects.get(course=self.course).grade, 'F')
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.grading_scale.name, 'Strict')
+
+
+class EnrollmentCapacityTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.course = Course.objects.create(name='Math', faculty=self.faculty, capacity=2)
+        self.students = [
+            User.objects.create_user(name=f'Student {i}', email=f'student{i}@example.com', password='password123')
+            for i in range(4)
+        ]
+
+    def enroll(self, student):
+        self.client.force_login(student)
+        return self.client.post(reverse('enroll_course', args=[self.course.id]), follow=True)
+
+    def drop(self, student):
+        self.client.force_login(student)
+        return self.client.post(reverse('drop_course', args=[self.course.id]))
+
+    def enrolled(self):
+        return set(Enrollment.objects.filter(course=self.course).values_list('student_id', flat=True))
+
+    def waitlist(self):
+        return list(self.course.waitlist.order_by('id').values_list('student_id', flat=True))
+
+    def test_full_course_waitlists_students(self):
+        for student in self.students:
+            self.enroll(student)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+        self.assertEqual(self.enrolled(), {self.students[0].id, self.students[1].id})
+        self.assertEqual(self.waitlist(), [self.students[2].id, self.students[3].id])
+
+        response = self.enroll(self.students[3])
+        self.assertIn('already on the waitlist', str(list(response.context['messages'])[0]))
+        self.assertContains(response, 'On Waitlist')
+        self.assertEqual(len(self.waitlist()), 2)
+
+    def test_drop_promotes_the_waitlist_in_order(self):
+        for student in self.students:
+            self.enroll(student)
+        self.drop(self.students[0])
+        self.assertEqual(self.enrolled(), {self.students[1].id, self.students[2].id})
+        self.assertEqual(self.waitlist(), [self.students[3].id])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+
+        # Leaving the waitlist frees nothing
+        self.drop(self.students[3])
+        self.assertEqual(self.waitlist(), [])
+        self.drop(self.students[1])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 1)
+
+    def test_deleting_a_student_frees_their_seat(self):
+        for student in self.students[:3]:
+            self.enroll(student)
+        self.students[0].delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 1)
+
+        from .enrollment import promote_waitlist
+        self.assertEqual(promote_waitlist(self.course.id), [self.students[2].id])
+        self.assertEqual(self.enrolled(), {self.students[1].id, self.students[2].id})
+
+    def test_cascades_promote_the_waitlist(self):
+        for student in self.students[:3]:
+            self.enroll(student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.students[0].delete()
+        self.assertEqual(self.enrolled(), {self.students[1].id, self.students[2].id})
+        self.assertEqual(self.waitlist(), [])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+
+    def test_enrollments_added_elsewhere_are_counted_both_ways(self):
+        # e.g. through the admin site, which can go past capacity
+        added = [Enrollment.objects.create(student=student, course=self.course) for student in self.students[:3]]
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 3)
+        for enrollment in added:
+            enrollment.delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 0)
+
+    def test_raising_capacity_and_promoting(self):
+        from .enrollment import promote_waitlist
+        for student in self.students:
+            self.enroll(student)
+        self.assertEqual(promote_waitlist(self.course.id), [])
+        Course.objects.filter(id=self.course.id).update(capacity=None)
+        self.assertEqual(promote_waitlist(self.course.id), [self.students[2].id, self.students[3].id])
+        self.assertEqual(len(self.enrolled()), 4)
+
+    def test_catalog_shows_seats(self):
+        self.enroll(self.students[0])
+        self.enroll(self.students[1])
+        self.client.force_login(self.students[2])
+        response = self.client.get(reverse('available_courses'))
+        self.assertContains(response, '2 of 2 seats taken')
+        self.assertContains(response, 'Join Waitlist')
+
+    def test_faculty_sets_capacity(self):
+        self.client.force_login(self.faculty)
+        self.client.post(reverse('add_course'), {'course_name': 'Small', 'capacity': '15'})
+        self.client.post(reverse('add_course'), {'course_name': 'Open', 'capacity': ''})
+        self.assertEqual(Course.objects.get(name='Small').capacity, 15)
+        self.assertIsNone(Course.objects.get(name='Open').capacity)
+
+
+class BatchEnrollmentTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.open = Course.objects.create(name='Open', faculty=self.faculty)
+        self.roomy = Course.objects.create(name='Roomy', faculty=self.faculty, capacity=5)
+        self.full = Course.objects.create(name='Full', faculty=self.faculty, capacity=0)
+        self.taken = Course.objects.create(name='Taken', faculty=self.faculty)
+        Enrollment.objects.create(student=self.student, course=self.taken)
+
+    def test_results_per_course(self):
+        from .enrollment import enroll_many
+        ids = [self.open.id, self.roomy.id, self.full.id, self.taken.id, 999999]
+        results = enroll_many(self.student, ids)
+        self.assertEqual([(result['course_id'], result['status']) for result in results], [
+            (self.open.id, 'enrolled'),
+            (self.roomy.id, 'enrolled'),
+            (self.full.id, 'waitlisted'),
+            (self.taken.id, 'already_enrolled'),
+            (999999, 'unknown_course'),
+        ])
+        self.roomy.refresh_from_db()
+        self.assertEqual(self.roomy.enrolled_count, 1)
+        self.assertEqual(set(self.student.enrollment_set.values_list('course_id', flat=True)),
+                         {self.open.id, self.roomy.id, self.taken.id})
+        self.assertTrue(self.full.waitlist.filter(student=self.student).exists())
+        self.assertEqual(enroll_many(self.student, [self.full.id])[0]['status'], 'already_waitlisted')
+
+    def test_rows_added_while_waiting_for_the_lock_are_not_counted_again(self):
+        from unittest import mock
+        from .enrollment import enroll_many
+
+        real_lock = Course.objects.select_for_update
+
+        def lock_after_a_double_submit(*args, **kwargs):
+            # The first submission commits between our check and our lock; the signal counts its seat
+            Enrollment.objects.create(student=self.student, course=self.roomy)
+            return real_lock(*args, **kwargs)
+
+        with mock.patch.object(Course.objects, 'select_for_update', lock_after_a_double_submit):
+            results = enroll_many(self.student, [self.roomy.id, self.open.id])
+        self.assertEqual([result['status'] for result in results], ['already_enrolled', 'enrolled'])
+        self.roomy.refresh_from_db()
+        self.assertEqual(self.roomy.enrolled_count, 1)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        from .enrollment import enroll_many
+        more = [Course.objects.create(name=f'Extra {i}', faculty=self.faculty) for i in range(6)]
+        other = User.objects.create_user(name='Other', email='other@example.com', password='password123')
+        with CaptureQueriesContext(connection) as small:
+            enroll_many(other, [self.open.id])
+        with self.assertNumQueries(len(small)):
+            enroll_many(self.student, [course.id for course in more])
+
+    def test_catalog_form(self):
+        self.client.force_login(self.student)
+        self.assertContains(self.client.get(reverse('available_courses')), 'name="course_ids"', count=3)
+        response = self.client.post(reverse('batch_enroll'), {'course_ids': [self.open.id, self.full.id]}, follow=True)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages, [
+            'You are enrolled in Open.',
+            'Full is full, so you have been added to its waitlist.',
+        ])
+        # The transcript cache was refreshed despite the bulk insert
+        self.assertContains(self.client.get(reverse('student_profile')), 'Open')
+
+    def test_api(self):
+        import json
+        self.client.force_login(self.student)
+        response = self.client.post(reverse('api_enrollments'), json.dumps({'course_ids': [self.open.id, self.taken.id]}),
+                                    content_type='application/json')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['enrolled', 'already_enrolled'])
+        response = self.client.post(reverse('api_enrollments'), json.dumps({'course_ids': ['x']}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs a database with row-level locking')
+class EnrollmentConcurrencyTests(TransactionTestCase):
+    """Registration-open stress test: many students race for a few seats."""
+
+    students = 300
+    capacity = 40
+    workers = 32
+
+    def setUp(self):
+        faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.course = Course.objects.create(name='Popular', faculty=faculty, capacity=self.capacity)
+        User.objects.bulk_create([
+            User(name=f'Student {i}', email=f'student{i}@example.com') for i in range(self.students)
+        ])
+        self.student_list = list(User.objects.filter(is_staff=False))
+
+    def run_concurrently(self, action, students):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connections
+
+        def worker(student):
+            try:
+                return action(student, self.course.id)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(worker, students))
+
+    def test_no_oversubscription(self):
+        from . import enrollment
+        results = self.run_concurrently(enrollment.enroll_student, self.student_list)
+        self.assertEqual(results.count(enrollment.ENROLLED), self.capacity)
+        self.assertEqual(results.count(enrollment.WAITLISTED), self.students - self.capacity)
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, self.capacity)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), self.capacity)
+
+        # Half of the class drops at once; the waitlist refills every seat
+        leavers = [e.student for e in Enrollment.objects.filter(course=self.course).select_related('student')[:20]]
+        self.run_concurrently(enrollment.drop_course, leavers)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, self.capacity)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), self.capacity)
+        self.assertEqual(self.course.waitlist.count(), self.students - self.capacity - 20)
+
+
+class CourseSearchTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.python = Course.objects.create(name='Python Programming', description='Learn to code', faculty=self.faculty)
+        self.data = Course.objects.create(name='Data Science', description='Statistics with Python', faculty=self.faculty)
+        self.art = Course.objects.create(name='Art History', description='Painting and sculpture', faculty=self.faculty)
+        self.url = reverse('course_autocomplete')
+
+    def test_prefix_tsquery(self):
+        from .search import prefix_tsquery, search_terms
+        self.assertEqual(search_terms("intro: pyth'on & <b>"), ['intro', 'pyth', 'on', 'b'])
+        self.assertEqual(prefix_tsquery(['intro', 'pyth']), 'intro & pyth:*')
+
+    def test_autocomplete_ranks_name_matches_first(self):
+        response = self.client.get(self.url, {'q': 'pyth'})
+        self.assertEqual(response.status_code, 200)
+        names = [course['name'] for course in response.json()['results']]
+        self.assertEqual(names, ['Python Programming', 'Data Science'])
+        self.assertEqual(response.json()['results'][0]['faculty__name'], 'Faculty')
+
+    def test_autocomplete_requires_every_term(self):
+        results = self.client.get(self.url, {'q': 'python stat'}).json()['results']
+        self.assertEqual([course['id'] for course in results], [self.data.id])
+
+    def test_autocomplete_limit_and_empty_query(self):
+        self.assertEqual(self.client.get(self.url, {'q': ' ?! '}).json()['results'], [])
+        self.assertEqual(len(self.client.get(self.url, {'q': 'python', 'limit': 1}).json()['results']), 1)
+        self.assertEqual(len(self.client.get(self.url, {'q': 'python', 'limit': 'x'}).json()['results']), 2)
+
+    def test_catalog_search(self):
+        student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.client.force_login(student)
+        response = self.client.get(reverse('available_courses'), {'q': 'sculpt'})
+        self.assertEqual(list(response.context['courses']), [self.art])
+
+
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.url = reverse('login')
+
+    def attempt(self, password='wrong', email='student@example.com', **extra):
+        return self.client.post(self.url, {'user_type': 'student', 'email': email, 'password': password}, **extra)
+
+    def test_failed_logins_for_one_email_are_throttled_before_hashing(self):
+        from unittest import mock
+        with self.settings(LOGIN_THROTTLE_EMAIL=(3, 1)):
+            for _ in range(3):
+                self.assertEqual(self.attempt().status_code, 302)
+            with mock.patch('accounts.views.authenticate') as authenticate:
+                response = self.attempt(password='password123')
+            authenticate.assert_not_called()
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(int(response['Retry-After']), 1)
+            self.assertContains(response, 'Too many login attempts', status_code=429)
+
+            # Other accounts from the same address are unaffected
+            self.assertEqual(self.attempt(email='someone@example.com').status_code, 302)
+
+    def test_ip_bucket_counts_every_attempt(self):
+        with self.settings(LOGIN_THROTTLE_IP=(2, 1)):
+            self.assertEqual(self.attempt(password='password123').status_code, 200)
+            self.assertEqual(self.attempt(password='password123').status_code, 200)
+            self.assertEqual(self.attempt(password='password123').status_code, 429)
+            self.assertEqual(self.attempt(REMOTE_ADDR='10.0.0.2').status_code, 302)
+
+    def test_ip_behind_a_proxy_comes_from_forwarded_for(self):
+        proxy = {'REMOTE_ADDR': '10.0.0.1'}
+        with self.settings(LOGIN_THROTTLE_IP=(1, 1), LOGIN_THROTTLE_PROXY_HOPS=1):
+            self.assertEqual(self.attempt(HTTP_X_FORWARDED_FOR='203.0.113.5', **proxy).status_code, 302)
+            self.assertEqual(self.attempt(email='a@example.com', HTTP_X_FORWARDED_FOR='203.0.113.6', **proxy).status_code, 302)
+            # A made-up entry in front of the proxy's own doesn't dodge the limit
+            response = self.attempt(email='b@example.com', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.5', **proxy)
+            self.assertEqual(response.status_code, 429)
+        with self.settings(LOGIN_THROTTLE_IP=(1, 1)):
+            # Without trusted proxies the header is ignored
+            self.assertEqual(self.attempt(HTTP_X_FORWARDED_FOR='203.0.113.7', **proxy).status_code, 302)
+            self.assertEqual(self.attempt(email='c@example.com', HTTP_X_FORWARDED_FOR='203.0.113.8', **proxy).status_code, 429)
+
+    def test_successful_logins_keep_email_tokens(self):
+        with self.settings(LOGIN_THROTTLE_EMAIL=(1, 1)):
+            for _ in range(3):
+                self.assertEqual(self.attempt(password='password123').status_code, 200)
+
+    def test_limit_resets_with_the_window(self):
+        from .throttle import RateLimit
+        limit = RateLimit('test', capacity=2, rate=60)  # two attempts per two seconds
+        self.assertEqual(limit.hit('x', now=100), 0)
+        self.assertEqual(limit.hit('x', now=100.5), 0)
+        self.assertAlmostEqual(limit.hit('x', now=101), 1)
+        self.assertEqual(limit.hit('x', now=102), 0)
+
+    def test_concurrent_attempts_cannot_overspend(self):
+        from .throttle import LoginThrottle
+        from django.test import RequestFactory
+        request = RequestFactory().post(self.url)
+        with self.settings(LOGIN_THROTTLE_EMAIL=(3, 1)):
+            # Every attempt is checked before any of them has finished hashing
+            throttles = [LoginThrottle(request, 'student@example.com') for _ in range(10)]
+            allowed = [throttle for throttle in throttles if not throttle.check()]
+        self.assertEqual(len(allowed), 3)
+
+    def test_falls_back_to_local_memory(self):
+        with self.settings(LOGIN_THROTTLE_CACHE='missing', LOGIN_THROTTLE_EMAIL=(1, 1)):
+            self.attempt(email='fallback@example.com')
+            self.assertEqual(self.attempt(email='fallback@example.com').status_code, 429)
+
+    def test_admin_credentials_checked(self):
+        from django.conf import settings
+        response = self.client.post(self.url, {'user_type': 'admin', 'email': settings.ADMIN_EMAIL, 'password': 'nope'})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        response = self.client.post(self.url, {
+            'user_type': 'admin', 'email': settings.ADMIN_EMAIL, 'password': settings.ADMIN_PASSWORD,
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics(self):
+        with self.settings(LOGIN_THROTTLE_EMAIL=(1, 1)):
+            self.attempt()
+            self.attempt()
+        metrics_url = reverse('login_throttle_metrics')
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(metrics_url).status_code, 403)
+
+        faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.client.force_login(faculty)
+        metrics = self.client.get(metrics_url).json()
+        self.assertEqual(metrics['email'], {'allowed': 1, 'throttled': 1})
+        self.assertEqual(metrics['ip'], {'allowed': 2, 'throttled': 0})
+
+
+class DatabasePoolTests(TestCase):
+
+    def test_pool_stats_endpoint_is_staff_only(self):
+        student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        url = reverse('database_pool_stats')
+
+        self.client.force_login(student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(faculty)
+        stats = self.client.get(url).json()
+        self.assertIn('default', stats)
+        if connection.vendor != 'postgresql':
+            self.assertEqual(stats['default'], {'pooled': False})
+
+    def test_bench_settings(self):
+        from .dbpool import bench_settings
+        base = {'NAME': 'db', 'CONN_MAX_AGE': 60, 'OPTIONS': {'pool': {'timeout': 5, 'max_size': 10}}}
+        self.assertEqual(bench_settings(base, 4)['OPTIONS']['pool'], {'timeout': 5, 'min_size': 4, 'max_size': 4})
+        direct = bench_settings(base)
+        self.assertNotIn('pool', direct['OPTIONS'])
+        self.assertEqual(direct['CONN_MAX_AGE'], 0)
+        self.assertEqual(base['OPTIONS']['pool']['max_size'], 10)
+
+    def test_benchmark_needs_postgresql(self):
+        from django.core.management import CommandError, call_command
+        if connection.vendor == 'postgresql':
+            self.skipTest('Only meaningful without PostgreSQL')
+        with self.assertRaises(CommandError):
+            call_command('bench_db_pool', '--requests', '1')
+
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.course = Course.objects.create(name='Math', faculty=self.faculty, capacity=10)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.other = User.objects.create_user(name='Other', email='other@example.com', password='password123')
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+    def catalog(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('available_courses'))
+
+    def roster(self):
+        self.client.force_login(self.faculty)
+        return self.client.get(reverse('student_details', args=[self.course.id]))
+
+    def test_card_is_cached_until_the_course_changes(self):
+        self.assertContains(self.catalog(self.student), 'Math')
+        # A write that skips the signals leaves the cached card in place
+        Course.objects.filter(id=self.course.id).update(name='Algebra')
+        self.assertContains(self.catalog(self.student), 'Math')
+
+        self.course.name = 'Geometry'
+        self.course.save()
+        self.assertContains(self.catalog(self.student), 'Geometry')
+
+    def test_buttons_are_per_student(self):
+        self.assertContains(self.catalog(self.student), 'Enrolled')
+        response = self.catalog(self.other)
+        self.assertNotContains(response, 'Enrolled')
+        self.assertContains(response, 'Enroll')
+
+    def test_enrolling_refreshes_the_seat_count(self):
+        # setUp's enrollment bypassed enroll_student; the signal counted its seat
+        self.assertContains(self.catalog(self.other), '1 of 10 seats taken')
+        self.client.post(reverse('enroll_course', args=[self.course.id]))
+        self.assertContains(self.catalog(self.other), '2 of 10 seats taken')
+
+    def test_instructor_rename_refreshes_cards(self):
+        self.catalog(self.student)
+        self.faculty.name = 'Professor Plum'
+        self.faculty.save()
+        self.assertContains(self.catalog(self.student), 'Professor Plum')
+
+    def test_roster_rows_follow_grade_writes(self):
+        grade = Grade.objects.create(student=self.student, course=self.course, marks=55, grade='D')
+        self.assertContains(self.roster(), '55')
+        Grade.objects.filter(id=grade.id).update(marks=66)
+        self.assertNotContains(self.roster(), '66')
+
+        grade.marks = 77
+        grade.save()
+        self.assertContains(self.roster(), '77')
+
+    def test_bulk_writes_refresh_the_roster(self):
+        from .grading import regrade
+        from .models import GradingScale
+        Grade.objects.create(student=self.student, course=self.course, marks=90, grade='X')
+        self.assertContains(self.roster(), '<td>X</td>')
+        regrade()
+        self.assertContains(self.roster(), '<td>A</td>')
+
+        GradingScale.objects.update(cutoffs=[[0, 'P']])
+        self.course.grading_scale = GradingScale.objects.get()
+        self.course.save()
+        regrade()
+        self.assertContains(self.roster(), '<td>P</td>')
+
+    def test_student_rename_refreshes_their_rows(self):
+        self.roster()
+        self.student.name = 'Renamed Student'
+        self.student.save()
+        self.assertContains(self.roster(), 'Renamed Student')
+
+    def test_a_page_reads_its_fragments_in_one_go(self):
+        from unittest import mock
+        from django.core.cache import cache
+        for number in range(5):
+            student = User.objects.create_user(name=f'Student {number}', email=f's{number}@example.com')
+            Enrollment.objects.create(student=student, course=self.course)
+            Course.objects.create(name=f'Course {number}', faculty=self.faculty)
+        self.roster()
+        self.catalog(self.student)
+        for page in (self.roster, lambda: self.catalog(self.other)):
+            with mock.patch.object(cache, 'get', wraps=cache.get) as get, \
+                    mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                    mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+                page()
+            self.assertEqual(get_many.call_count, 1)
+            # LocMemCache.get_many() calls get() per key; no other reads
+            self.assertEqual(get.call_count, len(get_many.call_args.args[0]))
+            # Everything was cached by the first render
+            self.assertEqual(set_many.call_count, 0)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Math', faculty=self.faculty)
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+    def revalidate(self, url, user):
+        self.client.force_login(user)
+        self.client.get(url)  # sets the CSRF cookie
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return etag, response, queries
+
+    def test_unchanged_pages_are_not_modified(self):
+        # Session and user, plus the ETag query; the student profile's
+        # ETag comes from the cached transcript
+        pages = [
+            (reverse('student_profile'), self.student, 2),
+            (reverse('available_courses'), self.student, 3),
+            (reverse('faculty_profile'), self.faculty, 3),
+        ]
+        for url, user, expected_queries in pages:
+            with self.subTest(url=url):
+                etag, response, queries = self.revalidate(url, user)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(len(queries), expected_queries)
+
+    def test_grade_release_changes_the_profile_etag(self):
+        url = reverse('student_profile')
+        etag, _, _ = self.revalidate(url, self.student)
+        Grade.objects.create(student=self.student, course=self.course, marks=88, grade='A')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '88')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bulk_writes_change_the_etag(self):
+        from .grading import regrade
+        Grade.objects.create(student=self.student, course=self.course, marks=88, grade='X')
+        url = reverse('student_profile')
+        etag, _, _ = self.revalidate(url, self.student)
+        regrade()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_seat_changes_refresh_the_catalog(self):
+        url = reverse('available_courses')
+        other = User.objects.create_user(name='Other', email='other@example.com', password='password123')
+        etag, _, _ = self.revalidate(url, self.student)
+        self.client.force_login(other)
+        self.client.post(reverse('enroll_course', args=[self.course.id]))
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pending_messages_skip_the_etag(self):
+        url = reverse('available_courses')
+        etag, _, _ = self.revalidate(url, self.student)
+        self.client.post(reverse('enroll_course', args=[self.course.id]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'already enrolled')
+
+    def test_pages_are_private(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('student_profile'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    async def test_async_views_are_conditional(self):
+        from django.contrib.sessions.backends.base import SessionBase
+        from django.test import AsyncRequestFactory
+        from accounts import async_views
+
+        def make_request(etag=None):
+            headers = {'If-None-Match': etag} if etag else {}
+            request = AsyncRequestFactory().get('/faculty-profile/', headers=headers)
+            request.user = self.faculty
+            request.session = SessionBase()
+
+            async def auser():
+                return request.user
+            request.auser = auser
+            return request
+
+        view = async_views.FacultyProfileView.as_view()
+        etag = (await view(make_request()))['ETag']
+        self.assertEqual((await view(make_request(etag))).status_code, 304)
+
+
+class JsonApiTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.courses = [Course.objects.create(name=f'Course {i}', faculty=self.faculty, capacity=30) for i in range(5)]
+        Enrollment.objects.create(student=self.student, course=self.courses[0])
+        Grade.objects.create(student=self.student, course=self.courses[0], marks=91, grade='A')
+
+    def get(self, user, name, args=(), **params):
+        self.client.force_login(user)
+        return self.client.get(reverse(name, args=args), params)
+
+    def test_catalog_is_paginated_by_cursor(self):
+        response = self.get(self.student, 'api_courses', limit=2)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual([course['name'] for course in data['results']], ['Course 0', 'Course 1'])
+
+        seen = [course['id'] for course in data['results']]
+        while data['next']:
+            data = self.get(self.student, 'api_courses', limit=2, after=data['next']).json()
+            seen += [course['id'] for course in data['results']]
+        self.assertEqual(seen, [course.id for course in self.courses])
+
+    def test_sparse_fields_select_only_those_columns(self):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api_courses'), {'fields': 'name,faculty'})
+        self.assertEqual(response.json()['results'][0], {'name': 'Course 0', 'faculty': 'Faculty'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"capacity"', sql)
+        self.assertNotIn('"updated_at"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.get(self.student, 'api_courses', fields='name,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.client.force_login(self.faculty)
+        url = reverse('api_roster', args=[self.courses[0].id])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for i in range(20):
+            peer = User.objects.create_user(name=f'Peer {i}', email=f'peer{i}@example.com')
+            Enrollment.objects.create(student=peer, course=self.courses[0])
+            Grade.objects.create(student=peer, course=self.courses[0], marks=60 + i, grade='B')
+        with self.assertNumQueries(len(small)):
+            rows = self.client.get(url).json()['results']
+        self.assertEqual(len(rows), 21)
+        self.assertEqual(rows[0], {
+            'student_id': self.student.id, 'name': 'Student', 'email': 'student@example.com',
+            'enrolled_on': rows[0]['enrolled_on'], 'marks': 91.0, 'grade': 'A',
+        })
+
+    def test_transcript(self):
+        response = self.get(self.student, 'api_transcript', fields='course_name,grade')
+        self.assertEqual(response.json(), {'results': [{'course_name': 'Course 0', 'grade': 'A'}]})
+
+    def test_enroll_and_drop(self):
+        import json
+        self.client.force_login(self.student)
+        course = self.courses[1]
+        response = self.client.post(reverse('api_enrollments'), json.dumps({'course_id': course.id}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'enrolled')
+        enrolled = self.client.get(reverse('api_enrollments'), {'fields': 'course_id'}).json()['results']
+        self.assertEqual(enrolled, [{'course_id': self.courses[0].id}, {'course_id': course.id}])
+
+        self.assertEqual(self.client.delete(reverse('api_drop_enrollment', args=[course.id])).status_code, 204)
+        self.assertEqual(self.client.delete(reverse('api_drop_enrollment', args=[course.id])).status_code, 404)
+
+    def test_grade_updates(self):
+        import json
+        self.client.force_login(self.faculty)
+        response = self.client.post(
+            reverse('api_grades', args=[self.courses[0].id]),
+            json.dumps({'grades': [{'student_id': self.student.id, 'marks': 72}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['updated'], 1)
+        grade = Grade.objects.get(student=self.student, course=self.courses[0])
+        self.assertEqual((grade.marks, grade.grade), (72, 'B'))
+
+    def test_access_rules(self):
+        self.assertEqual(self.client.get(reverse('api_courses')).status_code, 401)
+        self.assertEqual(self.get(self.student, 'api_roster', args=[self.courses[0].id]).status_code, 403)
+        other = User.objects.create_user(name='Other', email='other@example.com', password='password123', is_staff=True)
+        self.assertEqual(self.get(other, 'api_roster', args=[self.courses[0].id]).status_code, 404)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.post(reverse('api_courses')).status_code, 405)
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Math', faculty=self.faculty)
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+    def read_alias(self, cookies=None, write=False, during=None):
+        """The database a read goes to inside a replica view, and the response."""
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from accounts.routers import ReplicaPinMiddleware, ReplicaRouter, replica_reads
+        seen = {}
+
+        @replica_reads
+        def view(request):
+            if write:
+                ReplicaRouter().db_for_write(Course)
+            if during is not None:
+                during()
+            seen['alias'] = ReplicaRouter().db_for_read(Course)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaPinMiddleware(view)(request)
+        return seen['alias'], response
+
+    def with_replica(self):
+        from unittest import mock
+        return mock.patch('accounts.routers.replica_databases', return_value=['replica1'])
+
+    def test_reads_go_to_replicas_only_in_replica_views(self):
+        from accounts.routers import ReplicaRouter
+        with self.with_replica():
+            self.assertEqual(self.read_alias()[0], 'replica1')
+            # Outside a request, or in other views, everything uses the primary
+            self.assertEqual(ReplicaRouter().db_for_read(Course), 'default')
+        self.assertEqual(self.read_alias()[0], 'default')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        import time
+        from accounts.routers import PIN_COOKIE
+        with self.with_replica(), self.settings(REPLICA_PIN_SECONDS=30):
+            alias, response = self.read_alias(write=True)
+            self.assertEqual(alias, 'default')
+            pinned_until = response.cookies[PIN_COOKIE]
+            self.assertEqual(pinned_until['max-age'], 30)
+
+            self.assertEqual(self.read_alias({PIN_COOKIE: pinned_until.value})[0], 'default')
+            self.assertEqual(self.read_alias({PIN_COOKIE: str(time.time() - 1)})[0], 'replica1')
+
+    def test_dashboard_caches_are_filled_from_the_primary(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from accounts import dashboard
+        from accounts.routers import ReplicaRouter
+        seen = []
+
+        def build(*args):
+            seen.append(ReplicaRouter().db_for_read(Course))
+            return []
+
+        cache.delete_many([dashboard.DASHBOARD_KEY, dashboard.COURSE_STATS_KEY])
+        with self.with_replica(), mock.patch.object(dashboard, 'build_faculty_data', build), \
+                mock.patch.object(dashboard, 'course_stats_overview', build):
+            alias, _ = self.read_alias(during=lambda: (dashboard.get_faculty_data(), dashboard.get_course_stats()))
+        self.assertEqual(alias, 'replica1')
+        self.assertEqual(seen, ['default', 'default'])
+
+    def test_roster_rows_rendered_from_old_data_are_not_reused(self):
+        from django.utils import timezone
+        grade = Grade.objects.create(student=self.student, course=self.course, marks=55, grade='D')
+        self.client.force_login(self.faculty)
+        self.assertContains(self.client.get(reverse('student_details', args=[self.course.id])), '55')
+
+        # What a replica that hasn't caught up yet would return after the stamp was bumped
+        Grade.objects.filter(id=grade.id).update(marks=66, updated_at=timezone.now())
+        self.assertContains(self.client.get(reverse('student_details', args=[self.course.id])), '66')
+        User.objects.filter(id=self.student.id).update(name='Renamed Student')
+        self.assertContains(self.client.get(reverse('student_details', args=[self.course.id])), 'Renamed Student')
+
+    def test_enrolling_pins_the_next_page(self):
+        from accounts.routers import PIN_COOKIE
+        self.client.force_login(self.student)
+        other = Course.objects.create(name='Physics', faculty=self.faculty)
+        with self.with_replica():
+            response = self.client.post(reverse('enroll_course', args=[other.id]))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # Nothing to pin to without replicas
+        response = self.client.post(reverse('drop_course', args=[other.id]))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    # Needs a second database that isn't a test mirror of the default one
+    @skipUnless('replica1' in settings.DATABASES and not settings.DATABASES['replica1'].get('TEST', {}).get('MIRROR'),
+                'Needs a separate replica1 database')
+    def test_pages_read_from_the_replica(self):
+        # Give the replica different data, so we can tell where a page read from
+        replica = User.objects.using('replica1')
+        faculty = replica.create(id=self.faculty.id, name='Faculty', email='faculty@example.com', is_staff=True)
+        # Same password hash, or the session would no longer be valid
+        replica.create(id=self.student.id, name='Student', email='student@example.com', password=self.student.password)
+        Course.objects.using('replica1').create(name='Only On Replica', faculty=faculty)
+
+        self.client.force_login(self.student)
+        with self.settings(REPLICA_DATABASES=['replica1']):
+            response = self.client.get(reverse('available_courses'))
+            self.assertContains(response, 'Only On Replica')
+            self.assertNotContains(response, 'Math')
+
+            # Right after a write the same browser reads from the primary
+            other = Course.objects.create(name='Physics', faculty=self.faculty)
+            self.client.post(reverse('enroll_course', args=[other.id]))
+            response = self.client.get(reverse('available_courses'))
+            self.assertContains(response, 'Math')
+            self.assertNotContains(response, 'Only On Replica')
+
+
+class BackgroundJobTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com',
+                                                password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Queues', faculty=self.faculty)
+        Enrollment.objects.create(course=self.course, student=self.student)
+
+    def test_worker_claims_and_runs_a_job(self):
+        from .jobs import claim_job, enqueue, run_job
+        from .models import Job
+
+        job = enqueue('rebuild_grade_stats', {'course_ids': [self.course.id]})
+        claimed = claim_job('test-worker')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, Job.RUNNING)
+        # Nothing else is due
+        self.assertIsNone(claim_job('test-worker'))
+
+        self.assertEqual(run_job(claimed), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.progress, job.worker), (Job.SUCCEEDED, 1, 100, 'test-worker'))
+        self.assertEqual(job.result, {'courses': 1})
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_jobs_back_off_then_fail(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .jobs import RETRY_BASE_SECONDS, TASKS, claim_job, enqueue, run_job
+        from .models import Job
+
+        def broken(job):
+            raise RuntimeError('disk on fire')
+
+        with mock.patch.dict(TASKS, {'broken': broken}):
+            job = enqueue('broken', max_attempts=2)
+            self.assertEqual(run_job(claim_job('w')), Job.QUEUED)
+            job.refresh_from_db()
+            self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS - 5))
+            self.assertIn('disk on fire', job.error)
+            # Not due again until the backoff has passed
+            self.assertIsNone(claim_job('w'))
+
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertEqual(run_job(claim_job('w')), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_unknown_kinds_are_refused(self):
+        from .jobs import enqueue
+        with self.assertRaises(ValueError):
+            enqueue('no_such_task')
+
+    def test_progress_is_reported(self):
+        from .jobs import claim_job, enqueue, run_job
+        from .models import Job
+
+        Course.objects.create(name='Second', faculty=self.faculty)
+        # A write that skipped the signals
+        Course.objects.filter(id=self.course.id).update(enrolled_count=0)
+        job = enqueue('reconcile_counters')
+        run_job(claim_job('w'))
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'checked': 2, 'fixed': 1})
+        self.assertEqual(job.progress_message, '2 of 2 courses checked')
+
+        half = Job.objects.create(kind='reconcile_counters')
+        half.report_progress(1, 4, 'a quarter')
+        self.assertEqual(Job.objects.values_list('progress', flat=True).get(pk=half.pk), 25)
+
+    def test_stale_running_jobs_are_requeued(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import requeue_stale_jobs
+        from .models import Job
+
+        stale = Job.objects.create(kind='regrade', status=Job.RUNNING, worker='dead',
+                                   started_at=timezone.now() - timedelta(hours=2))
+        Job.objects.create(kind='regrade', status=Job.RUNNING, worker='alive', started_at=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.QUEUED)
+
+    def test_stale_jobs_out_of_attempts_fail(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import requeue_stale_jobs
+        from .models import Job
+
+        hours_ago = timezone.now() - timedelta(hours=2)
+        last = Job.objects.create(kind='regrade', status=Job.RUNNING, attempts=3, max_attempts=3,
+                                  started_at=hours_ago, heartbeat_at=hours_ago)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        last.refresh_from_db()
+        self.assertEqual(last.status, Job.FAILED)
+        self.assertIsNotNone(last.finished_at)
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+    def test_a_requeued_run_keeps_its_own_outcome(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .jobs import TASKS, claim_job, enqueue, requeue_stale_jobs, run_job
+        from .models import Job
+        runs = []
+
+        def slow_then_fresh(job, **payload):
+            runs.append(job.attempts)
+            if len(runs) == 1:
+                # The first worker's heartbeat goes stale and another worker takes over
+                Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+                requeue_stale_jobs()
+                self.assertEqual(run_job(claim_job('fresh')), Job.SUCCEEDED)
+            return {'attempt': job.attempts}
+
+        with mock.patch.dict(TASKS, {'regrade': slow_then_fresh}):
+            job = enqueue('regrade')
+            self.assertIsNone(run_job(claim_job('slow')))
+        job.refresh_from_db()
+        self.assertEqual(runs, [1, 2])
+        self.assertEqual((job.status, job.result, job.worker), (Job.SUCCEEDED, {'attempt': 2}, 'fresh'))
+
+    def test_long_jobs_stay_running_while_their_worker_beats(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import beat, claim_job, enqueue, requeue_stale_jobs
+        from .models import Job
+
+        enqueue('regrade')
+        enqueue('regrade')
+        long_running, silent = claim_job('busy'), claim_job('gone')
+        hours_ago = timezone.now() - timedelta(hours=2)
+        Job.objects.filter(pk__in=[long_running.pk, silent.pk]).update(started_at=hours_ago, heartbeat_at=hours_ago)
+
+        beat(long_running)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(Job.objects.get(pk=long_running.pk).status, Job.RUNNING)
+        self.assertEqual(Job.objects.get(pk=silent.pk).status, Job.QUEUED)
+
+        # Reporting progress counts as a beat too
+        Job.objects.filter(pk=long_running.pk).update(heartbeat_at=hours_ago)
+        long_running.report_progress(1, 2)
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+    def test_heartbeat_thread_beats_until_the_block_ends(self):
+        import time
+        from unittest import mock
+        from . import jobs
+
+        job = jobs.Job(pk=1)
+        with mock.patch.object(jobs, 'beat') as beat, mock.patch.object(jobs, 'connection'):
+            with jobs.heartbeat(job, every=0.01):
+                deadline = time.monotonic() + 5
+                while beat.call_count < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            calls = beat.call_count
+        self.assertGreaterEqual(calls, 2)
+        self.assertEqual(beat.call_count, calls)
+
+    def test_run_jobs_command_drains_the_queue(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .jobs import enqueue
+        from .models import Job
+
+        enqueue('regrade', {'course_ids': [self.course.id]})
+        enqueue('rebuild_grade_stats')
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertIn('Ran 2 jobs.', out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 2)
+
+    def test_polling_workers_recover_jobs_of_workers_that_die_later(self):
+        from datetime import timedelta
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .jobs import TASKS, enqueue
+        from .models import Job
+        hours_ago = timezone.now() - timedelta(hours=2)
+
+        def other_worker_dies(job, **payload):
+            Job.objects.create(kind='rebuild_grade_stats', status=Job.RUNNING, worker='dead', attempts=1,
+                               started_at=hours_ago, heartbeat_at=hours_ago)
+            return {}
+
+        enqueue('regrade')
+        out = StringIO()
+        with mock.patch.dict(TASKS, {'regrade': other_worker_dies}), \
+                mock.patch('accounts.management.commands.run_jobs.REQUEUE_EVERY_SECONDS', 0):
+            call_command('run_jobs', '--once', stdout=out)
+        self.assertIn('Recovered 1 jobs', out.getvalue())
+        self.assertIn('Ran 2 jobs.', out.getvalue())
+        self.assertFalse(Job.objects.exclude(status=Job.SUCCEEDED).exists())
+
+    def test_background_grade_import_is_queued(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .jobs import claim_job, run_job
+
+        self.client.login(email='faculty@example.com', password='password123')
+        response = self.client.post(reverse('import_grades', args=[self.course.id]), {
+            'grades_file': SimpleUploadedFile('grades.csv', f'student_id,marks\n{self.student.id},77\n'.encode(),
+                                              content_type='text/csv'),
+            'background': '1',
+        })
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Grade.objects.exists())
+
+        run_job(claim_job('w'))
+        self.assertEqual(Grade.objects.get(student=self.student).marks, 77)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['result']['created'], 1)
+
+    def test_job_status_is_for_staff_and_the_owner(self):
+        from .jobs import enqueue
+
+        job = enqueue('rebuild_grade_stats', user=self.student)
+        User.objects.create_user(name='Other', email='other@example.com', password='password123')
+
+        self.client.login(email='other@example.com', password='password123')
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('job_list')).status_code, 403)
+
+        self.client.login(email='student@example.com', password='password123')
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).json()['status'], 'queued')
+
+        self.client.login(email='faculty@example.com', password='password123')
+        jobs = self.client.get(reverse('job_list')).json()['jobs']
+        self.assertEqual([each['id'] for each in jobs], [job.pk])
+
+    def test_admin_panel_admin_can_poll_jobs(self):
+        from .jobs import enqueue
+
+        job = enqueue('rebuild_grade_stats')
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('job_list')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+
+        # The configured admin never becomes a logged-in user
+        response = self.client.post(reverse('login'), {
+            'user_type': 'admin', 'email': settings.ADMIN_EMAIL, 'password': settings.ADMIN_PASSWORD,
+        })
+        self.assertContains(response, reverse('job_list'))
+        self.assertEqual([each['id'] for each in self.client.get(reverse('job_list')).json()['jobs']], [job.pk])
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).json()['status'], 'queued')
+
+
+class BatchTranscriptTests(TestCase):
+
+    def setUp(self):
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com',
+                                                password='password123', is_staff=True)
+        self.courses = [Course.objects.create(name=f'Course {i}', faculty=self.faculty) for i in range(3)]
+        self.students = [
+            User.objects.create_user(name=f'Student {i}', email=f'student{i}@example.com', password='password123')
+            for i in range(5)
+        ]
+        for i, student in enumerate(self.students):
+            for course in self.courses[:i % 3 + 1]:
+                Enrollment.objects.create(student=student, course=course)
+        Grade.objects.create(student=self.students[2], course=self.courses[1], marks=81, grade='A')
+        Grade.objects.create(student=self.students[4], course=self.courses[0], marks=45, grade='D')
+
+    def test_chunks_match_the_profile_transcripts(self):
+        from .batch_transcripts import student_chunks
+        from .transcripts import build_transcript
+
+        # Three queries per chunk, however many students and rows it holds
+        with self.assertNumQueries(3 * 3 + 1):
+            chunks = list(student_chunks(chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        for student in (student for chunk in chunks for student in chunk):
+            self.assertEqual(student['transcript'], build_transcript(student['id']))
+
+    def test_command_writes_a_zip(self):
+        import tempfile
+        import zipfile
+        from io import StringIO
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/transcripts.zip'
+            out = StringIO()
+            call_command('generate_transcripts', path, processes=1, chunk_size=2, stdout=out)
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+                document = archive.read(f'{self.students[2].id}-student-2.html').decode()
+        self.assertEqual(len(names), 5)
+        self.assertIn('Course 1', document)
+        self.assertIn('81', document)
+        self.assertIn('Wrote 5 transcripts', out.getvalue())
+
+    def test_process_pool_writes_a_directory(self):
+        import os
+        import tempfile
+        from .batch_transcripts import generate_transcripts
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = generate_transcripts(tmp, processes=2, chunk_size=2)
+            self.assertEqual(len(os.listdir(tmp)), 5)
+        self.assertEqual(report['transcripts'], 5)
+
+    def test_workers_started_afresh_set_django_up(self):
+        import multiprocessing
+        import os
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+        from unittest import mock
+        from .batch_transcripts import generate_transcripts
+
+        # Spawned workers import nothing from this process, unlike forked ones
+        spawning = partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch('accounts.batch_transcripts.ProcessPoolExecutor', spawning):
+            report = generate_transcripts(tmp, processes=2, chunk_size=2)
+            self.assertEqual(len(os.listdir(tmp)), 5)
+        self.assertEqual(report['transcripts'], 5)
+
+    def test_pdf_needs_weasyprint(self):
+        from unittest import mock
+        from django.core.management import CommandError, call_command
+
+        with mock.patch('accounts.batch_transcripts.weasyprint', None):
+            with self.assertRaises(CommandError):
+                call_command('generate_transcripts', '/tmp/unused', format='pdf', processes=1)
+
+
+class GradeAuditTests(TestCase):
+
+    def setUp(self):
+        from . import audit
+        from .models import GradeAuditEntry
+        # Start from an empty buffer and log, whatever earlier tests left behind
+        audit.flush()
+        GradeAuditEntry.objects.all().delete()
+
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com',
+                                                password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.course = Course.objects.create(name='Audited', faculty=self.faculty)
+        Enrollment.objects.create(course=self.course, student=self.student)
+
+    def history(self):
+        from .audit import grade_history
+        return list(grade_history(self.student.id, self.course.id).values_list(
+            'source', 'old_marks', 'old_grade', 'new_marks', 'new_grade', 'actor_id'
+        ))
+
+    def test_grade_form_changes_are_logged_after_commit(self):
+        from . import audit
+
+        self.client.login(email='faculty@example.com', password='password123')
+        url = reverse('update_grade')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'student_id': self.student.id, 'course_id': self.course.id, 'marks': 55, 'grade': 'D'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'student_id': self.student.id, 'course_id': self.course.id, 'marks': 88, 'grade': 'A'})
+            # Saving the same values again is not a change
+            self.client.post(url, {'student_id': self.student.id, 'course_id': self.course.id, 'marks': 88, 'grade': 'A'})
+
+        self.assertEqual(audit.pending(), 2)
+        self.assertEqual(self.history(), [
+            ('edit', None, '', 55, 'D', self.faculty.id),
+            ('edit', 55, 'D', 88, 'A', self.faculty.id),
+        ])
+        self.assertEqual(audit.pending(), 0)
+
+    def test_rolled_back_changes_are_not_logged(self):
+        from . import audit
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, course=self.course, marks=40, grade='F')
+        audit.flush()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Grade.objects.get(student=self.student).delete()
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(audit.pending(), 0)
+        self.assertEqual([row[0] for row in self.history()], ['edit'])
+
+    def test_imports_regrades_and_deletes_are_logged(self):
+        from .grade_import import import_grades
+        from .grading import regrade
+        from .models import GradingScale
+
+        with self.captureOnCommitCallbacks(execute=True):
+            import_grades(self.course, [(1, {'student_id': str(self.student.id), 'marks': '72', 'grade': ''})])
+        with self.captureOnCommitCallbacks(execute=True):
+            # Unchanged rows are not logged again
+            import_grades(self.course, [(1, {'student_id': str(self.student.id), 'marks': '72', 'grade': ''})])
+        letter = Grade.objects.get(student=self.student).grade
+        strict = GradingScale.objects.create(name='Strict', cutoffs=[[80, 'A'], [0, 'F']])
+        self.course.grading_scale = strict
+        self.course.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            regrade([self.course.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.get(student=self.student).delete()
+
+        self.assertEqual(self.history(), [
+            ('import', None, '', 72, letter, None),
+            ('regrade', 72, letter, 72, 'F', None),
+            ('delete', 72, 'F', None, '', None),
+        ])
+
+    def test_buffer_is_written_in_batches(self):
+        from django.test import override_settings
+        from . import audit
+        from .models import GradeAuditEntry
+
+        with override_settings(GRADE_AUDIT_BATCH_SIZE=3, GRADE_AUDIT_FLUSH_SECONDS=3600):
+            audit._buffer_entries([audit.entry(self.student.id, self.course.id, GradeAuditEntry.EDIT)] * 2)
+            self.assertEqual(audit.flush_if_due(), 0)
+            audit._buffer_entries([audit.entry(self.student.id, self.course.id, GradeAuditEntry.EDIT)])
+            self.assertEqual(audit.flush_if_due(), 3)
+        self.assertEqual(GradeAuditEntry.objects.count(), 3)
+
+    def test_idle_processes_still_flush(self):
+        import time
+        from unittest import mock
+        from . import audit
+        from .models import GradeAuditEntry
+        written = []
+
+        def bulk_create(entries, **kwargs):
+            written.extend(entries)
+
+        # No request ever finishes; the flusher thread writes the entry once it is due
+        with self.settings(GRADE_AUDIT_FLUSH_SECONDS=0.05), \
+                mock.patch.object(GradeAuditEntry.objects, 'bulk_create', side_effect=bulk_create), \
+                mock.patch.object(audit.connections, 'close_all') as close_all:
+            audit._buffer_entries([audit.entry(self.student.id, self.course.id, GradeAuditEntry.EDIT)])
+            deadline = time.monotonic() + 5
+            while not close_all.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(written), 1)
+        self.assertEqual(audit.pending(), 0)
+
+    def test_synchronous_mode_writes_on_commit(self):
+        from unittest import mock
+        from django.db import DatabaseError
+        from . import audit
+        from .models import GradeAuditEntry
+
+        with self.settings(GRADE_AUDIT_SYNCHRONOUS=True), self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, course=self.course, marks=55, grade='D')
+        self.assertEqual(audit.pending(), 0)
+        self.assertEqual(GradeAuditEntry.objects.count(), 1)
+
+        # Kept for the next flush if the write fails
+        with self.settings(GRADE_AUDIT_SYNCHRONOUS=True), \
+                mock.patch.object(audit, 'ensure_partitions', side_effect=DatabaseError), \
+                self.assertLogs('accounts.audit', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.filter(student=self.student).delete()
+        self.assertEqual(audit.pending(), 1)
+
+    def test_entries_over_the_cap_are_dropped_with_an_error(self):
+        from unittest import mock
+        from django.db import DatabaseError
+        from . import audit
+        from .models import GradeAuditEntry
+
+        audit._buffer_entries([audit.entry(self.student.id, self.course.id, GradeAuditEntry.EDIT)] * 5)
+        with mock.patch.object(audit, 'MAX_BUFFERED', 3), \
+                mock.patch.object(audit, 'ensure_partitions', side_effect=DatabaseError), \
+                self.assertLogs('accounts.audit', 'ERROR') as logs:
+            self.assertEqual(audit.flush(), 0)
+        self.assertIn('Dropping 2 grade audit entries', logs.output[-1])
+        self.assertEqual(audit.pending(), 3)
+
+    def test_admin_shows_the_log_read_only(self):
+        from .models import GradeAuditEntry
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, course=self.course, marks=55, grade='D')
+        self.history()
+        entry = GradeAuditEntry.objects.get()
+        admin_user = User.objects.create_user(name='Admin', email='root@example.com', password='password123',
+                                              is_staff=True)
+        User.objects.filter(pk=admin_user.pk).update(is_superuser=True)
+        self.client.force_login(admin_user)
+        self.assertEqual(self.client.get(reverse('admin:accounts_gradeauditentry_changelist')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:accounts_gradeauditentry_change', args=[entry.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:accounts_gradeauditentry_add')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:accounts_gradeauditentry_delete', args=[entry.pk])).status_code, 403)
+
+    def test_history_api_is_for_the_faculty_and_the_student(self):
+        from . import audit
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with audit.acting_as(self.faculty):
+                Grade.objects.create(student=self.student, course=self.course, marks=91, grade='A')
+        url = reverse('api_grade_history', args=[self.course.id, self.student.id])
+
+        self.client.login(email='student@example.com', password='password123')
+        results = self.client.get(url, {'fields': 'new_marks,actor_id'}).json()['results']
+        self.assertEqual(results, [{'new_marks': 91, 'actor_id': self.faculty.id}])
+
+        User.objects.create_user(name='Other', email='other@example.com', password='password123')
+        self.client.login(email='other@example.com', password='password123')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(email='faculty@example.com', password='password123')
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_percentiles_and_summary(self):
+        from accounts.benchmark import percentile, summarize
+        values = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 0.05)
+        self.assertEqual(percentile(values, 99), 0.099)
+        result = summarize('x', values, [3, 5], [200] * 99 + [500], elapsed=2.0)
+        self.assertEqual((result['requests'], result['rps'], result['errors']), (100, 50.0, 1))
+        self.assertEqual(result['queries_per_request'], 4.0)
+
+    def test_command_covers_routes_and_writes_json(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.unlink, path)
+
+        call_command('bench_endpoints', requests=2, concurrency='1', students=3, courses=2,
+                     output=path, stdout=StringIO())
+
+        with open(path) as handle:
+            report = json.load(handle)
+        names = {result['name'] for result in report['results']}
+        self.assertIn('login_student', names)
+        self.assertIn('update_grade', names)
+        for result in report['results']:
+            self.assertEqual(result['errors'], 0, result['name'])
+            self.assertIsNotNone(result['queries_per_request'])
+
+
+class AsyncViewsTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.faculty = User.objects.create_user(name='Faculty', email='faculty@example.com', password='password123', is_staff=True)
+        self.student = User.objects.create_user(name='Student', email='student@example.com', password='password123')
+        self.math = Course.objects.create(name='Math', faculty=self.faculty)
+        self.science = Course.objects.create(name='Science', faculty=self.faculty)
+        Enrollment.objects.create(student=self.student, course=self.math)
+        Grade.objects.create(student=self.student, course=self.math, marks=85, grade='A')
+
+    def make_request(self, path, user):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import AsyncRequestFactory
+        request = AsyncRequestFactory().get(path)
+        request.user = user or AnonymousUser()
+
+        async def auser():
+            return request.user
+        request.auser = auser
+        return request
+
+    async def test_query_budget_middleware_counts_async_requests(self):
+        from asgiref.sync import iscoroutinefunction
+        from django.http import HttpResponse
+        from accounts.querybudget import QueryBudgetMiddleware
+
+        async def view(request):
+            await Course.objects.acount()
+            await Grade.objects.acount()
+            return HttpResponse()
+
+        middleware = QueryBudgetMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = self.make_request('/', self.student)
+        with self.settings(QUERY_BUDGET_HEADERS=True):
+            response = await middleware(request)
+        self.assertEqual(request.query_stats.count, 2)
+        self.assertEqual(response['X-Query-Count'], '2')
+
+    async def test_overlapping_async_requests_count_their_own_queries(self):
+        import asyncio
+        from django.http import HttpResponse
+        from accounts.querybudget import QueryBudgetMiddleware
+
+        def view(queries):
+            async def run(request):
+                for _ in range(queries):
+                    await Course.objects.acount()
+                    # Let the other request run a query in between
+                    await asyncio.sleep(0.01)
+                return HttpResponse()
+            return run
+
+        short = self.make_request('/', self.student)
+        long = self.make_request('/', self.faculty)
+        await asyncio.gather(QueryBudgetMiddleware(view(2))(short), QueryBudgetMiddleware(view(5))(long))
+        self.assertEqual(short.query_stats.count, 2)
+        self.assertEqual(long.query_stats.count, 5)
+
+    async def test_student_profile(self):
+        from accounts import async_views
+        response = await async_views.student_profile(self.make_request('/student/profile/', self.student))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Math')
+        self.assertContains(response, '85')
+
+    async def test_available_courses(self):
+        from accounts import async_views
+        view = async_views.AvailableCoursesView.as_view()
+        response = await view(self.make_request('/available-courses/?q=sci', self.student))
+        self.assertContains(response, 'Science')
+        self.assertNotContains(response, 'Math')
+
+    def test_available_courses_looks_up_only_the_page(self):
+        from asgiref.sync import async_to_sync
+        from accounts import async_views
+        view = async_views.AvailableCoursesView.as_view()
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(view)(self.make_request('/available-courses/?q=sci', self.student))
+        # The course ids the buttons need; the page's ETag only reads a summary
+        lookups = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith(('SELECT "accounts_enrollment"."course_id"',
+                                               'SELECT "accounts_waitlistentry"."course_id"'))]
+        self.assertEqual(len(lookups), 2)
+        for sql in lookups:
+            self.assertIn(f'IN ({self.science.id})', sql)
+
+    async def test_faculty_profile_requires_login(self):
+        from accounts import async_views
+        view = async_views.FacultyProfileView.as_view()
+        response = await view(self.make_request('/faculty-profile/', None))
+        self.assertEqual(response.status_code, 302)
+
+        response = await view(self.make_request('/faculty-profile/', self.faculty))
+        self.assertContains(response, 'Science')
+
+    async def test_student_details(self):
+        from django.http import Http404
+        from accounts import async_views
+        response = await async_views.student_details(self.make_request('/', self.faculty), self.math.id)
+        self.assertContains(response, 'student@example.com')
+
+        with self.assertRaises(Http404):
+            await async_views.student_details(self.make_request('/', self.student), self.math.id)
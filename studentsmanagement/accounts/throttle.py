@@ -0,0 +1,144 @@
+"""Rate limiting for the login form.
+
+Each limit allows ``capacity`` attempts per window, where a window lasts
+as long as ``rate`` attempts per minute take to add up to ``capacity``; a
+(30, 30) limit allows 30 attempts a minute, a (5, 1) limit 5 every five
+minutes. Attempts are counted with the cache's atomic add() and incr(), so
+concurrent requests can never all see the same spare allowance and hash
+passwords beyond it. Counters live in the configured cache so every worker
+shares them; if the cache can't be reached, a per-process local-memory
+cache is used instead, so throttling degrades rather than failing open.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'throttle:metrics:{scope}:{outcome}'
+OUTCOMES = ('allowed', 'throttled')
+
+_local_cache = LocMemCache('login-throttle', {'OPTIONS': {'MAX_ENTRIES': 10000}})
+
+
+def _cache_call(method, *args):
+    try:
+        return getattr(caches[settings.LOGIN_THROTTLE_CACHE], method)(*args)
+    except Exception:
+        logger.warning('Throttle cache unavailable, using local memory', exc_info=True)
+        return getattr(_local_cache, method)(*args)
+
+
+def _incr(key, timeout=None):
+    """Atomically add one to the counter at ``key`` and return the new count."""
+    # add() is a no-op if the counter already exists
+    _cache_call('add', key, 0, timeout)
+    try:
+        return _cache_call('incr', key)
+    except ValueError:
+        # Evicted between add() and incr()
+        _cache_call('set', key, 1, timeout)
+        return 1
+
+
+class RateLimit:
+
+    def __init__(self, scope, capacity, rate):
+        self.scope = scope
+        self.capacity = capacity
+        self.window = capacity * 60.0 / rate  # seconds
+
+    def key(self, ident, now):
+        digest = hashlib.sha256(ident.lower().encode()).hexdigest()[:32]
+        return f'throttle:{self.scope}:{digest}:{int(now // self.window)}'
+
+    def hit(self, ident, now=None):
+        """Count an attempt by ``ident``. Returns the seconds to wait if it is over the limit, else 0."""
+        now = time.time() if now is None else now
+        if _incr(self.key(ident, now), int(self.window) + 1) <= self.capacity:
+            return 0
+        return self.window - now % self.window
+
+    def refund(self, ident, now=None):
+        """Give back an attempt counted in the current window."""
+        now = time.time() if now is None else now
+        try:
+            _cache_call('decr', self.key(ident, now))
+        except ValueError:
+            # The window has rolled over, or the counter was evicted
+            pass
+
+
+def login_limits():
+    ip_capacity, ip_rate = settings.LOGIN_THROTTLE_IP
+    email_capacity, email_rate = settings.LOGIN_THROTTLE_EMAIL
+    return RateLimit('ip', ip_capacity, ip_rate), RateLimit('email', email_capacity, email_rate)
+
+
+def client_ip(request):
+    """The address a login attempt came from, as seen by the first proxy we trust.
+
+    Behind ``settings.LOGIN_THROTTLE_PROXY_HOPS`` reverse proxies, REMOTE_ADDR
+    is the innermost proxy, and each proxy appends the address it was
+    connected from to X-Forwarded-For. Anything before those entries was
+    sent by the client and may be made up, so the address is taken that
+    many entries from the end.
+    """
+    hops = settings.LOGIN_THROTTLE_PROXY_HOPS
+    if hops:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        forwarded = [part for part in forwarded if part]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+class LoginThrottle:
+    """Decides whether a login attempt may go ahead, before any password is hashed.
+
+    Every attempt counts against its IP's limit and its email's limit, and
+    both are spent before the password is checked. A successful login gives
+    the email's attempt back, so only failures add up there: a shared campus
+    IP gets a generous allowance while guessing one account's password stays
+    slow.
+    """
+
+    def __init__(self, request, email):
+        self.ip = client_ip(request)
+        self.email = (email or '').strip()
+        self.ip_limit, self.email_limit = login_limits()
+
+    def check(self):
+        """Return the seconds to wait before retrying, or 0 if the attempt may proceed."""
+        if not settings.LOGIN_THROTTLE_ENABLED:
+            return 0
+        waits = {'ip': self.ip_limit.hit(self.ip)}
+        if self.email:
+            waits['email'] = self.email_limit.hit(self.email)
+        retry_after = max(waits.values())
+
+        for scope, wait in waits.items():
+            _incr(METRICS_KEY.format(scope=scope, outcome='throttled' if wait else 'allowed'))
+        if retry_after:
+            logger.warning('Login throttled for ip=%s (%s)', self.ip,
+                           ', '.join(scope for scope, wait in waits.items() if wait))
+        return retry_after
+
+    def succeeded(self):
+        if settings.LOGIN_THROTTLE_ENABLED and self.email:
+            self.email_limit.refund(self.email)
+
+
+def throttle_metrics():
+    """Allowed/throttled attempt counters per scope, since the cache was last cleared."""
+    return {
+        scope: {
+            outcome: _cache_call('get', METRICS_KEY.format(scope=scope, outcome=outcome)) or 0
+            for outcome in OUTCOMES
+        }
+        for scope in ('ip', 'email')
+    }
@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Enrollment, Grade
+from .routers import primary_reads
+
+TRANSCRIPT_TIMEOUT = 60 * 60
+
+
+def transcript_key(student_id):
+    return f'transcript:{student_id}'
+
+
+def transcript_queries(student_id):
+    enrollments = (
+        Enrollment.objects.filter(student_id=student_id)
+        .order_by('id')
+        .values_list('course_id', 'course__name')
+    )
+    grades = Grade.objects.filter(student_id=student_id).values_list('course_id', 'marks', 'grade')
+    return enrollments, grades
+
+
+def format_transcript(enrollments, grades):
+    """Join (course_id, course_name) rows with (course_id, marks, grade) rows into profile rows."""
+    grade_dict = {course_id: (marks, letter) for course_id, marks, letter in grades}
+
+    transcript = []
+    for course_id, course_name in enrollments:
+        marks, letter = grade_dict.get(course_id, ('N/A', 'N/A'))
+        transcript.append({
+            'course_name': course_name,
+            'marks': marks,
+            'grade': letter,
+        })
+    return transcript
+
+
+def build_transcript(student_id):
+    """Return the enrolled courses of a student with marks and grade, as shown on the profile."""
+    return format_transcript(*transcript_queries(student_id))
+
+
+async def abuild_transcript(student_id):
+    enrollments, grades = transcript_queries(student_id)
+    enrollments, grades = await alist(enrollments), await alist(grades)
+    return format_transcript(enrollments, grades)
+
+
+def get_transcript(student_id):
+    key = transcript_key(student_id)
+    transcript = cache.get(key)
+    if transcript is None:
+        # Never cache what a lagging replica returned
+        with primary_reads():
+            transcript = build_transcript(student_id)
+        cache.set(key, transcript, TRANSCRIPT_TIMEOUT)
+    return transcript
+
+
+async def aget_transcript(student_id):
+    key = transcript_key(student_id)
+    transcript = await cache.aget(key)
+    if transcript is None:
+        with primary_reads():
+            transcript = await abuild_transcript(student_id)
+        await cache.aset(key, transcript, TRANSCRIPT_TIMEOUT)
+    return transcript
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+def invalidate_transcripts(student_ids):
+    keys = [transcript_key(student_id) for student_id in set(student_ids)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # Delete again once the transaction commits, so a request that read the
+    # old rows in the meantime cannot leave a stale transcript behind.
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,20 +1,53 @@
 from django.urls import path
-from .views import LoginView, AdminPanelView, AddUserView, AddCourseView, FacultyProfileView
+from .views import LoginView, AdminPanelView, AddUserView, AddCourseView, BulkAddUsersView
 from . import views 
-from .views import AvailableCoursesView, EnrollCourseView, CourseDetailView
+from .views import EnrollCourseView, BatchEnrollView, DropCourseView, CourseDetailView, BulkGradeImportView
+from .querybudget import query_budget
+from .routers import replica_reads
+from django.conf import settings
+from . import async_views
+from . import api
 
+# Under ASGI, the read-heavy pages can be served by their native async versions.
+# replica_reads() lets their queries go to a read replica, if there is one.
+read_views = async_views if settings.ASYNC_VIEWS else views
+
+# query_budget(n) declares the most SQL queries a request to the view may run,
+# including the session and user lookups. See QueryBudgetMiddleware.
 urlpatterns = [
-    path('login/', LoginView.as_view(), name='login'),
+    path('login/', query_budget(12)(LoginView.as_view()), name='login'),
+    path('login/metrics/', query_budget(2)(views.login_throttle_metrics), name='login_throttle_metrics'),
+    path('db/pool-stats/', query_budget(2)(views.database_pool_stats), name='database_pool_stats'),
+    path('jobs/', query_budget(3)(views.job_list), name='job_list'),
+    path('jobs/<int:job_id>/', query_budget(3)(views.job_status_view), name='job_status'),
     # urls.py
-    path('admin-panel/', AdminPanelView.as_view(), name='admin_panel'),
-    path('add-user/', AddUserView.as_view(), name='add_user'),
-    path('add-course/', AddCourseView.as_view(), name='add_course'),
-    path('faculty-profile/', FacultyProfileView.as_view(), name='faculty_profile'),
-    path('student/profile/', views.student_profile, name='student_profile'),
-    path('available-courses/', AvailableCoursesView.as_view(), name='available_courses'),
-    path('enroll/<int:course_id>/', EnrollCourseView.as_view(), name='enroll_course'),
-    path('course/<int:course_id>/', CourseDetailView.as_view(), name='course_detail'),
-    path('course/<int:course_id>/students/', views.student_details, name='student_details'),
-    path('update-grade/', views.update_grade, name='update_grade'),
+    path('admin-panel/', query_budget(3)(replica_reads(AdminPanelView.as_view())), name='admin_panel'),
+    path('add-user/', query_budget(4)(AddUserView.as_view()), name='add_user'),
+    path('add-users/bulk/', query_budget(8)(BulkAddUsersView.as_view()), name='bulk_add_users'),
+    path('add-course/', query_budget(4)(AddCourseView.as_view()), name='add_course'),
+    path('faculty-profile/', query_budget(4)(read_views.FacultyProfileView.as_view()), name='faculty_profile'),
+    path('student/profile/', query_budget(4)(replica_reads(read_views.student_profile)), name='student_profile'),
+    path('available-courses/', query_budget(7)(replica_reads(read_views.AvailableCoursesView.as_view())), name='available_courses'),
+    path('courses/autocomplete/', query_budget(1)(views.course_autocomplete), name='course_autocomplete'),
+    path('enroll/<int:course_id>/', query_budget(13)(EnrollCourseView.as_view()), name='enroll_course'),
+    path('enroll/batch/', query_budget(15)(BatchEnrollView.as_view()), name='batch_enroll'),
+    path('enroll/<int:course_id>/drop/', query_budget(20)(DropCourseView.as_view()), name='drop_course'),
+    path('course/<int:course_id>/', query_budget(4)(CourseDetailView.as_view()), name='course_detail'),
+    path('course/<int:course_id>/students/', query_budget(5)(replica_reads(read_views.student_details)), name='student_details'),
+    path('update-grade/', query_budget(17)(views.update_grade), name='update_grade'),
+    path('course/<int:course_id>/stats/', query_budget(3)(views.course_stats), name='course_stats'),
+    path('course/<int:course_id>/grades/export/', query_budget(3)(views.export_roster), name='export_roster'),
+    path('faculty-profile/grades/export/', query_budget(2)(views.export_faculty_grades), name='export_faculty_grades'),
+    path('course/<int:course_id>/grades/import/', query_budget(16)(BulkGradeImportView.as_view()), name='import_grades'),
+
+    # JSON API for the mobile client, see accounts/api.py
+    path('api/v1/transcript/', query_budget(4)(api.transcript), name='api_transcript'),
+    path('api/v1/courses/', query_budget(3)(api.courses), name='api_courses'),
+    path('api/v1/courses/<int:course_id>/roster/', query_budget(4)(api.roster), name='api_roster'),
+    path('api/v1/courses/<int:course_id>/grades/', query_budget(16)(api.grades), name='api_grades'),
+    path('api/v1/courses/<int:course_id>/students/<int:student_id>/grade-history/',
+         query_budget(4)(api.grade_history), name='api_grade_history'),
+    path('api/v1/enrollments/', query_budget(15)(api.enrollments), name='api_enrollments'),
+    path('api/v1/enrollments/<int:course_id>/', query_budget(20)(api.drop_enrollment), name='api_drop_enrollment'),
 
 ]
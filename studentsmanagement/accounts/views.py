@@ -3,10 +3,14 @@ from django.contrib import messages
 from decouple import config
 from dotenv import load_dotenv
 import os
+import csv
+import math
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth import get_user_model
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login
-from .models import Course, Enrollment, Grade, User
+from .models import Course, CourseGradeSummary, Enrollment, Grade, Job, User, WaitlistEntry
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from accounts.models import User
@@ -14,10 +18,35 @@ from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView
 from django.views.generic import DetailView
-from django.http import HttpResponseForbidden
+from django.utils.decorators import method_decorator
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from .grading import scale_for_course
+from .grade_import import import_grades, read_grade_rows
+from .provisioning import provision_users, read_uploaded_users
+from .pagination import PAGE_SIZE, keyset_page, parse_cursor
+from .search import AUTOCOMPLETE_LIMIT, autocomplete, search_courses
+from .throttle import LoginThrottle, throttle_metrics
+from .dbpool import pool_stats
+from .fragments import attach_course_cards, attach_roster_rows
+from .conditional import catalog_etag, conditional_page, faculty_profile_etag, student_profile_etag
+from .exports import EXPORT_FORMATS, course_enrollments, faculty_enrollments, stream_roster
+from .transcripts import get_transcript
+from .dashboard import get_course_stats, get_faculty_data
+from .jobs import enqueue, job_status
+from .audit import acting_as
+from . import enrollment
 # Load environment variables
 load_dotenv()
 
+ADMIN_SESSION_KEY = 'admin_panel'
+
+
+def is_panel_admin(request):
+    """True for the admin signed in with the configured credentials, and for faculty."""
+    return bool(request.session.get(ADMIN_SESSION_KEY)) or request.user.is_staff
+
+
 class LoginView(View):
     def get(self, request):
         return render(request, 'accounts/login.html')
@@ -27,6 +56,15 @@ class LoginView(View):
         email = request.POST.get('email')
         password = request.POST.get('password')
 
+        # Turn away bursts before authenticate() spends time hashing
+        self.throttle = LoginThrottle(request, email)
+        retry_after = self.throttle.check()
+        if retry_after:
+            messages.error(request, 'Too many login attempts. Please try again later.')
+            response = render(request, 'accounts/login.html', status=429)
+            response['Retry-After'] = str(math.ceil(retry_after))
+            return response
+
         if user_type == 'admin':
             return self.handle_admin_login(request, email, password)
         elif user_type == 'faculty':
@@ -38,19 +76,20 @@ class LoginView(View):
             return redirect('login')
 
     def handle_admin_login(self, request, email, password):
-        admin_email = config('ADMIN_EMAIL')
-        admin_password = config('ADMIN_PASSWORD')
-
-        if email == admin_email and password == admin_password:
-            faculty_users = User.objects.filter(is_staff=True)
-            faculty_data = [
-                {
-                    'name': faculty.name,
-                    'courses': [course.name for course in Course.objects.filter(faculty=faculty)]
-                }
-                for faculty in faculty_users
-            ]
-            return render(request, 'accounts/admin_panel.html', {'faculty_data': faculty_data})
+        # Compare both in constant time, so timing doesn't reveal which one was wrong
+        valid_email = constant_time_compare(email or '', settings.ADMIN_EMAIL)
+        valid_password = constant_time_compare(password or '', settings.ADMIN_PASSWORD)
+
+        if valid_email and valid_password:
+            self.throttle.succeeded()
+            # The admin isn't a user, so the session itself remembers them
+            request.session.cycle_key()
+            request.session[ADMIN_SESSION_KEY] = True
+            faculty_data = get_faculty_data()
+            return render(request, 'accounts/admin_panel.html', {
+                'faculty_data': faculty_data,
+                'course_stats': get_course_stats(),
+            })
         else:
             messages.error(request, 'Invalid admin credentials.')
             return redirect('login')
@@ -58,6 +97,7 @@ class LoginView(View):
     def handle_faculty_login(self, request, email, password):
         user = authenticate(request, email=email, password=password)
         if user is not None and user.is_staff:
+            self.throttle.succeeded()
             login(request, user)
             courses = Course.objects.filter(faculty=user)
             return render(request, 'accounts/faculty_profile.html', {'user': user, 'courses': courses})
@@ -68,20 +108,10 @@ class LoginView(View):
     def handle_student_login(self, request, email, password):
         user = authenticate(request, email=email, password=password)
         if user is not None and not user.is_staff:
+            self.throttle.succeeded()
             login(request, user)
             student = request.user
-            enrollments = Enrollment.objects.filter(student=student).select_related('course')
-            grades = Grade.objects.filter(student=student)
-            grade_dict = {grade.course.id: grade for grade in grades}
-
-            enrolled_data = [
-                {
-                    'course_name': e.course.name,
-                    'marks': grade_dict.get(e.course.id).marks if grade_dict.get(e.course.id) else 'N/A',
-                    'grade': grade_dict.get(e.course.id).grade if grade_dict.get(e.course.id) else 'N/A',
-                }
-                for e in enrollments
-            ]
+            enrolled_data = get_transcript(student.id)
 
             return render(request, 'accounts/student_profile.html', {
                 'user': student,
@@ -98,17 +128,12 @@ User = get_user_model()
 
 class AdminPanelView(View):
     def get(self, request):
-        faculty_users = User.objects.filter(is_staff=True).prefetch_related('course_set')
-        
-        faculty_data = [
-            {
-                'name': faculty.name,
-                'courses': [course.name for course in Course.objects.filter(faculty=faculty)]
-            }
-            for faculty in faculty_users
-        ]
+        faculty_data = get_faculty_data()
 
-        return render(request, 'accounts/admin_panel.html', {'faculty_data': faculty_data})
+        return render(request, 'accounts/admin_panel.html', {
+            'faculty_data': faculty_data,
+            'course_stats': get_course_stats(),
+        })
 
 
 
@@ -149,20 +174,55 @@ class AddUserView(View):
         return redirect('admin_panel')
 
 
+class BulkAddUsersView(View):
+    def dispatch(self, request, *args, **kwargs):
+        # Creates faculty accounts and hashes on every CPU, so admins only
+        if not is_panel_admin(request):
+            return HttpResponseForbidden('Admins only.')
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        return redirect('admin_panel')
+
+    def post(self, request):
+        uploaded = request.FILES.get('users_file')
+        if uploaded is None:
+            messages.error(request, 'Please choose a CSV file to upload.')
+            return redirect('admin_panel')
+
+        try:
+            report = provision_users(read_uploaded_users(uploaded))
+        except (UnicodeDecodeError, csv.Error):
+            messages.error(request, 'Could not read the uploaded file.')
+            return redirect('admin_panel')
+
+        messages.success(
+            request,
+            f"Added {report['created']} of {report['rows']} users ({report['users_per_second']} users/s)."
+        )
+        for error in report['errors']:
+            messages.error(request, f"Row {error['row']}: {error['error']}")
+        return redirect('admin_panel')
+
+
 
 class AddCourseView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         course_name = request.POST.get('course_name')
+        capacity = request.POST.get('capacity') or ''
         if course_name:
-            Course.objects.create(name=course_name, faculty=request.user)
+            # Leaving the capacity blank means unlimited seats
+            capacity = int(capacity) if capacity.isdigit() else None
+            Course.objects.create(name=course_name, faculty=request.user, capacity=capacity)
         return redirect('faculty_profile')
 
     
 
 class FacultyProfileView(LoginRequiredMixin, View):
+    @method_decorator(conditional_page(faculty_profile_etag))
     def get(self, request, *args, **kwargs):
         faculty = request.user
-        courses = Course.objects.filter(faculty=faculty)
+        courses = Course.objects.filter(faculty=faculty).select_related('grade_summary')
         return render(request, 'accounts/faculty_profile.html', {
             'user': faculty,
             'courses': courses
@@ -170,24 +230,10 @@ class FacultyProfileView(LoginRequiredMixin, View):
 
 
 @login_required
+@conditional_page(student_profile_etag)
 def student_profile(request):
     student = request.user
-
-    # Get all enrollments of the student
-    enrollments = Enrollment.objects.filter(student=student).select_related('course')
-    # Get grades for the student
-    grades = Grade.objects.filter(student=student)
-    grade_dict = {grade.course.id: grade for grade in grades}
-
-    enrolled_data = []
-    for enrollment in enrollments:
-        course = enrollment.course
-        grade = grade_dict.get(course.id)
-        enrolled_data.append({
-            'course_name': course.name,
-            'marks': grade.marks if grade else 'N/A',
-            'grade': grade.grade if grade else 'N/A'
-        })
+    enrolled_data = get_transcript(student.id)
 
     return render(request, 'accounts/student_profile.html', {
         'user': student,
@@ -196,32 +242,115 @@ def student_profile(request):
 
 
 
+def catalog_queryset(params):
+    """Courses for the catalog, filtered by the ``faculty`` and ``q`` (search text) parameters."""
+    queryset = Course.objects.select_related('faculty')
+
+    faculty_id = parse_cursor(params.get('faculty'))
+    if faculty_id is not None:
+        queryset = queryset.filter(faculty_id=faculty_id)
+    # Pages are still walked by primary key; ranking is for the autocomplete
+    return search_courses(queryset, params.get('q', ''))
+
+
+def course_autocomplete(request):
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    return JsonResponse({'results': autocomplete(request.GET.get('q', ''), max(limit, 1))})
+
+
+def faculty_choices():
+    return User.objects.filter(is_staff=True).order_by('name').values('id', 'name')
+
+
+def next_page_query(params, cursor):
+    if cursor is None:
+        return None
+    query = params.copy()
+    query['after'] = cursor
+    return query.urlencode()
+
+
+@method_decorator(conditional_page(catalog_etag), name='get')
 class AvailableCoursesView(ListView):
     model = Course
     template_name = 'accounts/available_courses.html'
     context_object_name = 'courses'
+    page_size = PAGE_SIZE
+
+    def get_queryset(self):
+        courses, self.next_cursor = keyset_page(
+            catalog_queryset(self.request.GET), self.request.GET.get('after'), self.page_size
+        )
+        return courses
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        enrolled_courses = Enrollment.objects.filter(student=self.request.user).values_list('course__id', flat=True)
-        context['enrolled_course_ids'] = list(enrolled_courses)
+        page_ids = [course.id for course in context['courses']]
+        # Only the courses on this page matter for the "Enrolled" buttons
+        enrolled_courses = Enrollment.objects.filter(
+            student=self.request.user, course_id__in=page_ids
+        ).values_list('course_id', flat=True)
+        context['enrolled_course_ids'] = set(enrolled_courses)
+        attach_course_cards(context['courses'])
+        context['waitlisted_course_ids'] = set(WaitlistEntry.objects.filter(
+            student=self.request.user, course_id__in=page_ids
+        ).values_list('course_id', flat=True))
+        context['faculty_choices'] = faculty_choices()
+
+        query = next_page_query(self.request.GET, self.next_cursor)
+        if query is not None:
+            context['next_page_query'] = query
         return context
 
 
 
+ENROLL_MESSAGES = {
+    enrollment.ENROLLED: (messages.SUCCESS, 'You are enrolled in {course}.'),
+    enrollment.ALREADY_ENROLLED: (messages.INFO, 'You are already enrolled in {course}.'),
+    enrollment.WAITLISTED: (messages.INFO, '{course} is full, so you have been added to its waitlist.'),
+    enrollment.ALREADY_WAITLISTED: (messages.INFO, 'You are already on the waitlist for {course}.'),
+}
+
+
 class EnrollCourseView(View):
     def post(self, request, course_id):
         # Get the course
-        course = get_object_or_404(Course, id=course_id)
-        
-        # Check if the student is already enrolled
-        if not Enrollment.objects.filter(student=request.user, course=course).exists():
-            Enrollment.objects.create(student=request.user, course=course)
+        course = get_object_or_404(Course.objects.only('id', 'name'), id=course_id)
+
+        result = enrollment.enroll_student(request.user, course.id)
+        level, message = ENROLL_MESSAGES[result]
+        messages.add_message(request, level, message.format(course=course.name))
         
         # Redirect to available courses page
         return redirect('available_courses')
 
 
+class BatchEnrollView(LoginRequiredMixin, View):
+    """Enroll in every course ticked on the catalog page with one POST."""
+
+    def post(self, request):
+        course_ids = [parse_cursor(value) for value in request.POST.getlist('course_ids')]
+        results = enrollment.enroll_many(request.user, [course_id for course_id in course_ids if course_id])
+        if not results:
+            messages.info(request, 'Select the courses you want to enroll in first.')
+        for result in results:
+            if result['status'] in ENROLL_MESSAGES:
+                level, message = ENROLL_MESSAGES[result['status']]
+                messages.add_message(request, level, message.format(course=result['name']))
+        return redirect('available_courses')
+
+
+class DropCourseView(LoginRequiredMixin, View):
+    def post(self, request, course_id):
+        course = get_object_or_404(Course.objects.only('id', 'name'), id=course_id)
+        if enrollment.drop_course(request.user, course.id):
+            messages.success(request, f'You have left {course.name}.')
+        return redirect('available_courses')
+
+
 
 class CourseDetailView(DetailView):
     model = Course
@@ -236,7 +365,7 @@ class CourseDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        course = self.get_object()
+        course = self.object
 
         if user.is_authenticated and user.is_staff and course.faculty == user:
             # Faculty view their course
@@ -249,28 +378,78 @@ class CourseDetailView(DetailView):
 
 
 
-@login_required
-def student_details(request, course_id):
-    course = get_object_or_404(Course, id=course_id, faculty=request.user)
+def roster_queries(course):
     students = User.objects.filter(is_staff=False, enrollment__course=course).distinct()
+    grades = Grade.objects.filter(course=course).values_list('student_id', 'marks', 'grade', 'updated_at')
+    return students, grades
 
-    grades = Grade.objects.filter(course=course)
-    grade_dict = {grade.student.id: grade for grade in grades}
+
+def format_roster(students, grades):
+    grade_dict = {student_id: (marks, letter, updated_at) for student_id, marks, letter, updated_at in grades}
 
     student_data = []
     for student in students:
-        grade = grade_dict.get(student.id)
+        marks, letter, updated_at = grade_dict.get(student.id, ('', '', None))
         student_data.append({
             'student': student,
-            'marks': grade.marks if grade else '',
-            'grade': grade.grade if grade else ''
+            'marks': marks,
+            'grade': letter,
+            # Part of the row's cache key, see accounts/fragments.py
+            'updated_at': updated_at,
         })
+    return student_data
+
+
+@login_required
+def student_details(request, course_id):
+    course = get_object_or_404(Course, id=course_id, faculty=request.user)
+    students, grades = roster_queries(course)
+    student_data = format_roster(students, grades)
+    attach_roster_rows(course, student_data)
 
     return render(request, 'accounts/student_details.html', {
         'course': course,
         'student_data': student_data
     })
 
+@login_required
+def course_stats(request, course_id):
+    course = get_object_or_404(Course.objects.select_related('grade_summary'), id=course_id, faculty=request.user)
+    try:
+        summary = course.grade_summary
+    except CourseGradeSummary.DoesNotExist:
+        summary = None
+
+    return render(request, 'accounts/course_stats.html', {
+        'course': course,
+        'summary': summary,
+        'percentiles': [(pct, summary.percentile(pct)) for pct in (10, 25, 50, 75, 90)] if summary else [],
+    })
+
+
+def _roster_export_response(request, enrollments, filename):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+    content_type, delimiter = EXPORT_FORMATS[export_format]
+
+    response = StreamingHttpResponse(stream_roster(enrollments, delimiter), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+@login_required
+def export_roster(request, course_id):
+    course = get_object_or_404(Course, id=course_id, faculty=request.user)
+    return _roster_export_response(request, course_enrollments(course), f'course-{course.id}-grades')
+
+
+@login_required
+def export_faculty_grades(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Only faculty can export grades.")
+    return _roster_export_response(request, faculty_enrollments(request.user), 'faculty-grades')
+
 @require_POST
 
 @login_required
@@ -279,19 +458,84 @@ def update_grade(request):
         student_id = request.POST.get('student_id')
         course_id = request.POST.get('course_id')
         marks = request.POST.get('marks')
-        grade = request.POST.get('grade')
+        grade = (request.POST.get('grade') or '').strip()
+
+        # A blank letter is derived from the marks using the course's scale
+        if not grade:
+            try:
+                grade = scale_for_course(course_id).letter_for(float(marks))
+            except (TypeError, ValueError):
+                grade = ''
+
+        # Create or update the grade; the unique (student, course) constraint
+        # makes this safe against concurrent submissions
+        with acting_as(request.user):
+            grade_obj, created = Grade.objects.update_or_create(
+                student_id=student_id,
+                course_id=course_id,
+                defaults={'marks': marks, 'grade': grade}
+            )
+
+        return redirect('student_details', course_id=course_id)
+
+
 
-        student = User.objects.get(id=student_id)
-        course = Course.objects.get(id=course_id)
 
-        # Create or update the grade
-        grade_obj, created = Grade.objects.update_or_create(
-            student=student,
-            course=course,
-            defaults={'marks': marks, 'grade': grade}
-        )
 
-        return redirect('student_details', course_id=course_id)
+
+class BulkGradeImportView(LoginRequiredMixin, View):
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id, faculty=request.user)
+        uploaded = request.FILES.get('grades_file')
+        if uploaded is None:
+            return JsonResponse({'error': 'No file uploaded.'}, status=400)
+
+        try:
+            if request.POST.get('background'):
+                # Only reading the file happens here; a run_jobs worker does the import
+                rows = list(read_grade_rows(uploaded))
+            else:
+                with acting_as(request.user):
+                    report = import_grades(course, read_grade_rows(uploaded))
+        except (ValueError, UnicodeDecodeError, csv.Error):
+            return JsonResponse({'error': 'Could not read the uploaded file.'}, status=400)
+
+        if request.POST.get('background'):
+            job = enqueue('import_grades', {'course_id': course.id, 'rows': rows}, user=request.user)
+            return JsonResponse({
+                'job': job.pk,
+                'status': job.status,
+                'status_url': reverse('job_status', args=[job.pk]),
+            }, status=202)
+        return JsonResponse(report)
 
 
+@login_required
+def login_throttle_metrics(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Staff only.')
+    return JsonResponse(throttle_metrics())
 
+
+@login_required
+def database_pool_stats(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Staff only.')
+    return JsonResponse(pool_stats())
+
+
+def job_list(request):
+    """The most recent background jobs, polled by the admin panel."""
+    if not is_panel_admin(request):
+        return HttpResponseForbidden('Admins only.')
+    jobs = Job.objects.defer('payload').order_by('-id')[:20]
+    return JsonResponse({'jobs': [job_status(job) for job in jobs]})
+
+
+def job_status_view(request, job_id):
+    job = Job.objects.defer('payload').filter(id=job_id).first()
+    # Other people's jobs are hidden rather than forbidden
+    owner = request.user.is_authenticated and job is not None and job.created_by_id == request.user.id
+    if job is None or not (is_panel_admin(request) or owner):
+        raise Http404('No such job.')
+    return JsonResponse(job_status(job))
@@ -0,0 +1,33 @@
+"""Setup for process pool workers, e.g. those rendering transcripts in accounts/batch_transcripts.py.
+
+Workers may be forked or started afresh, depending on the platform. Either
+way each one sets Django up itself and never touches a database connection
+it inherited from its parent. This module imports no models, so a freshly
+started worker can load it before Django is set up.
+"""
+import os
+
+import django
+from django.db import connections
+
+
+def init_worker(settings_module):
+    """``initializer`` for a ProcessPoolExecutor; pass the parent's DJANGO_SETTINGS_MODULE."""
+    if settings_module:
+        os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    django.setup()
+    # A forked worker shares the parent's database sockets; forget them
+    # without closing, which would end the parent's sessions too
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+def close_connections():
+    """Close this process's connections so forked workers don't inherit open sockets.
+
+    Connections inside a transaction are left alone, as closing them would
+    lose it; workers discard whatever they inherit either way.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
@@ -15,7 +15,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
 
 # Admin credentials from .env file
 ADMIN_EMAIL = config('ADMIN_EMAIL')
@@ -60,14 +61,19 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'accounts.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.routers.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Expose X-Query-Count / X-Query-Time-Ms on every response
+QUERY_BUDGET_HEADERS = config('QUERY_BUDGET_HEADERS', default=DEBUG, cast=bool)
+
 ROOT_URLCONF = 'studentsmanagement.urls'
 
 TEMPLATES = [
@@ -87,6 +93,29 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'studentsmanagement.wsgi.application'
 
+# Login throttling (accounts/throttle.py): (attempts allowed per window, attempts
+# per minute), so (5, 1) allows 5 attempts every 5 minutes. Every attempt
+# counts against its IP; only failed attempts count against the email.
+LOGIN_THROTTLE_ENABLED = config('LOGIN_THROTTLE_ENABLED', default=True, cast=bool)
+LOGIN_THROTTLE_CACHE = config('LOGIN_THROTTLE_CACHE', default='default')
+LOGIN_THROTTLE_IP = (
+    config('LOGIN_THROTTLE_IP_BURST', default=30, cast=int),
+    config('LOGIN_THROTTLE_IP_PER_MINUTE', default=30, cast=int),
+)
+LOGIN_THROTTLE_EMAIL = (
+    config('LOGIN_THROTTLE_EMAIL_BURST', default=5, cast=int),
+    config('LOGIN_THROTTLE_EMAIL_PER_MINUTE', default=1, cast=int),
+)
+# Number of reverse proxies (load balancer, nginx, ...) in front of the app
+# that append to X-Forwarded-For. Attempts are counted against the address
+# the outermost of them saw; with 0 it is REMOTE_ADDR, which behind a proxy
+# is the proxy itself, so every user would share one IP limit. Never set
+# this higher than the real number of proxies, or clients can pick their IP.
+LOGIN_THROTTLE_PROXY_HOPS = config('LOGIN_THROTTLE_PROXY_HOPS', default=0, cast=int)
+
+# Serve the read-heavy accounts pages with async views (for ASGI deployments)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -102,8 +131,70 @@ DATABASES = {
     }
 }
 
+# Optional connection pooling with psycopg_pool. It is an extra dependency
+# (pip install "psycopg[pool]"), so it is off unless DB_POOL=True. Pooled
+# connections are checked on checkout, so a server-side disconnect never
+# reaches a view. Without the pool, persistent connections with health
+# checks are used.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+if DB_POOL:
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured('DB_POOL=True needs psycopg_pool: pip install "psycopg[pool]".')
+
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            # Seconds a request waits for a free connection before failing
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+            'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+            'check': ConnectionPool.check_connection,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas, as DB_REPLICA_HOSTS=host[:port],... Reads from the busiest
+# pages go to them, except for a while after the same browser wrote
+# something (see accounts/routers.py). In tests they mirror the default
+# database.
+REPLICA_DATABASES = []
+for index, replica in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': {**DATABASES['default'].get('OPTIONS', {})},
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{index}')
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+# Grade audit entries are buffered per process and written in batches of up
+# to this many, at least every GRADE_AUDIT_FLUSH_SECONDS (see accounts/audit.py)
+GRADE_AUDIT_BATCH_SIZE = config('GRADE_AUDIT_BATCH_SIZE', default=500, cast=int)
+GRADE_AUDIT_FLUSH_SECONDS = config('GRADE_AUDIT_FLUSH_SECONDS', default=5, cast=float)
+# Write each transaction's audit entries as soon as it commits instead, so a
+# crash can't lose them, at the cost of one INSERT per grading request
+GRADE_AUDIT_SYNCHRONOUS = config('GRADE_AUDIT_SYNCHRONOUS', default=False, cast=bool)
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='studentsmanagement'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators